@@ -1,22 +1,52 @@
 from django.contrib import admin
-from .models import User, Patient, Doctor, Specialization, Appointment, AppointmentType
+from django.db.models import Q
+from .changelists import HighVolumeAdmin
+from .models import (
+    User, Patient, Doctor, Specialization, Appointment, AppointmentType, ArchivedAppointment, OutboxEmail, WaitlistEntry,
+    WorkingHours,
+)
+from .search import patient_filter, prefix_range
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(HighVolumeAdmin):
     list_display=("username","email","account_type","is_staff","is_active")
     list_filter=("account_type","is_staff","is_active")
     search_fields=("username","email")
+    search_help_text = "Początek loginu lub adresu e-mail."
+    keyset_ordering = ("username",)
+    list_only = list_display
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(Q(**prefix_range("username", term)) | Q(**prefix_range("email", term.lower()))), False
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(HighVolumeAdmin):
     list_display = ("imie", "nazwisko", "pesel", "telefon")
-    search_fields = ("imie", "nazwisko", "pesel")
+    search_fields = ("nazwisko", "imie", "pesel")
+    search_help_text = "Początek nazwiska, imienia lub numeru PESEL."
+    keyset_ordering = ("search_name", "id")
+    list_only = list_display
+    raw_id_fields = ("user",)
+
+    def get_search_results(self, request, queryset, search_term):
+        condition = patient_filter(search_term)
+        return (queryset.filter(condition) if condition else queryset), False
+
+class WorkingHoursInline(admin.TabularInline):
+    model = WorkingHours
+    extra = 0
 
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
     list_display = ("imie", "nazwisko", "specjalizacja", "telefon")
     list_filter = ("specjalizacja",)
+    list_select_related = ("specjalizacja",)
     search_fields = ("imie", "nazwisko")
+    raw_id_fields = ("user",)
+    inlines = (WorkingHoursInline,)
 
 @admin.register(Specialization)
 class SpecializationAdmin(admin.ModelAdmin):
@@ -25,13 +55,59 @@ class SpecializationAdmin(admin.ModelAdmin):
 
 @admin.register(AppointmentType)
 class AppointmentTypeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description')
+    list_display = ('name', 'duration_minutes', 'description')
     search_fields = ('name',)
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(HighVolumeAdmin):
     list_display = ('patient', 'doctor', 'specialization','type','date','time','status')
     list_filter = ('specialization','status','date', 'type')
-    search_fields = ('patient_imie', 'patient_nazwisko', 'doctor_imie', 'doctor_nazwisko')
+    list_select_related = ('patient', 'doctor__specjalizacja', 'specialization', 'type')
+    list_only = (
+        'date', 'time', 'status', 'patient__imie', 'patient__nazwisko', 'patient__pesel',
+        'doctor__imie', 'doctor__nazwisko', 'doctor__specjalizacja__name', 'specialization__name', 'type__name',
+    )
+    search_fields = ('patient__nazwisko', 'patient__imie', 'patient__pesel', 'doctor__nazwisko', 'doctor__imie')
+    search_help_text = "Początek nazwiska, imienia lub numeru PESEL pacjenta albo nazwiska lub imienia lekarza."
+    # Indeks appointment_date_time_id obsługuje zarówno stronicowanie, jak i hierarchię dat.
+    date_hierarchy = 'date'
+    keyset_ordering = ('-date', '-time', '-id')
+    autocomplete_fields = ('patient',)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'doctor':
+            kwargs['queryset'] = Doctor.objects.select_related('specjalizacja')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        condition = patient_filter(term)
+        if not condition:
+            return queryset, False
+        condition = Q(patient__in=Patient.objects.filter(condition))
+        if not term.isdigit():
+            condition |= Q(doctor__in=Doctor.objects.filter(Q(nazwisko__istartswith=term) | Q(imie__istartswith=term)))
+        return queryset.filter(condition), False
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'specialization', 'type', 'date', 'time', 'status', 'archived_at')
+    list_filter = ('specialization', 'status', 'type')
+    list_select_related = ('patient', 'doctor__specjalizacja', 'specialization', 'type')
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient',)
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'specialization', 'doctor', 'type', 'date_from', 'date_to', 'priority', 'auto_book', 'status')
+    list_filter = ('status', 'specialization', 'auto_book')
+    list_editable = ('priority',)
+    list_select_related = ('patient', 'doctor__specjalizacja', 'specialization', 'type')
+    autocomplete_fields = ('patient',)
+    raw_id_fields = ('appointment', 'offered_doctor')
 
 # Register your models here.
@@ -0,0 +1,98 @@
+"""
+Archiwum wizyt. Zakończone i odwołane wizyty starsze niż zadany horyzont
+przenoszone są paczkami (każda w osobnej transakcji) do ArchivedAppointment,
+razem z podsumowaniami. Przerwane przenoszenie wystarczy uruchomić ponownie:
+w tabeli wizyt zostają tylko nieprzeniesione wiersze.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from heapq import merge
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment, ArchivedVisitSummary, VisitSummary
+from .pagination import keyset_filter
+
+ARCHIVE_STATUSES = ('completed', 'canceled')
+ARCHIVE_ORDERING = ('date', 'time', 'id')
+APPOINTMENT_FIELDS = (
+    'id', 'patient_id', 'doctor_id', 'specialization_id', 'type_id',
+    'date', 'time', 'status', 'notes', 'created_at', 'updated_at',
+)
+SUMMARY_FIELDS = ('appointment_id', 'prescription', 'recommendations', 'created_at')
+
+_archiving = ContextVar('archiving', default=False)
+
+
+def archiving():
+    """Czy trwa przenoszenie do archiwum (sygnały usuwania wizyt nic wtedy nie robią)."""
+    return _archiving.get()
+
+
+@contextmanager
+def suppress_signals():
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+def archive_horizon(days, today=None):
+    return (today or timezone.localdate()) - timedelta(days=days)
+
+
+def archivable(horizon):
+    return Appointment.objects.filter(date__lt=horizon, status__in=ARCHIVE_STATUSES)
+
+
+def archive_batch(rows, archived_at=None):
+    """
+    Przenosi wizyty ``rows`` (słowniki z APPOINTMENT_FIELDS) w jednej transakcji.
+    Usunięcie z tabeli wizyt nie zmienia statystyk obłożenia (liczą też archiwum)
+    ani paneli pacjentów (historia czyta obie tabele); odświeżane są tylko
+    bitmapy zajętości i wersje grafików lekarzy.
+    """
+    from .availability import refresh_day
+    from .caching import bump_version
+    from .schedule import doctor_version_name
+
+    archived_at = archived_at or timezone.now()
+    ids = [row['id'] for row in rows]
+    with transaction.atomic():
+        summaries = list(VisitSummary.objects.filter(appointment_id__in=ids).values(*SUMMARY_FIELDS))
+        ArchivedAppointment.objects.bulk_create([ArchivedAppointment(archived_at=archived_at, **row) for row in rows])
+        ArchivedVisitSummary.objects.bulk_create([ArchivedVisitSummary(**summary) for summary in summaries])
+        with suppress_signals():
+            Appointment.objects.filter(id__in=ids).delete()
+        # Odwołane wizyty nie zajmują slotów; przeliczamy tylko dni z wizytami zakończonymi.
+        for doctor_id, day in {(row['doctor_id'], row['date']) for row in rows if row['status'] != 'canceled'}:
+            refresh_day(doctor_id, day)
+        for doctor_id in {row['doctor_id'] for row in rows if row['doctor_id']}:
+            bump_version(doctor_version_name(doctor_id))
+    return len(rows), len(summaries)
+
+
+def archive_appointments(horizon, batch_size=500, max_batches=None):
+    """
+    Generator przenoszący kolejne paczki wizyt sprzed ``horizon``; zwraca
+    (liczba wizyt, liczba podsumowań) po każdej paczce.
+    """
+    queryset = archivable(horizon).order_by(*ARCHIVE_ORDERING).values(*APPOINTMENT_FIELDS)
+    cursor = None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        page = queryset.filter(keyset_filter(ARCHIVE_ORDERING, cursor)) if cursor else queryset
+        rows = list(page[:batch_size])
+        if not rows:
+            return
+        yield archive_batch(rows)
+        batches += 1
+        cursor = tuple(rows[-1][field] for field in ARCHIVE_ORDERING)
+
+
+def patient_history(hot, archived):
+    """Scala posortowane malejąco (data, godzina) listy wizyt z obu tabel."""
+    return list(merge(hot, archived, key=lambda appointment: (appointment.date, appointment.time), reverse=True))
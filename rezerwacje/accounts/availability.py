@@ -0,0 +1,300 @@
+from datetime import date as date_cls, datetime, time as time_cls, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.lookups import Exact
+
+
+def generate_time_choices(start="08:00", end="20:00", step=30):
+    choices = []
+    start_dt = datetime.strptime(start, "%H:%M")
+    end_dt = datetime.strptime(end, "%H:%M")
+    current = start_dt
+    while current<=end_dt:
+        choices.append((current.strftime("%H:%M"), current.strftime("%H:%M")))
+        current += timedelta(minutes=step)
+    return choices
+
+SLOT_MINUTES = 30
+TIME_CHOICES = generate_time_choices(step=SLOT_MINUTES)
+SLOT_TIMES = [datetime.strptime(value, "%H:%M").time() for value, _ in TIME_CHOICES]
+SLOT_COUNT = len(SLOT_TIMES)
+ALL_SLOTS = (1 << SLOT_COUNT) - 1
+
+_FIRST_SLOT = SLOT_TIMES[0].hour * 60 + SLOT_TIMES[0].minute
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute + t.second / 60
+
+
+def as_time(value):
+    if isinstance(value, time_cls):
+        return value
+    return datetime.strptime(str(value)[:5], "%H:%M").time()
+
+
+def as_date(value):
+    if isinstance(value, date_cls):
+        return value
+    return date_cls.fromisoformat(str(value))
+
+
+def slot_index(t):
+    """Indeks slotu siatki dla godziny ``t`` albo None, gdy godzina leży poza siatką."""
+    offset = _minutes(as_time(t)) - _FIRST_SLOT
+    if offset % SLOT_MINUTES or not 0 <= offset // SLOT_MINUTES < SLOT_COUNT:
+        return None
+    return int(offset // SLOT_MINUTES)
+
+
+def slot_span(duration):
+    """Liczba slotów siatki zajmowanych przez wizytę trwającą ``duration`` minut."""
+    return max(1, -(-duration // SLOT_MINUTES))
+
+
+def _slots_between(t, duration, inclusive):
+    """Sloty, których początek leży między ``t`` - 30 minut a końcem wizyty."""
+    offset = _minutes(as_time(t)) - _FIRST_SLOT
+    low, high = offset - SLOT_MINUTES, offset + duration
+    mask = 0
+    for i in range(SLOT_COUNT):
+        start = i * SLOT_MINUTES
+        if low < start < high or (inclusive and start in (low, high)):
+            mask |= 1 << i
+    return mask
+
+
+def occupied_mask(t, duration=SLOT_MINUTES):
+    """
+    Bity zajmowane przez wizytę o godzinie ``t`` trwającą ``duration`` minut.
+    Wizyta spoza siatki (np. dodana przez panel Django) zajmuje każdy slot,
+    z którym się pokrywa.
+    """
+    index = slot_index(t)
+    if index is not None:
+        return ((1 << slot_span(duration)) - 1) << index & ALL_SLOTS
+    return _slots_between(t, duration, inclusive=False)
+
+
+def collision_mask(t, duration=SLOT_MINUTES):
+    """
+    Bity, których zajętość wyklucza wizytę o godzinie ``t``: jej własne sloty
+    i po jednym slocie przerwy przed i po (reguła ±30 minut).
+    """
+    index = slot_index(t)
+    if index is not None:
+        return ((1 << slot_span(duration) + 2) - 1) << index >> 1 & ALL_SLOTS
+    return _slots_between(t, duration, inclusive=True)
+
+
+def build_mask(slots):
+    """Maska zajętości z par (godzina, czas trwania w minutach)."""
+    mask = 0
+    for t, duration in slots:
+        mask |= occupied_mask(t, duration)
+    return mask
+
+
+def free_mask(taken, duration=SLOT_MINUTES, open_slots=ALL_SLOTS):
+    """
+    Sloty, od których można zarezerwować wizytę trwającą ``duration`` minut:
+    wszystkie jej sloty mieszczą się w godzinach pracy (``open_slots``), a w nich
+    i w slocie przerwy przed i po nie ma innej wizyty.
+    """
+    span = slot_span(duration)
+    blocked = taken << 1
+    fits = open_slots
+    for shift in range(span + 1):
+        blocked |= taken >> shift
+    for shift in range(1, span):
+        fits &= open_slots >> shift
+    return fits & ~blocked & ALL_SLOTS
+
+
+def mask_times(mask):
+    return [value for i, (value, _) in enumerate(TIME_CHOICES) if mask >> i & 1]
+
+
+def taken_mask(doctor_id, day, exclude=None):
+    """
+    Maska zajętości dnia lekarza. Odczyt jest zapamiętywany na edytowanej
+    wizycie (``exclude``), więc formularz i Appointment.clean dzielą jedno zapytanie.
+    """
+    from .models import DoctorDaySlots
+
+    memo = getattr(exclude, '_slot_masks', None) if exclude is not None else None
+    if memo is not None and (doctor_id, day) in memo:
+        mask = memo[(doctor_id, day)]
+    else:
+        mask = DoctorDaySlots.objects.filter(
+            doctor_id=doctor_id, date=day
+        ).values_list('taken', flat=True).first() or 0
+        if exclude is not None:
+            exclude._slot_masks = {**(memo or {}), (doctor_id, day): mask}
+
+    loaded = getattr(exclude, '_loaded_slot', None) if exclude is not None else None
+    if loaded and loaded[0] == doctor_id and loaded[1] == day and loaded[3] != 'canceled':
+        from .slot_templates import type_duration
+
+        mask &= ~occupied_mask(loaded[2], type_duration(loaded[4]))
+    return mask
+
+
+def free_time_choices(doctor_id, day, exclude=None, duration=SLOT_MINUTES):
+    from .leaves import is_on_leave
+    from .slot_templates import open_slots
+
+    if is_on_leave(doctor_id, day):
+        return []
+    day = as_date(day)
+    free = free_mask(taken_mask(doctor_id, day, exclude), duration, open_slots(doctor_id, day))
+    return [(t, t) for t in mask_times(free)]
+
+
+def slot_taken(doctor_id, day, t, exclude=None, duration=SLOT_MINUTES):
+    return bool(taken_mask(doctor_id, as_date(day), exclude) & occupied_mask(t, duration))
+
+
+def collides(doctor_id, day, t, exclude=None, duration=SLOT_MINUTES):
+    return bool(taken_mask(doctor_id, as_date(day), exclude) & collision_mask(t, duration))
+
+
+def mark_taken(doctor_id, day, t, duration=SLOT_MINUTES):
+    """Dopisuje nową wizytę do bitmapy jednym UPDATE zamiast przeliczania całego dnia."""
+    from .models import DoctorDaySlots
+
+    bits = occupied_mask(t, duration)
+    if DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day).update(taken=F('taken').bitor(bits)):
+        return
+    try:
+        with transaction.atomic():
+            DoctorDaySlots.objects.create(doctor_id=doctor_id, date=day, taken=bits)
+    except IntegrityError:
+        DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day).update(taken=F('taken').bitor(bits))
+
+
+def claim_slot(doctor_id, day, t, duration=SLOT_MINUTES, release=0):
+    """
+    Zajmuje sloty wizyty w bitmapie dnia pod warunkiem, że nie koliduje ona
+    z zapisanymi wizytami (reguła ±30 minut). Sprawdzenie i zapis to jeden
+    warunkowy UPDATE, więc z dwóch równoległych rezerwacji sąsiednich slotów
+    przechodzi tylko jedna. ``release`` to dotychczasowe sloty przenoszonej
+    wizyty w tym samym dniu – zwalniane w tym samym UPDATE. Zwraca False przy kolizji.
+    """
+    from .models import DoctorDaySlots
+
+    rows = DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day)
+    taken = F('taken').bitand(ALL_SLOTS & ~release) if release else F('taken')
+    if rows.filter(Exact(taken.bitand(collision_mask(t, duration)), 0)).update(
+        taken=taken.bitor(occupied_mask(t, duration))
+    ):
+        return True
+    if rows.exists():
+        return False
+    try:
+        with transaction.atomic():
+            DoctorDaySlots.objects.create(doctor_id=doctor_id, date=day, taken=occupied_mask(t, duration))
+        return True
+    except IntegrityError:
+        return claim_slot(doctor_id, day, t, duration, release)
+
+
+def refresh_day(doctor_id, day):
+    """Przelicza bitmapę jednego dnia lekarza na podstawie jego wizyt."""
+    from .models import Appointment, DoctorDaySlots
+    from .slot_templates import type_duration
+
+    if not doctor_id or not day:
+        return
+    rows = Appointment.objects.filter(
+        doctor_id=doctor_id, date=day
+    ).exclude(status='canceled').values_list('time', 'type_id')
+    mask = build_mask((t, type_duration(type_id)) for t, type_id in rows)
+    if mask:
+        DoctorDaySlots.objects.update_or_create(doctor_id=doctor_id, date=day, defaults={'taken': mask})
+    else:
+        DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day).delete()
+
+
+def rebuild_index(appointments, day_slots_model, durations=None):
+    """
+    Buduje cały indeks od zera; używane w migracji danych i po zmianie czasu
+    trwania typu wizyty. ``durations``: {id typu: minuty}, domyślnie jeden slot.
+    """
+    durations = durations or {}
+    masks = {}
+    rows = appointments.exclude(doctor=None).exclude(status='canceled').values_list('doctor_id', 'date', 'time', 'type_id')
+    for doctor_id, day, t, type_id in rows.iterator():
+        bits = occupied_mask(t, durations.get(type_id, SLOT_MINUTES))
+        masks[(doctor_id, day)] = masks.get((doctor_id, day), 0) | bits
+    day_slots_model.objects.all().delete()
+    day_slots_model.objects.bulk_create(
+        [day_slots_model(doctor_id=d, date=day, taken=mask) for (d, day), mask in masks.items() if mask],
+        batch_size=1000,
+    )
+
+
+def next_free_slots(specialization_id, date_from, date_to, limit=10, now=None, duration=SLOT_MINUTES):
+    """
+    Najbliższe wolne terminy (lekarz, dzień, godzina) w całej specjalizacji dla
+    wizyty trwającej ``duration`` minut. Dwa zapytania niezależnie od liczby
+    lekarzy i dni: lekarze oraz bitmapy zajętości z zakresu; urlopy i godziny
+    pracy pochodzą z indeksów w cache.
+    """
+    from .leaves import in_index, leave_indexes
+    from .models import Doctor, DoctorDaySlots
+    from .slot_templates import template_slots, week_templates
+
+    doctors = list(
+        Doctor.objects.filter(specjalizacja_id=specialization_id)
+        .order_by('nazwisko', 'imie', 'id')
+        .values('id', 'imie', 'nazwisko')
+    )
+    if not doctors or limit <= 0 or date_from > date_to:
+        return []
+    doctor_ids = [doc['id'] for doc in doctors]
+
+    masks = {
+        (doctor_id, day): taken
+        for doctor_id, day, taken in DoctorDaySlots.objects.filter(
+            doctor_id__in=doctor_ids, date__range=(date_from, date_to)
+        ).values_list('doctor_id', 'date', 'taken')
+    }
+
+    leaves = leave_indexes(doctor_ids)
+    templates = week_templates(doctor_ids)
+
+    results = []
+    day = date_from
+    while day <= date_to and len(results) < limit:
+        not_before = ALL_SLOTS
+        if now is not None and day == now.date():
+            passed = sum(t <= now.time() for t in SLOT_TIMES)
+            not_before = ALL_SLOTS & ~((1 << passed) - 1)
+        elif now is not None and day < now.date():
+            not_before = 0
+
+        day_free = []
+        for doc in doctors:
+            if in_index(leaves[doc['id']], day):
+                continue
+            free = free_mask(
+                masks.get((doc['id'], day), 0), duration, template_slots(templates[doc['id']], day)
+            ) & not_before
+            if free:
+                day_free.append((doc, free))
+
+        for i in range(SLOT_COUNT):
+            for doc, free in day_free:
+                if free >> i & 1:
+                    results.append({
+                        "doctor_id": doc['id'],
+                        "doctor": f"{doc['imie']} {doc['nazwisko']}",
+                        "date": day.isoformat(),
+                        "time": TIME_CHOICES[i][0],
+                    })
+                    if len(results) >= limit:
+                        return results
+        day += timedelta(days=1)
+    return results
@@ -0,0 +1,104 @@
+"""
+Narzędzia wspólne dla komend pomiarowych: tymczasowa baza danych,
+pomiar czasu, liczby zapytań i pamięci oraz zapis wyników do JSON.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+from django.db import connection, connections
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+
+@contextmanager
+def temporary_database(verbosity=0, path=None):
+    """
+    Tworzy pustą bazę testową, żeby pomiary nie dotykały danych z db.sqlite3.
+    Testy wielowątkowe podają ``path``, bo baza SQLite w pamięci nie jest
+    współdzielona między połączeniami tak jak plik.
+    """
+    if path:
+        connections["default"].settings_dict.setdefault("TEST", {})["NAME"] = path
+    setup_test_environment()
+    old_config = setup_databases(verbosity, interactive=False, aliases={"default"})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "p95": percentile(values, 0.95),
+        "max": max(values),
+    }
+
+
+def measure(func, repeat=5):
+    """
+    Uruchamia ``func`` kilka razy i zwraca czas (ms) oraz liczbę zapytań.
+    Szczytowa pamięć (KiB) jest mierzona w osobnym przebiegu, bo tracemalloc
+    zawyża czasy.
+    """
+    wall, queries = [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            wall.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return {
+        "wall_ms": summarize(wall),
+        "queries": max(queries),
+        "peak_kib": peak,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, kind, results, **extra):
+    payload = {
+        "kind": kind,
+        "commit": git_revision(),
+        "created_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        **extra,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2, ensure_ascii=False)
+    return payload
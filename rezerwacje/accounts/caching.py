@@ -0,0 +1,38 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+
+VERSION_KEY = "version:{}"
+
+
+def get_version(name):
+    """
+    Wersja (znacznik czasu ostatniej zmiany) danych o nazwie ``name``.
+    Brak wpisu w cache traktujemy jak zmianę "teraz", co jest bezpieczne.
+    """
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key, time.time())
+    return version
+
+
+def bump_version(name):
+    cache.set(VERSION_KEY.format(name), time.time(), None)
+
+
+def version_datetime(version):
+    return datetime.fromtimestamp(int(version), tz=dt_timezone.utc)
+
+
+def get_versions(names):
+    """Jak get_version, ale dla wielu nazw jednym odczytem z cache."""
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(list(keys))
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
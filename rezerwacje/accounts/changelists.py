@@ -0,0 +1,189 @@
+"""
+Listy panelu Django admin dla dużych tabel (wizyty, pacjenci, użytkownicy).
+Strony wyznacza kursor (keyset) zamiast OFFSET, liczba wyników powyżej progu
+jest szacowana, kolumny listy pobierane jednym zapytaniem z JOIN-ami i tylko
+potrzebnymi polami, a hierarchia dat korzysta z indeksu zamiast DISTINCT po
+całej tabeli.
+"""
+import calendar
+import copy
+from datetime import date
+from functools import cached_property
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters, ShowFacets
+from django.contrib.admin.views.main import ChangeList
+from django.db import DatabaseError, connections
+from django.utils import formats
+from django.utils.text import capfirst
+
+from .pagination import keyset_page
+
+CURSOR_VAR = "cursor"
+COUNT_THRESHOLD = 10000
+
+
+def table_estimate(model, using):
+    """Przybliżona liczba wierszy tabeli z statystyk ANALYZE (sqlite_stat1) albo None."""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return None
+    try:
+        with connection.cursor() as cursor:
+            # Pierwsza liczba w stat to liczba wierszy indeksu; indeksy częściowe mają ich mniej.
+            cursor.execute("SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return row[0] if row else None
+
+
+def estimated_count(queryset, threshold=COUNT_THRESHOLD):
+    """
+    (liczba, czy dokładna). Liczy co najwyżej ``threshold`` + 1 wierszy; powyżej
+    progu zwraca szacunek ze statystyk tabeli (dla listy bez filtrów) albo próg.
+    """
+    count = queryset.order_by().values("pk")[:threshold + 1].count()
+    if count <= threshold:
+        return count, True
+    estimate = None if queryset.query.has_filters() else table_estimate(queryset.model, queryset.db)
+    return max(estimate or 0, threshold), False
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList stronicowany kursorem po ``model_admin.keyset_ordering``."""
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR) or None
+        if CURSOR_VAR in request.GET:
+            # Kursor nie jest filtrem: bez niego linki filtrów i sortowania wracają na pierwszą stronę.
+            request = copy.copy(request)
+            request.GET = request.GET.copy()
+            del request.GET[CURSOR_VAR]
+        super().__init__(request, *args, **kwargs)
+
+    def get_results(self, request):
+        ordering = self.model_admin.keyset_ordering
+        fields = {*self.model_admin.list_only, *(field.lstrip("-") for field in ordering)}
+        try:
+            items, next_cursor = keyset_page(
+                self.queryset.only(*fields), ordering, self.cursor, self.list_per_page
+            )
+        except ValueError:
+            raise IncorrectLookupParameters
+        self.result_count, self.result_count_exact = estimated_count(
+            self.queryset, self.model_admin.count_threshold
+        )
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = items
+        self.next_cursor = next_cursor
+        self.can_show_all = False
+        self.multi_page = bool(next_cursor or self.cursor)
+        self.paginator = None
+
+    @property
+    def result_count_display(self):
+        count = formats.number_format(self.result_count, force_grouping=True)
+        if self.result_count_exact:
+            return count
+        return f"ok. {count}" if self.result_count > self.model_admin.count_threshold else f"ponad {count}"
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}) if self.next_cursor else None
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string() if self.cursor else None
+
+    @cached_property
+    def date_hierarchy_links(self):
+        """
+        Odpowiednik tagu date_hierarchy bez zapytań DISTINCT: lata wyznacza
+        najwcześniejsza i najpóźniejsza data (dwa odczyty indeksu), miesiące
+        i dni wynikają z kalendarza.
+        """
+        field = self.date_hierarchy
+        year_field, month_field, day_field = (f"{field}__{part}" for part in ("year", "month", "day"))
+
+        def link(filters):
+            return self.get_query_string(filters, [f"{field}__"])
+
+        try:
+            year, month, day = (
+                int(self.params[name]) if self.params.get(name) else None
+                for name in (year_field, month_field, day_field)
+            )
+            year and date(year, month or 1, day or 1)
+        except ValueError:
+            return {"show": False}
+
+        if year and month and day:
+            selected = date(year, month, day)
+            return {
+                "show": True,
+                "back": {
+                    "link": link({year_field: year, month_field: month}),
+                    "title": capfirst(formats.date_format(selected, "YEAR_MONTH_FORMAT")),
+                },
+                "choices": [{"title": capfirst(formats.date_format(selected, "MONTH_DAY_FORMAT"))}],
+            }
+        if year and month:
+            return {
+                "show": True,
+                "back": {"link": link({year_field: year}), "title": str(year)},
+                "choices": [
+                    {
+                        "link": link({year_field: year, month_field: month, day_field: number}),
+                        "title": capfirst(formats.date_format(date(year, month, number), "MONTH_DAY_FORMAT")),
+                    }
+                    for number in range(1, calendar.monthrange(year, month)[1] + 1)
+                ],
+            }
+        if year:
+            return {
+                "show": True,
+                "back": {"link": link({}), "title": "Wszystkie daty"},
+                "choices": [
+                    {
+                        "link": link({year_field: year, month_field: number}),
+                        "title": capfirst(formats.date_format(date(year, number, 1), "YEAR_MONTH_FORMAT")),
+                    }
+                    for number in range(1, 13)
+                ],
+            }
+        dates = self.root_queryset.order_by().values_list(field, flat=True)
+        first, last = dates.order_by(field).first(), dates.order_by(f"-{field}").first()
+        if first is None:
+            return {"show": False}
+        return {
+            "show": True,
+            "choices": [
+                {"link": link({year_field: number}), "title": str(number)}
+                for number in range(first.year, last.year + 1)
+            ],
+        }
+
+
+class HighVolumeAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin dla tabel z milionami wierszy. Podklasa ustawia
+    ``keyset_ordering`` (kolumny indeksu, ostatnia unikalna) i ``list_only``
+    (pola potrzebne kolumnom listy); wyszukiwanie powinna oprzeć na prefiksach
+    w indeksach, nadpisując get_search_results.
+    """
+    change_list_template = "admin/keyset_change_list.html"
+    keyset_ordering = ("-id",)
+    list_only = ()
+    count_threshold = COUNT_THRESHOLD
+    show_full_result_count = False
+    show_facets = ShowFacets.NEVER
+    sortable_by = ()
+
+    def get_ordering(self, request):
+        return self.keyset_ordering
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
@@ -0,0 +1,115 @@
+"""
+Produkcyjny profil SQLite i router odczytów. Profil włącza WAL (czytelnicy nie
+blokują zapisu), rozpoczyna transakcje od razu w trybie IMMEDIATE (zamiast
+"database is locked" przy podnoszeniu blokady czekamy na swoją kolej) i utrzymuje
+połączenia między żądaniami. Drugie połączenie, "replica", otwiera ten sam plik
+tylko do odczytu; trafiają do niego zapytania widoków oznaczonych replica_reads.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+
+REPLICA = 'replica'
+SQLITE_TIMEOUT = 20
+CONN_MAX_AGE = 600
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-32000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def production_databases(path):
+    """
+    Ustawienia DATABASES dla pliku ``path``. Limit oczekiwania na blokadę
+    (busy_timeout) ustawia parametr ``timeout`` połączenia.
+    """
+    path = Path(path).resolve()
+    common = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    return {
+        'default': {
+            **common,
+            'NAME': path,
+            'OPTIONS': {
+                'init_command': ";".join(("PRAGMA journal_mode=WAL",) + SQLITE_PRAGMAS),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': SQLITE_TIMEOUT,
+            },
+        },
+        REPLICA: {
+            **common,
+            # Tryb WAL jest zapisany w pliku, więc połączenie tylko do odczytu go nie ustawia.
+            'NAME': path.as_uri() + '?mode=ro',
+            'OPTIONS': {
+                'init_command': ";".join(SQLITE_PRAGMAS + ("PRAGMA query_only=1",)),
+                'timeout': SQLITE_TIMEOUT,
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def use_replica(view):
+    """
+    Odczyty żądań GET/HEAD widoku idą do połączenia tylko do odczytu.
+    Zapisy (POST) zostają w całości na głównym połączeniu.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            with replica_reads():
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """
+    Bez bazy "replica" w DATABASES router niczego nie zmienia. Odczyty w otwartej
+    transakcji zostają na głównym połączeniu, żeby widziały własne zmiany.
+    """
+
+    def db_for_read(self, model, **hints):
+        from django.db import connections
+
+        if not _replica_reads.get() or REPLICA not in connections.settings:
+            return None
+        if connections['default'].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
@@ -0,0 +1,186 @@
+"""
+Załączniki wniosków o wolne: wysyłka chronionych plików i miniatury skanów.
+Po sprawdzeniu uprawnień plik oddaje serwer WWW (X-Sendfile / X-Accel-Redirect);
+bez takiego serwera Django wysyła go sam, obsługując ETag i zakresy (Range).
+"""
+import logging
+import mimetypes
+import os
+import re
+from io import BytesIO
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png')
+THUMBNAIL_SIZE = (320, 320)
+DOCUMENT_MAX_AGE = 60 * 60
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def can_view_document(user, leave):
+    if user.account_type == 'admin':
+        return True
+    return user.account_type == 'doctor' and leave.doctor.user_id == user.id
+
+
+def is_image(name):
+    return bool(name) and name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def file_etag(stat):
+    return quote_etag(f"{stat.st_size:x}-{int(stat.st_mtime):x}")
+
+
+def parse_range(header, size):
+    """
+    Zakres z nagłówka Range jako (początek, koniec włącznie) albo None, gdy
+    nagłówek jest nieobsługiwany (np. kilka zakresów) i należy wysłać cały plik.
+    Niespełnialny zakres zgłasza ValueError.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # "bytes=-500": ostatnie 500 bajtów.
+        start, end = max(size - int(end), 0), size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+class RangeFile:
+    """Widok na fragment pliku, który FileResponse czyta po kawałku."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _sendfile(path, name):
+    backend = getattr(settings, 'SENDFILE_BACKEND', '')
+    if backend == 'xsendfile':
+        response = HttpResponse()
+        # Nagłówek musi być ASCII: nazwy z polskimi znakami, spacjami czy "?" idą zakodowane jak w URL.
+        response['X-Sendfile'] = quote(path)
+    elif backend == 'xaccel':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.SENDFILE_URL + quote(name)
+    else:
+        return None
+    # Typ i długość ustala serwer WWW na podstawie pliku.
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, field):
+    """
+    Odpowiedź z plikiem z pola FileField. Odpowiedzi są prywatne (tylko cache
+    przeglądarki) i warunkowe: niezmieniony plik kończy się kodem 304.
+    """
+    path = field.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse("Plik nie istnieje.", status=404)
+    etag = file_etag(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _sendfile(path, field.name) or _file_response(request, path, stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    patch_cache_control(response, private=True, max_age=DOCUMENT_MAX_AGE)
+    return response
+
+
+def _file_response(request, path, stat, etag):
+    filename = os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    size = stat.st_size
+    byte_range = None
+    header = request.headers.get('Range')
+    # If-Range: zakres tylko dla tej samej wersji pliku, inaczej cały plik.
+    if header and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type, filename=filename)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1), status=206, content_type=content_type, filename=filename
+        )
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response['Content-Length'] = end - start + 1
+    response.block_size = CHUNK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def pending_thumbnails():
+    """Wnioski ze skanem-obrazem, dla których nie próbowano jeszcze zrobić miniatury."""
+    from .models import LeaveRequest
+
+    leaves = LeaveRequest.objects.filter(document__iregex=r'\.(%s)$' % '|'.join(IMAGE_EXTENSIONS))
+    # Pusty napis (a nie NULL) oznacza nieudaną próbę – taki plik nie wraca do kolejki.
+    return leaves.filter(thumbnail__isnull=True).order_by('id')
+
+
+def make_thumbnail(leave):
+    """
+    Zapisuje miniaturę skanu jako JPEG. Zwraca False, gdy pliku nie da się
+    odczytać jako obrazu; brak Pillow zgłasza ImproperlyConfigured.
+    """
+    if Image is None:
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured("Miniatury wymagają pakietu Pillow (pip install Pillow).")
+    try:
+        with leave.document.open('rb') as source, Image.open(source) as image:
+            image.draft('RGB', THUMBNAIL_SIZE)
+            image = image.convert('RGB')
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=80, optimize=True)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning("Nie udało się utworzyć miniatury wniosku %s: %s", leave.pk, e)
+        leave.thumbnail = ''
+        leave.save(update_fields=['thumbnail'])
+        return False
+    name = os.path.splitext(os.path.basename(leave.document.name))[0] + '.jpg'
+    leave.thumbnail.save(name, ContentFile(output.getvalue()), save=False)
+    leave.save(update_fields=['thumbnail'])
+    return True
@@ -0,0 +1,83 @@
+import calendar
+import csv
+
+from .availability import as_date
+from .models import Appointment
+
+EXPORT_HEADERS = [
+    "ID", "Data", "Godzina", "Status", "Pacjent", "PESEL", "Lekarz",
+    "Specjalizacja", "Typ wizyty", "Recepta", "Zalecenia", "Uwagi",
+]
+EXPORT_FIELDS = [
+    'id', 'date', 'time', 'status',
+    'patient__imie', 'patient__nazwisko', 'patient__pesel',
+    'doctor__imie', 'doctor__nazwisko',
+    'specialization__name', 'type__name',
+    'summary__prescription', 'summary__recommendations', 'notes',
+]
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-bufor dla csv.writer: zwraca zapisany wiersz zamiast go przechowywać."""
+
+    def write(self, value):
+        return value
+
+
+def month_range(month):
+    year, month = (int(part) for part in month.split('-'))
+    return as_date(f"{year:04d}-{month:02d}-01"), as_date(f"{year:04d}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}")
+
+
+def export_queryset(date_from, date_to, doctor_id=None, specialization_id=None):
+    appointments = Appointment.objects.filter(date__range=(date_from, date_to))
+    if doctor_id:
+        appointments = appointments.filter(doctor_id=doctor_id)
+    if specialization_id:
+        appointments = appointments.filter(specialization_id=specialization_id)
+    return appointments.order_by('date', 'time', 'id').values_list(*EXPORT_FIELDS)
+
+
+def export_rows(queryset):
+    """Wiersze raportu pobierane porcjami (QuerySet.iterator), bez tworzenia obiektów modeli."""
+    statuses = dict(Appointment.STATUS_CHOICES)
+    for (pk, day, time, status, imie, nazwisko, pesel, doctor_imie, doctor_nazwisko,
+         specialization, type_name, prescription, recommendations, notes) in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            pk,
+            day.isoformat(),
+            time.strftime("%H:%M"),
+            statuses.get(status, status),
+            f"{imie} {nazwisko}".strip(),
+            pesel,
+            f"{doctor_imie} {doctor_nazwisko}" if doctor_imie else "",
+            specialization,
+            type_name,
+            prescription or "",
+            recommendations or "",
+            notes or "",
+        ]
+
+
+def csv_chunks(rows):
+    writer = csv.writer(Echo(), delimiter=';')
+    # BOM, żeby Excel poprawnie odczytał polskie znaki.
+    yield '\ufeff' + writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows, fileobj):
+    """Zapis w trybie write_only openpyxl, więc pamięć nie rośnie z liczbą wierszy."""
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise RuntimeError("Eksport XLSX wymaga pakietu openpyxl (pip install openpyxl).") from e
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Wizyty")
+    sheet.append(EXPORT_HEADERS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
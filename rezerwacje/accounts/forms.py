@@ -1,8 +1,51 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import User, LeaveRequest, Patient, Doctor, Specialization, Appointment, AppointmentType, VisitSummary
+from .models import User, LeaveRequest, Patient, Doctor, Specialization, Appointment, AppointmentType, VisitSummary, WaitlistEntry
 from django.core.exceptions import ValidationError
+from django.urls import reverse, reverse_lazy
+from django.utils.html import format_html
 from datetime import time, timedelta, datetime, timezone
+from .services import DOCTOR_SLOT_TAKEN
+from .leaves import ON_LEAVE_MESSAGE, is_on_leave
+from .availability import SLOT_MINUTES, TIME_CHOICES, as_date, free_time_choices, generate_time_choices, slot_taken
+from .slot_templates import type_duration
+from .search import PATIENT_SEARCH_MIN_LENGTH, patient_label
+from .waitlist import WAITLIST_MAX_DAYS, WAITLIST_MAX_ENTRIES
+
+
+class PatientAutocompleteWidget(forms.Widget):
+    """
+    Pole wyboru pacjenta z podpowiedziami z widoku patient_search. Formularz
+    wysyła tylko id (ukryte pole), więc strona nie zawiera listy pacjentów,
+    a walidacja sprawdza jedynie wskazany rekord.
+    """
+
+    class Media:
+        js = ["js/patient_autocomplete.js"]
+
+    def _label(self, value):
+        if not value:
+            return ""
+        row = Patient.objects.filter(pk=value).values_list('imie', 'nazwisko', 'pesel').first()
+        return patient_label(*row) if row else ""
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        field_id = attrs.get('id') or f"id_{name}"
+        try:
+            label = self._label(value)
+        except (TypeError, ValueError):
+            label = ""
+        return format_html(
+            '<input type="hidden" name="{}" id="{}_value" value="{}">'
+            '<input type="search" class="form-control patient-autocomplete" id="{}" value="{}" '
+            'list="{}_options" autocomplete="off" placeholder="Nazwisko, imię lub PESEL" '
+            'data-url="{}" data-target="{}_value" data-min-length="{}">'
+            '<datalist id="{}_options"></datalist>',
+            name, field_id, value or "",
+            field_id, label, field_id, reverse('patient_search'), field_id, PATIENT_SEARCH_MIN_LENGTH,
+            field_id,
+        )
 
 class PatientRegisterForm(UserCreationForm):
     pesel = forms.CharField(max_length=11, required=True)
@@ -90,28 +133,31 @@ class DoctorRegisterForm(UserCreationForm):
             )
         return user
     
-def generate_time_choices(start="08:00", end="20:00", step=30):
-    choices = []
-    start_dt = datetime.strptime(start, "%H:%M")
-    end_dt = datetime.strptime(end, "%H:%M")
-    current = start_dt
-    while current<=end_dt:
-        choices.append((current.strftime("%H:%M"), current.strftime("%H:%M")))
-        current += timedelta(minutes=step)
-    return choices
-
-TIME_CHOICES = generate_time_choices()
-    
+def _data_duration(data):
+    """Czas trwania typu wizyty wybranego w przesłanym formularzu (domyślnie jeden slot)."""
+    try:
+        return type_duration(int(data.get('type')))
+    except (ValueError, TypeError):
+        return SLOT_MINUTES
+
+def _live_time_select():
+    """Lista godzin odświeżana przez js/live_slots.js ze strumienia slot_stream."""
+    return forms.Select(attrs={'data-live-slots': reverse_lazy('slot_stream')})
+
 class AppointmentPatientForm(forms.ModelForm):
     time=forms.ChoiceField(
         choices=TIME_CHOICES,
         label="Godzina",
+        widget=_live_time_select(),
     )
 
     class Meta:
         model = Appointment
         fields = ['specialization','doctor','type','date','time']
         widgets = { 'date': forms.DateInput(attrs={'type':'date'}),}
+
+    class Media:
+        js = ["js/live_slots.js"]
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -135,15 +181,12 @@ class AppointmentPatientForm(forms.ModelForm):
             date = self.data.get('date')
 
             if doctor_id and date:
-                taken_times = Appointment.objects.filter(
-                    doctor_id=doctor_id,
-                    date=date
-                ).values_list('time',flat=True)
-
-                available_times = [
-                    (t, t) for t in dict(TIME_CHOICES).keys() if t not in [str(x) for x in taken_times]
-                ]
-                self.fields['time'].choices = available_times
+                try:
+                    self.fields['time'].choices = free_time_choices(
+                        int(doctor_id), as_date(date), exclude=self.instance, duration=_data_duration(self.data)
+                    )
+                except (ValueError, TypeError):
+                    pass
 
     def clean(self):
         cleaned_data = super().clean()
@@ -154,17 +197,14 @@ class AppointmentPatientForm(forms.ModelForm):
         if not doctor or not date or not time:
             return cleaned_data
         
-        if Appointment.objects.filter(doctor=doctor, date=date, time=time).exists():
-            raise forms.ValidationError(
-                f"Lekarz {doctor.imie} {doctor.nazwisko} ma już wizytę w tym terminie."
-            )
-        
-        if self.instance.pk:
-            patient=self.instance.patient
-        else:
-            patient=self.initial.get('patient') or self.data.get('patient') or None
-        if patient and Appointment.objects.filter(patient=patient, date=date, time=time).exists():
-            raise forms.ValidationError("Masz już umówioną wizytę w tym terminie.")
+        if is_on_leave(doctor.id, date):
+            raise forms.ValidationError(ON_LEAVE_MESSAGE.format(doctor=doctor))
+
+        appointment_type = cleaned_data.get('type')
+        duration = type_duration(appointment_type.id) if appointment_type else SLOT_MINUTES
+        if slot_taken(doctor.id, date, time, exclude=self.instance, duration=duration):
+            raise forms.ValidationError(DOCTOR_SLOT_TAKEN.format(doctor=doctor))
+        # Podwójna rezerwacja pacjenta jest blokowana przez ograniczenie w bazie (zob. services.book_appointment).
         return cleaned_data
 
 
@@ -172,12 +212,13 @@ class AppointmentAdminForm(forms.ModelForm):
     time = forms.ChoiceField(
         choices=TIME_CHOICES,
         label="Godzina",
+        widget=_live_time_select(),
     )
 
     patient = forms.ModelChoiceField(
         queryset=Patient.objects.all(),
         label="Pacjent",
-        widget=forms.Select
+        widget=PatientAutocompleteWidget
     )
     
     class Meta:
@@ -185,10 +226,15 @@ class AppointmentAdminForm(forms.ModelForm):
         fields = ['patient','specialization','doctor','type','date','time']
         widgets = {'date':forms.DateInput(attrs={'type':'date'}),}
 
+    class Media:
+        js = ["js/live_slots.js"]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['doctor'].queryset=Doctor.objects.none()
-        self.fields['patient'].label_from_instance = lambda obj: f"{obj.imie} {obj.nazwisko} ({obj.pesel})"
+        if self.instance.pk:
+            # Własny termin edytowanej wizyty pozostaje na liście wolnych godzin.
+            self.fields['time'].widget.attrs['data-exclude'] = self.instance.pk
 
         if 'specialization' in self.data:
             try:
@@ -203,14 +249,12 @@ class AppointmentAdminForm(forms.ModelForm):
             doctor_id = self.data.get('doctor')
             date = self.data.get('date')
             if doctor_id and date:
-                taken_times=Appointment.objects.filter(
-                    doctor_id=doctor_id,
-                    date=date
-                ).values_list('time',flat=True)
-                available_times=[
-                    (t,t) for t in dict(TIME_CHOICES).keys() if t not in [str(x) for x in taken_times]
-                ]
-                self.fields['time'].choices=available_times
+                try:
+                    self.fields['time'].choices = free_time_choices(
+                        int(doctor_id), as_date(date), exclude=self.instance, duration=_data_duration(self.data)
+                    )
+                except (ValueError, TypeError):
+                    pass
     
     def clean(self):
         cleaned_data = super().clean()
@@ -222,15 +266,13 @@ class AppointmentAdminForm(forms.ModelForm):
         if not doctor or not patient or not date or not time:
             return cleaned_data
         
-        if Appointment.objects.filter(doctor=doctor, date=date, time=time).exists():
-            raise forms.ValidationError(
-                f"Lekarz {doctor.imie} {doctor.nazwisko} ma już wizytę w tym terminie."
-            )
-        
-        if Appointment.objects.filter(patient=patient, date=date, time=time).exists():
-            raise forms.ValidationError(
-                "Pacjent ma już wizytę w tym terminie."
-            )
+        if is_on_leave(doctor.id, date):
+            raise forms.ValidationError(ON_LEAVE_MESSAGE.format(doctor=doctor))
+
+        appointment_type = cleaned_data.get('type')
+        duration = type_duration(appointment_type.id) if appointment_type else SLOT_MINUTES
+        if slot_taken(doctor.id, date, time, exclude=self.instance, duration=duration):
+            raise forms.ValidationError(DOCTOR_SLOT_TAKEN.format(doctor=doctor))
         return cleaned_data
     
 class VisitSummaryForm(forms.ModelForm):
@@ -267,4 +309,45 @@ class LeaveRequestForm(forms.ModelForm):
             raise ValidationError("Dla chorobowego musisz załączyć plik potwierdzający zwolnienie.")
         if start_date and end_date and start_date > end_date:
             raise ValidationError("Data zakończenia wolnego nie może być wcześniejsza niż data rozpoczęcia.")
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class WaitlistForm(forms.ModelForm):
+    """Zapis na listę oczekujących; pola z prefiksem, bo formularz stoi obok formularza rezerwacji."""
+    prefix = 'waitlist'
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['specialization', 'doctor', 'type', 'date_from', 'date_to', 'auto_book']
+        widgets = {
+            'date_from': forms.DateInput(attrs={'type': 'date'}),
+            'date_to': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+    def __init__(self, *args, patient=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.patient = patient
+        self.fields['doctor'].queryset = Doctor.objects.none()
+        self.fields['doctor'].empty_label = "Dowolny lekarz"
+
+        specialization = self.data.get(self.add_prefix('specialization'))
+        if specialization:
+            try:
+                self.fields['doctor'].queryset = Doctor.objects.filter(specjalizacja_id=int(specialization))
+            except (ValueError, TypeError):
+                pass
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+
+        from django.utils import timezone
+        today = timezone.localdate()
+
+        if date_from and date_from < today:
+            raise ValidationError("Data początkowa nie może być z przeszłości.")
+        if date_from and date_to and (date_to - date_from).days >= WAITLIST_MAX_DAYS:
+            raise ValidationError(f"Okno oczekiwania może obejmować najwyżej {WAITLIST_MAX_DAYS} dni.")
+        if self.patient and self.patient.waitlist_entries.filter(status='waiting').count() >= WAITLIST_MAX_ENTRIES:
+            raise ValidationError(f"Możesz mieć najwyżej {WAITLIST_MAX_ENTRIES} aktywnych wpisów na liście oczekujących.")
+        return cleaned_data
@@ -0,0 +1,76 @@
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .availability import as_date
+
+LEAVE_INDEX_KEY = "leave_index:{}"
+ON_LEAVE_MESSAGE = "Lekarz {doctor.imie} {doctor.nazwisko} przebywa w tym dniu na zatwierdzonym urlopie."
+
+
+def _merge(ranges):
+    """Scala nachodzące i sąsiadujące przedziały dni (liczby porządkowe dat)."""
+    starts, ends = [], []
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return tuple(starts), tuple(ends)
+
+
+def _load(doctor_ids):
+    from .models import LeaveRequest
+
+    ranges = {doctor_id: [] for doctor_id in doctor_ids}
+    for doctor_id, start, end in LeaveRequest.objects.filter(
+        doctor_id__in=doctor_ids, status='approved'
+    ).values_list('doctor_id', 'start_date', 'end_date'):
+        ranges[doctor_id].append((start.toordinal(), end.toordinal()))
+    return {doctor_id: _merge(doctor_ranges) for doctor_id, doctor_ranges in ranges.items()}
+
+
+def _timeout():
+    # Sygnał unieważnia tylko cache własnego procesu; pozostałe wczytają indeks z bazy po wygaśnięciu.
+    return getattr(settings, 'SCHEDULE_CACHE_TIMEOUT', 60)
+
+
+def rebuild_leave_index(doctor_id):
+    index = _load([doctor_id])[doctor_id]
+    cache.set(LEAVE_INDEX_KEY.format(doctor_id), index, _timeout())
+    return index
+
+
+def leave_indexes(doctor_ids):
+    """
+    Posortowane, scalone przedziały zatwierdzonych urlopów dla wielu lekarzy.
+    Brakujące w cache indeksy budowane są jednym zapytaniem.
+    """
+    keys = {LEAVE_INDEX_KEY.format(doctor_id): doctor_id for doctor_id in doctor_ids}
+    found = cache.get_many(list(keys))
+    indexes = {keys[key]: index for key, index in found.items()}
+    missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in indexes]
+    if missing:
+        loaded = _load(missing)
+        cache.set_many({LEAVE_INDEX_KEY.format(doctor_id): index for doctor_id, index in loaded.items()}, _timeout())
+        indexes.update(loaded)
+    return indexes
+
+
+def leave_index(doctor_id):
+    return leave_indexes([doctor_id])[doctor_id]
+
+
+def in_index(index, day):
+    """Wyszukiwanie binarne: czy dzień ``day`` leży w którymś przedziale indeksu."""
+    starts, ends = index
+    position = bisect_right(starts, as_date(day).toordinal()) - 1
+    return position >= 0 and ends[position] >= as_date(day).toordinal()
+
+
+def is_on_leave(doctor_id, day):
+    if not doctor_id or not day:
+        return False
+    return in_index(leave_index(int(doctor_id)), day)
@@ -0,0 +1,125 @@
+"""
+Zmiany zajętości dnia lekarza na żywo dla formularzy rezerwacji (server-sent
+events). Po zatwierdzeniu transakcji zmieniającej wizytę sygnał publikuje
+bitmapę dnia (lekarz, data) do brokera, a broker przekazuje ją otwartym
+strumieniom tego dnia. Każdy strumień wylicza z bitmapy wolne godziny dla
+swojego czasu trwania wizyty bez zapytań do bazy.
+
+Domyślny LocalBroker rozsyła wiadomości w obrębie jednego procesu. Przy kilku
+procesach serwera trzeba wskazać w LIVE_SLOTS_BROKER broker współdzielony
+(z tym samym interfejsem: subscribe, unsubscribe, has_subscribers, publish).
+"""
+import asyncio
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .availability import free_mask, mask_times, occupied_mask, taken_mask
+from .leaves import is_on_leave
+from .slot_templates import open_slots, type_duration
+
+# Strumień kończy się po tym czasie, a EventSource łączy się ponownie po RETRY_MS.
+STREAM_SECONDS = 10 * 60
+KEEPALIVE_SECONDS = 25
+RETRY_MS = 3000
+
+
+def day_key(doctor_id, day):
+    return f"{doctor_id}:{day.isoformat()}"
+
+
+class Subscription:
+    """
+    Odbiorca jednego strumienia. Wiadomość to pełny stan dnia, więc trzymana
+    jest tylko ostatnia: wolny klient nie gromadzi zaległości.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.message = None
+        self.ready = asyncio.Event()
+
+    def deliver(self, message):
+        # Publikacja przychodzi z wątku widoku synchronicznego, odbiorca czeka w pętli zdarzeń.
+        self.loop.call_soon_threadsafe(self._set, message)
+
+    def _set(self, message):
+        self.message = message
+        self.ready.set()
+
+    async def next(self, timeout):
+        """Najnowsza wiadomość albo None, gdy przez ``timeout`` sekund nic nie przyszło."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        message, self.message = self.message, None
+        return message
+
+
+class LocalBroker:
+    """Rozsyłanie wiadomości do odbiorców w tym samym procesie."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, loop=None):
+        subscription = Subscription(loop or asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, key, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def has_subscribers(self, key):
+        return key in self._subscribers
+
+    def publish(self, key, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'LIVE_SLOTS_BROKER', 'accounts.live.LocalBroker'))()
+
+
+def publish_day(doctor_id, day):
+    """Wysyła aktualną bitmapę dnia lekarza; bez odbiorców nie czyta bazy."""
+    broker, key = get_broker(), day_key(doctor_id, day)
+    if doctor_id and broker.has_subscribers(key):
+        broker.publish(key, {"taken": taken_mask(doctor_id, day)})
+
+
+def free_times(doctor_id, day, taken, duration, own=0):
+    """Wolne godziny dnia przy bitmapie ``taken`` (bez slotów edytowanej wizyty ``own``)."""
+    if is_on_leave(doctor_id, day):
+        return []
+    return mask_times(free_mask(taken & ~own, duration, open_slots(doctor_id, day)))
+
+
+def own_mask(appointment, doctor_id, day):
+    """Sloty edytowanej wizyty, jeśli leży w obserwowanym dniu (inaczej 0)."""
+    if appointment is None or appointment.status == 'canceled':
+        return 0
+    if appointment.doctor_id != doctor_id or appointment.date != day:
+        return 0
+    return occupied_mask(appointment.time, type_duration(appointment.type_id))
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.archive import archivable, archive_appointments, archive_horizon
+
+
+class Command(BaseCommand):
+    help = (
+        "Przenosi zakończone i odwołane wizyty starsze niż --days dni (z podsumowaniami) "
+        "do archiwum. Każda paczka to osobna transakcja; przerwaną komendę można uruchomić ponownie."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="Horyzont: wizyty starsze niż tyle dni.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--max-batches", type=int, default=None)
+        parser.add_argument("--pause", type=float, default=0.0, help="Przerwa między paczkami [s], by nie blokować zapisów.")
+
+    def handle(self, *args, **options):
+        horizon = archive_horizon(options["days"])
+        self.stdout.write(f"Do przeniesienia (sprzed {horizon}): {archivable(horizon).count()}")
+        appointments = summaries = 0
+        started = time.perf_counter()
+        try:
+            for batch, (moved, moved_summaries) in enumerate(
+                archive_appointments(horizon, options["batch_size"], options["max_batches"]), start=1
+            ):
+                appointments += moved
+                summaries += moved_summaries
+                self.stdout.write(f"Paczka {batch}: wizyty {moved}, podsumowania {moved_summaries}")
+                if options["pause"]:
+                    time.sleep(options["pause"])
+        except KeyboardInterrupt:
+            self.stderr.write("Przerwano; przeniesione paczki pozostają w archiwum.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Przeniesiono wizyt: {appointments}, podsumowań: {summaries} w {time.perf_counter() - started:.1f} s. "
+            f"Pozostało: {archivable(horizon).count()}"
+        ))
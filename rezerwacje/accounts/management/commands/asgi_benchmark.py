@@ -0,0 +1,136 @@
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from accounts.benchmarking import percentile, temporary_database, write_results
+from accounts.models import Doctor, Patient, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Porównuje przepustowość (żądania/s) widoków obsługiwanych przez stos WSGI "
+        "(pula wątków) i ASGI (pętla zdarzeń) przy rosnącej współbieżności. "
+        "Żądania trafiają do handlerów Django w procesie, bez serwera sieciowego."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--appointments", type=int, default=5000)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+        parser.add_argument("--requests", type=int, default=400, help="Liczba żądań na scenariusz i poziom współbieżności.")
+        parser.add_argument("--output", default="asgi_bench_output.json")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        results = []
+        # Plik zamiast bazy w pamięci: wątki i pętla zdarzeń używają osobnych połączeń.
+        handle, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        try:
+            with temporary_database(path=path):
+                users = self._generate(options["appointments"], options["seed"])
+                for scenario, user, url, params in self._scenarios(users):
+                    for concurrency in options["concurrency"]:
+                        for stack, run in (("wsgi", self._run_wsgi), ("asgi", self._run_asgi)):
+                            stats = run(user, url, params, concurrency, options["requests"])
+                            results.append({"scenario": scenario, "stack": stack, "concurrency": concurrency, **stats})
+                            self.stdout.write(
+                                f"  {scenario:24} {stack} x{concurrency:<4} {stats['rps']:9.1f} req/s "
+                                f"p95 {stats['latency_ms']['p95']:8.2f} ms błędy {stats['errors']}"
+                            )
+        finally:
+            os.path.exists(path) and os.remove(path)
+
+        write_results(
+            options["output"], "asgi", results,
+            appointments=options["appointments"], requests=options["requests"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Zapisano wyniki do {options['output']}"))
+
+    def _generate(self, size, seed):
+        doctors = max(5, size // 2000)
+        call_command(
+            "generate_data",
+            appointments=size,
+            doctors=doctors,
+            patients=max(doctors, size // 10),
+            days=max(30, -(-size // (doctors * 6))),
+            leaves=max(10, doctors * 2),
+            seed=seed,
+            stdout=StringIO(),
+        )
+        return {
+            "admin": User.objects.create(username="bench_admin", account_type="admin", is_staff=True),
+            "patient": Patient.objects.select_related("user").order_by("id").first().user,
+            "doctor": Doctor.objects.select_related("user").order_by("id").first(),
+        }
+
+    def _scenarios(self, users):
+        specialization = {"specialization": users["doctor"].specjalizacja_id}
+        return [
+            ("get_doctors", users["patient"], reverse("get_doctors"), specialization),
+            ("get_free_slots", users["patient"], reverse("get_free_slots"), specialization),
+            ("patient_dashboard", users["patient"], reverse("patient_dashboard"), {}),
+            ("doctor_dashboard", users["doctor"].user, reverse("doctor_dashboard"), {}),
+            ("admin_appointments_page", users["admin"], reverse("admin_appointments"), {}),
+        ]
+
+    def _summary(self, latencies, errors, elapsed):
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": len(latencies) / elapsed if elapsed else None,
+            "latency_ms": {
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+            },
+        }
+
+    def _run_wsgi(self, user, url, params, concurrency, total):
+        clients = []
+        for _ in range(concurrency):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        def worker(index):
+            client = clients[index % concurrency]
+            started = time.perf_counter()
+            status = client.get(url, params).status_code
+            return (time.perf_counter() - started) * 1000, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, range(total)))
+        elapsed = time.perf_counter() - started
+        return self._summary([ms for ms, _ in outcomes], sum(status >= 400 for _, status in outcomes), elapsed)
+
+    def _run_asgi(self, user, url, params, concurrency, total):
+        async def run():
+            clients = []
+            for _ in range(concurrency):
+                client = AsyncClient()
+                await client.aforce_login(user)
+                clients.append(client)
+            limit = asyncio.Semaphore(concurrency)
+
+            async def one(index):
+                async with limit:
+                    started = time.perf_counter()
+                    response = await clients[index % concurrency].get(url, params)
+                    return (time.perf_counter() - started) * 1000, response.status_code
+
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(one(i) for i in range(total)))
+            return outcomes, time.perf_counter() - started
+
+        outcomes, elapsed = asyncio.run(run())
+        return self._summary([ms for ms, _ in outcomes], sum(status >= 400 for _, status in outcomes), elapsed)
@@ -0,0 +1,103 @@
+import random
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.availability import next_free_slots
+from accounts.benchmarking import measure, temporary_database, write_results
+from accounts.forms import AppointmentAdminForm, AppointmentPatientForm
+from accounts.models import AppointmentType, Doctor, Patient, Specialization, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Mierzy czas, liczbę zapytań i szczytową pamięć widoków i formularzy "
+        "na syntetycznych danych różnej wielkości. Wyniki zapisuje do pliku JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Liczby wizyt w kolejnych zestawach danych.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--output", default="bench_output.json")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        results = []
+        for size in options["sizes"]:
+            self.stdout.write(f"Zestaw danych: {size} wizyt")
+            with temporary_database():
+                self._generate(size, options["seed"])
+                for scenario, func in self._scenarios(random.Random(options["seed"])):
+                    stats = measure(func, repeat=options["repeat"])
+                    results.append({"size": size, "scenario": scenario, **stats})
+                    self.stdout.write(
+                        f"  {scenario:32} {stats['wall_ms']['median']:9.2f} ms "
+                        f"{stats['queries']:4d} zapytań {stats['peak_kib']:10.1f} KiB"
+                    )
+
+        write_results(options["output"], "views", results, sizes=options["sizes"], repeat=options["repeat"])
+        self.stdout.write(self.style.SUCCESS(f"Zapisano wyniki do {options['output']}"))
+
+    def _generate(self, size, seed):
+        doctors = max(5, size // 2000)
+        call_command(
+            "generate_data",
+            appointments=size,
+            doctors=doctors,
+            patients=max(doctors, size // 10),
+            days=max(30, -(-size // (doctors * 6))),
+            leaves=max(10, doctors * 2),
+            seed=seed,
+            stdout=StringIO(),
+        )
+        User.objects.create(username="bench_admin", account_type="admin", is_staff=True)
+
+    def _scenarios(self, rng):
+        admin = User.objects.get(username="bench_admin")
+        patient = Patient.objects.select_related("user").order_by("id").first()
+        doctor = Doctor.objects.select_related("user").order_by("id").first()
+        specialization = Specialization.objects.order_by("id").first()
+        appointment_type = AppointmentType.objects.order_by("id").first()
+        today = timezone.localdate()
+
+        admin_client, patient_client, doctor_client = Client(), Client(), Client()
+        admin_client.force_login(admin)
+        patient_client.force_login(patient.user)
+        doctor_client.force_login(doctor.user)
+
+        # Pula wolnych terminów liczona poza pomiarem; każda rezerwacja bierze kolejny.
+        slots = next_free_slots(doctor.specjalizacja_id, today + timedelta(days=1), today + timedelta(days=60), limit=500)
+        slots = iter(rng.sample(slots, len(slots)))
+
+        def booking_data():
+            slot = next(slots)
+            return {
+                "specialization": doctor.specjalizacja_id,
+                "doctor": slot["doctor_id"],
+                "type": appointment_type.id,
+                "date": slot["date"],
+                "time": slot["time"],
+            }
+
+        def patient_form():
+            AppointmentPatientForm(booking_data()).is_valid()
+
+        def admin_form():
+            AppointmentAdminForm({**booking_data(), "patient": patient.id}).is_valid()
+
+        return [
+            ("admin_dashboard", lambda: admin_client.get(reverse("admin_dashboard"))),
+            ("admin_appointments_page", lambda: admin_client.get(reverse("admin_appointments"))),
+            ("patient_dashboard", lambda: patient_client.get(reverse("patient_dashboard"))),
+            ("patient_dashboard_booking", lambda: patient_client.post(reverse("patient_dashboard"), booking_data())),
+            ("doctor_dashboard", lambda: doctor_client.get(reverse("doctor_dashboard"))),
+            ("get_doctors", lambda: patient_client.get(reverse("get_doctors"), {"specialization": specialization.id})),
+            ("get_free_slots", lambda: patient_client.get(reverse("get_free_slots"), {"specialization": specialization.id})),
+            ("appointment_patient_form", patient_form),
+            ("appointment_admin_form", admin_form),
+        ]
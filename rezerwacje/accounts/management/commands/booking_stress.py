@@ -0,0 +1,122 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from accounts.availability import SLOT_TIMES
+from accounts.benchmarking import temporary_database
+from accounts.forms import AppointmentPatientForm
+from accounts.models import Appointment, AppointmentType, Doctor, Patient
+from accounts.services import OWN_SLOT_TAKEN, book_appointment
+
+
+class Command(BaseCommand):
+    help = (
+        "Test obciążeniowy rezerwacji: wiele wątków jednocześnie rezerwuje te same "
+        "terminy, a na końcu sprawdzane jest, czy żaden termin nie został zajęty dwukrotnie."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=50, help="Próby rezerwacji na wątek.")
+        parser.add_argument("--doctors", type=int, default=2)
+        parser.add_argument("--slots", type=int, default=4, help="Liczba spornych terminów na lekarza.")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        handle, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        try:
+            with temporary_database(path=path):
+                outcome = self._run(options)
+        finally:
+            os.path.exists(path) and os.remove(path)
+
+        self.stdout.write(
+            f"Udane: {outcome['booked']}, odrzucone (konflikt): {outcome['conflict']}, "
+            f"blokady bazy: {outcome['locked']}, czas: {outcome['elapsed']:.2f} s"
+        )
+        if outcome["doctor_duplicates"] or outcome["patient_duplicates"]:
+            raise CommandError(
+                f"Podwójne rezerwacje! Lekarz: {outcome['doctor_duplicates']}, pacjent: {outcome['patient_duplicates']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Brak podwójnych rezerwacji."))
+
+    def _run(self, options):
+        call_command(
+            "generate_data", doctors=options["doctors"], specializations=1, patients=max(options["threads"] * 2, options["doctors"]),
+            appointments=0, leaves=0, stdout=StringIO(),
+        )
+        doctors = list(Doctor.objects.all())
+        patients = list(Patient.objects.values_list("id", flat=True))
+        appointment_type = AppointmentType.objects.first()
+        day = timezone.localdate() + timezone.timedelta(days=7)
+        # Co drugi slot, żeby konflikty wynikały z tego samego terminu, a nie z reguły ±30 minut.
+        slots = [SLOT_TIMES[i].strftime("%H:%M") for i in range(0, 2 * options["slots"], 2)]
+
+        counter = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(options["threads"])
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = Counter()
+            barrier.wait()
+            try:
+                for _ in range(options["attempts"]):
+                    doctor = rng.choice(doctors)
+                    form = AppointmentPatientForm({
+                        "specialization": doctor.specjalizacja_id,
+                        "doctor": doctor.id,
+                        "type": appointment_type.id,
+                        "date": day.isoformat(),
+                        "time": rng.choice(slots),
+                    })
+                    try:
+                        if not form.is_valid():
+                            local["conflict"] += 1
+                            continue
+                        appointment = form.save(commit=False)
+                        appointment.patient_id = rng.choice(patients)
+                        book_appointment(appointment, patient_message=OWN_SLOT_TAKEN)
+                        local["booked"] += 1
+                    except ValidationError:
+                        local["conflict"] += 1
+                    except OperationalError:
+                        local["locked"] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    counter.update(local)
+
+        seed = options["seed"]
+        threads = [
+            threading.Thread(target=worker, args=(None if seed is None else seed + i,))
+            for i in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        active = Appointment.objects.filter(~Q(status="canceled"))
+        return {
+            "booked": counter["booked"],
+            "conflict": counter["conflict"],
+            "locked": counter["locked"],
+            "elapsed": elapsed,
+            "doctor_duplicates": active.values("doctor", "date", "time").annotate(n=Count("id")).filter(n__gt=1).count(),
+            "patient_duplicates": active.values("patient", "date", "time").annotate(n=Count("id")).filter(n__gt=1).count(),
+        }
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.waitlist import expire_entries
+
+
+class Command(BaseCommand):
+    help = (
+        "Zamyka wpisy listy oczekujących, których okno dat minęło. Uruchamiana "
+        "z crona raz na dobę; dopasowanie zwolnionych terminów i panel pacjenta "
+        "pomijają takie wpisy także bez niej."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Wygasłe wpisy: {expire_entries()}")
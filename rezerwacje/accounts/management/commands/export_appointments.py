@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.availability import as_date
+from accounts.exports import csv_chunks, export_queryset, export_rows, month_range, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "Eksportuje wizyty (z pacjentem, lekarzem, typem i podsumowaniem) do CSV lub XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Miesiąc w formacie RRRR-MM (domyślnie bieżący).")
+        parser.add_argument("--date-from")
+        parser.add_argument("--date-to")
+        parser.add_argument("--doctor", type=int)
+        parser.add_argument("--specialization", type=int)
+        parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+        parser.add_argument("--output", help="Plik wynikowy (dla CSV domyślnie standardowe wyjście).")
+
+    def handle(self, *args, **options):
+        try:
+            if options["date_from"] or options["date_to"]:
+                date_from = as_date(options["date_from"] or options["date_to"])
+                date_to = as_date(options["date_to"] or options["date_from"])
+            else:
+                date_from, date_to = month_range(options["month"] or timezone.localdate().strftime("%Y-%m"))
+        except ValueError as e:
+            raise CommandError(f"Niepoprawny zakres dat: {e}")
+
+        rows = export_rows(export_queryset(date_from, date_to, options["doctor"], options["specialization"]))
+
+        if options["format"] == "xlsx":
+            if not options["output"]:
+                raise CommandError("Dla formatu XLSX podaj --output.")
+            try:
+                write_xlsx(rows, options["output"])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as fh:
+                fh.writelines(csv_chunks(rows))
+        else:
+            for chunk in csv_chunks(rows):
+                self.stdout.write(chunk, ending="")
+
+        if options["output"]:
+            self.stderr.write(self.style.SUCCESS(f"Zapisano raport {date_from} – {date_to} do {options['output']}"))
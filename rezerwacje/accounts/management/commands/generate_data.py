@@ -0,0 +1,196 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.availability import SLOT_COUNT, SLOT_TIMES, rebuild_index
+from accounts.stats import reconcile
+from accounts.models import (
+    Appointment, AppointmentType, Doctor, DoctorDaySlots, LeaveRequest,
+    Patient, Specialization, User, VisitSummary,
+)
+
+FIRST_NAMES = ["Anna", "Piotr", "Katarzyna", "Krzysztof", "Małgorzata", "Tomasz", "Agnieszka", "Paweł", "Ewa", "Michał", "Zofia", "Łukasz"]
+LAST_NAMES = ["Nowak", "Kowalski", "Wiśniewska", "Wójcik", "Kowalczyk", "Kamiński", "Lewandowska", "Zieliński", "Szymańska", "Woźniak", "Dąbrowski", "Kozłowska"]
+SPECIALIZATIONS = ["Internista", "Kardiolog", "Dermatolog", "Pediatra", "Okulista", "Laryngolog", "Neurolog", "Ortopeda", "Ginekolog", "Psychiatra"]
+APPOINTMENT_TYPES = ["Konsultacja", "Kontrola", "Badanie", "Teleporada", "Szczepienie"]
+
+# Wizyty jednego lekarza trafiają co drugi slot, żeby zachować regułę ±30 minut.
+DAY_SLOTS = list(range(0, SLOT_COUNT, 2))
+
+
+class Command(BaseCommand):
+    help = "Generuje syntetyczne dane (pacjenci, lekarze, wizyty, podsumowania, wnioski o wolne)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=1000)
+        parser.add_argument("--doctors", type=int, default=20)
+        parser.add_argument("--specializations", type=int, default=5)
+        parser.add_argument("--appointment-types", type=int, default=3)
+        parser.add_argument("--appointments", type=int, default=10000)
+        parser.add_argument("--leaves", type=int, default=50)
+        parser.add_argument("--days", type=int, default=365, help="Liczba dni, na które rozkładane są wizyty (połowa w przeszłości).")
+        parser.add_argument("--summary-ratio", type=float, default=0.8, help="Odsetek zakończonych wizyt z podsumowaniem.")
+        parser.add_argument("--cancel-ratio", type=float, default=0.1)
+        parser.add_argument("--password", default="synthetic-pass-123")
+        parser.add_argument("--prefix", default="synth")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        patients_count = options["patients"]
+        doctors_count = options["doctors"]
+        days = max(options["days"], 1)
+
+        if doctors_count < 1 or patients_count < doctors_count:
+            raise CommandError("Potrzebny jest co najmniej jeden lekarz i nie mniej pacjentów niż lekarzy.")
+        capacity = doctors_count * days * len(DAY_SLOTS)
+        if options["appointments"] > capacity:
+            raise CommandError(
+                f"{options['appointments']} wizyt nie zmieści się w grafiku ({capacity} wolnych terminów). "
+                "Zwiększ --doctors lub --days."
+            )
+
+        password = make_password(options["password"])
+        prefix = options["prefix"]
+
+        with transaction.atomic():
+            specializations = self._specializations(options["specializations"])
+            types = self._appointment_types(options["appointment_types"])
+            doctor_ids = self._doctors(rng, prefix, password, doctors_count, specializations, batch_size)
+            patient_ids = self._patients(rng, prefix, password, patients_count, batch_size)
+
+        doctors = list(Doctor.objects.filter(id__in=doctor_ids).values_list("id", "specjalizacja_id"))
+        self._appointments(rng, options, doctors, patient_ids, types, days, batch_size)
+        self._leaves(rng, options["leaves"], doctor_ids, days)
+
+        # bulk_create pomija sygnały, więc indeks slotów i statystyki odbudowujemy na końcu.
+        rebuild_index(Appointment.objects.all(), DoctorDaySlots)
+        reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f"Utworzono: {patients_count} pacjentów, {doctors_count} lekarzy, "
+            f"{options['appointments']} wizyt, {options['leaves']} wniosków o wolne."
+        ))
+
+    def _specializations(self, count):
+        names = [SPECIALIZATIONS[i] if i < len(SPECIALIZATIONS) else f"Specjalizacja {i + 1}" for i in range(max(count, 1))]
+        return [Specialization.objects.get_or_create(name=name)[0] for name in names]
+
+    def _appointment_types(self, count):
+        names = [APPOINTMENT_TYPES[i] if i < len(APPOINTMENT_TYPES) else f"Typ {i + 1}" for i in range(max(count, 1))]
+        return [AppointmentType.objects.get_or_create(name=name)[0].id for name in names]
+
+    def _users(self, prefix, kind, password, count, batch_size):
+        offset = (User.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}_{kind}{offset + i}", password=password, account_type=kind) for i in range(count)],
+            batch_size=batch_size,
+        )
+        return [user.id for user in users], offset
+
+    def _doctors(self, rng, prefix, password, count, specializations, batch_size):
+        user_ids, offset = self._users(prefix, "doctor", password, count, batch_size)
+        doctors = [
+            Doctor(
+                user_id=user_id,
+                pesel=f"8{offset + i:010d}",
+                imie=rng.choice(FIRST_NAMES),
+                nazwisko=rng.choice(LAST_NAMES),
+                specjalizacja=specializations[i % len(specializations)],
+            )
+            for i, user_id in enumerate(user_ids)
+        ]
+        return [doctor.id for doctor in Doctor.objects.bulk_create(doctors, batch_size=batch_size)]
+
+    def _patients(self, rng, prefix, password, count, batch_size):
+        patient_ids = []
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            user_ids, offset = self._users(prefix, "patient", password, size, batch_size)
+            patients = [
+                Patient(
+                    user_id=user_id,
+                    pesel=f"9{offset + i:010d}",
+                    imie=rng.choice(FIRST_NAMES),
+                    nazwisko=rng.choice(LAST_NAMES),
+                    telefon=f"5{rng.randrange(10 ** 8):08d}",
+                )
+                for i, user_id in enumerate(user_ids)
+            ]
+            for patient in patients:
+                patient.update_search_fields()
+            patient_ids.extend(patient.id for patient in Patient.objects.bulk_create(patients, batch_size=batch_size))
+        return patient_ids
+
+    def _appointments(self, rng, options, doctors, patient_ids, types, days, batch_size):
+        total = options["appointments"]
+        if not total:
+            return
+        today = timezone.localdate()
+        first_day = today - timedelta(days=days // 2)
+        per_doctor_day = min(len(DAY_SLOTS), -(-total // (len(doctors) * days)))
+        created = 0
+        batch = []
+
+        for day_offset in range(days):
+            day = first_day + timedelta(days=day_offset)
+            for position, (doctor_id, specialization_id) in enumerate(doctors):
+                for slot in rng.sample(DAY_SLOTS, per_doctor_day):
+                    if created + len(batch) >= total:
+                        break
+                    # Różni lekarze w tym samym terminie dostają różnych pacjentów.
+                    patient_id = patient_ids[(day_offset * len(DAY_SLOTS) + slot * len(doctors) + position) % len(patient_ids)]
+                    if rng.random() < options["cancel_ratio"]:
+                        status = "canceled"
+                    else:
+                        status = "completed" if day < today else "scheduled"
+                    batch.append(Appointment(
+                        patient_id=patient_id,
+                        doctor_id=doctor_id,
+                        specialization_id=specialization_id,
+                        type_id=rng.choice(types),
+                        date=day,
+                        time=SLOT_TIMES[slot],
+                        status=status,
+                    ))
+                if len(batch) >= batch_size:
+                    created += self._flush_appointments(rng, batch, options["summary_ratio"])
+                    batch = []
+            if created + len(batch) >= total:
+                break
+        if batch:
+            created += self._flush_appointments(rng, batch, options["summary_ratio"])
+
+    def _flush_appointments(self, rng, batch, summary_ratio):
+        with transaction.atomic():
+            Appointment.objects.bulk_create(batch)
+            VisitSummary.objects.bulk_create([
+                VisitSummary(
+                    appointment_id=appointment.id,
+                    prescription="Lek A 1x dziennie",
+                    recommendations="Kontrola za miesiąc",
+                )
+                for appointment in batch
+                if appointment.status == "completed" and rng.random() < summary_ratio
+            ])
+        return len(batch)
+
+    def _leaves(self, rng, count, doctor_ids, days):
+        today = timezone.localdate()
+        leaves = []
+        for _ in range(count):
+            start = today + timedelta(days=rng.randrange(-days // 2, days // 2 + 1))
+            leaves.append(LeaveRequest(
+                doctor_id=rng.choice(doctor_ids),
+                leave_type=rng.choice(["on_demand", "sick_leave"]),
+                start_date=start,
+                end_date=start + timedelta(days=rng.randrange(0, 7)),
+                status=rng.choice(["pending", "approved", "rejected"]),
+            ))
+        LeaveRequest.objects.bulk_create(leaves)
@@ -0,0 +1,343 @@
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.cookiejar import CookieJar
+from io import StringIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+
+from accounts.availability import SLOT_MINUTES, collision_mask, occupied_mask
+from accounts.benchmarking import percentile, temporary_database, write_results
+from accounts.models import Appointment, User
+from accounts.slot_templates import type_durations
+
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CANCEL_URL = re.compile(r'action="([^"]*/appointment/\d+/cancel/)"')
+
+
+def _options(html, name):
+    """Wartości opcji (bez pustej) listy wyboru ``name`` z formularza HTML."""
+    select = re.search(rf'<select name="{name}"[^>]*>(.*?)</select>', html, re.S)
+    return [value for value in re.findall(r'<option value="([^"]*)"', select.group(1)) if value] if select else []
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    # Przekierowanie po udanym POST to wynik, który chcemy zmierzyć, a nie śledzić.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Session:
+    """Przeglądarka jednego użytkownika: ciasteczka, token CSRF i pomiar każdego żądania."""
+
+    def __init__(self, base_url, record):
+        self.base_url = base_url
+        self.record = record
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+        self.csrf = None
+
+    def request(self, action, path, params=None, data=None):
+        url = urljoin(self.base_url, path) + (f"?{urlencode(params)}" if params else "")
+        body = None
+        if data is not None:
+            body = urlencode({**data, "csrfmiddlewaretoken": self.csrf}).encode()
+        started = time.perf_counter()
+        try:
+            with self.opener.open(Request(url, data=body), timeout=30) as response:
+                status, content = response.status, response.read().decode()
+        except HTTPError as e:
+            status, content = e.code, e.read().decode(errors="replace")
+        except (URLError, OSError):
+            status, content = 0, ""
+        self.record(action, (time.perf_counter() - started) * 1000, status)
+        token = CSRF_INPUT.search(content)
+        if token:
+            self.csrf = token.group(1)
+        return status, content
+
+    def login(self, username, password):
+        self.request("login_page", reverse("login"))
+        status, _ = self.request("login", reverse("login"), data={"username": username, "password": password})
+        return status == 302
+
+
+class Command(BaseCommand):
+    help = (
+        "Symulacja porannego szczytu rezerwacji: wielu pacjentów loguje się przez "
+        "stronę logowania i rezerwuje (czasem odwołuje) wizyty z losowymi przerwami, "
+        "a lekarze i administratorzy jednocześnie przeglądają swoje panele. Żądania "
+        "trafiają przez HTTP do lokalnego serwera WSGI uruchomionego w procesie "
+        "(albo do serwera wskazanego przez --url). Na końcu raport przepustowości, "
+        "percentyli opóźnień, błędów, konfliktów i podwójnych rezerwacji."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=50, help="Liczba jednocześnie rezerwujących pacjentów.")
+        parser.add_argument("--doctors", type=int, default=5, help="Liczba lekarzy przeglądających panel.")
+        parser.add_argument("--admins", type=int, default=2)
+        parser.add_argument("--duration", type=float, default=30.0, help="Czas trwania testu [s].")
+        parser.add_argument("--ramp-up", type=float, default=5.0, help="Czas, w którym dołączają kolejni użytkownicy [s].")
+        parser.add_argument("--think", type=float, default=1.0, help="Średni czas namysłu między krokami [s].")
+        parser.add_argument("--cancel-rate", type=float, default=0.1, help="Prawdopodobieństwo odwołania wizyty po wejściu na panel.")
+        parser.add_argument("--appointments", type=int, default=2000, help="Wizyty w bazie przed testem.")
+        parser.add_argument("--url", default=None, help="Adres działającego serwera (np. http://127.0.0.1:8000/); dane przygotowuje generate_data.")
+        parser.add_argument("--prefix", default="load", help="Prefiks loginów syntetycznych użytkowników.")
+        parser.add_argument("--password", default="synthetic-pass-123")
+        parser.add_argument("--output", default="loadtest_output.json")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            report = self._run(options["url"], options)
+        else:
+            handle, path = tempfile.mkstemp(suffix=".sqlite3")
+            os.close(handle)
+            try:
+                with temporary_database(path=path):
+                    self._generate(options)
+                    with self._server() as base_url:
+                        report = self._run(base_url, options)
+            finally:
+                for suffix in ("", "-wal", "-shm"):
+                    os.path.exists(path + suffix) and os.remove(path + suffix)
+
+        write_results(
+            options["output"], "loadtest", report,
+            patients=options["patients"], doctors=options["doctors"], admins=options["admins"],
+            duration=options["duration"], think=options["think"], url=options["url"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Zapisano wyniki do {options['output']}"))
+        if report["double_bookings"]["doctor"] or report["double_bookings"]["patient"]:
+            raise CommandError(f"Podwójne rezerwacje! {report['double_bookings']}")
+
+    def _generate(self, options):
+        doctors = max(options["doctors"], 5)
+        call_command(
+            "generate_data", appointments=options["appointments"], doctors=doctors,
+            patients=max(options["patients"], doctors), days=max(30, -(-options["appointments"] // (doctors * 6))),
+            leaves=0, prefix=options["prefix"], password=options["password"], seed=options["seed"], stdout=StringIO(),
+        )
+
+    @contextmanager
+    def _server(self):
+        # setup_test_environment dopuszcza tylko host "testserver".
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "127.0.0.1"]
+        httpd = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler)
+        httpd.set_app(get_wsgi_application())
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        base_url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+        self.stdout.write(f"  serwer WSGI: {base_url}")
+        try:
+            yield base_url
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+    def _accounts(self, options):
+        prefix = options["prefix"]
+        patients = list(
+            User.objects.filter(account_type="patient", username__startswith=f"{prefix}_patient")
+            .order_by("id").values_list("username", flat=True)[:options["patients"]]
+        )
+        doctors = list(
+            User.objects.filter(account_type="doctor", username__startswith=f"{prefix}_doctor")
+            .order_by("id").values_list("username", flat=True)[:options["doctors"]]
+        )
+        password = make_password(options["password"])
+        admins = []
+        for i in range(options["admins"]):
+            username = f"{prefix}_admin{i}"
+            User.objects.get_or_create(username=username, defaults={"account_type": "admin", "password": password})
+            admins.append(username)
+        if len(patients) < options["patients"]:
+            raise CommandError(
+                f"Za mało pacjentów z prefiksem {prefix!r} ({len(patients)}); uruchom generate_data --prefix {prefix}."
+            )
+        return patients, doctors, admins
+
+    def _run(self, base_url, options):
+        patients, doctors, admins = self._accounts(options)
+        samples = defaultdict(list)
+        statuses = defaultdict(Counter)
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def record(action, ms, status):
+            with lock:
+                samples[action].append(ms)
+                statuses[action][status] += 1
+
+        deadline = time.perf_counter() + options["ramp_up"] + options["duration"]
+
+        def user(role, username, seed):
+            rng = random.Random(seed)
+            local = Counter()
+            time.sleep(rng.uniform(0, options["ramp_up"]))
+            session = Session(base_url, record)
+            if not session.login(username, options["password"]):
+                local["login_failed"] += 1
+            else:
+                step = getattr(self, f"_{role}_step")
+                while time.perf_counter() < deadline:
+                    step(session, rng, local, options)
+                    if options["think"] > 0:
+                        time.sleep(min(rng.expovariate(1 / options["think"]), max(0, deadline - time.perf_counter())))
+            with lock:
+                outcomes.update(local)
+
+        appointments_before = Appointment.objects.count()
+        threads = [
+            threading.Thread(target=user, args=(role, username, options["seed"] * 100003 + i))
+            for i, (role, username) in enumerate(
+                [("patient", name) for name in patients]
+                + [("doctor", name) for name in doctors]
+                + [("admin", name) for name in admins]
+            )
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        report = self._report(samples, statuses, outcomes, elapsed)
+        report["appointments_created"] = Appointment.objects.count() - appointments_before
+        report["double_bookings"] = self._double_bookings()
+        self._print(report)
+        return report
+
+    def _patient_step(self, session, rng, local, options):
+        status, html = session.request("patient_dashboard", reverse("patient_dashboard"))
+        if status != 200:
+            return
+        cancel = CANCEL_URL.findall(html)
+        if cancel and rng.random() < options["cancel_rate"]:
+            status, _ = session.request("cancel_appointment", rng.choice(cancel), data={})
+            local["canceled" if status == 302 else "cancel_failed"] += 1
+            return
+
+        specializations, types = _options(html, "specialization"), _options(html, "type")
+        if not specializations or not types:
+            return
+        specialization, appointment_type = rng.choice(specializations), rng.choice(types)
+        status, body = session.request("get_doctors", reverse("get_doctors"), {"specialization": specialization})
+        if status != 200 or not json.loads(body):
+            return
+        # Najbliższe wolne terminy widzą wszyscy naraz – stąd konflikty jak w prawdziwym szczycie.
+        status, body = session.request(
+            "get_free_slots", reverse("get_free_slots"),
+            {"specialization": specialization, "type": appointment_type, "limit": 5},
+        )
+        slots = json.loads(body)["slots"] if status == 200 else []
+        if not slots:
+            return
+        slot = rng.choice(slots)
+        status, _ = session.request("book", reverse("patient_dashboard"), data={
+            "specialization": specialization,
+            "doctor": slot["doctor_id"],
+            "type": appointment_type,
+            "date": slot["date"],
+            "time": slot["time"],
+        })
+        local["booked" if status == 302 else "conflict" if status == 200 else "book_failed"] += 1
+
+    def _doctor_step(self, session, rng, local, options):
+        session.request("doctor_dashboard", reverse("doctor_dashboard"))
+
+    def _admin_step(self, session, rng, local, options):
+        action = rng.choice(("admin_dashboard", "admin_appointments", "doctor_calendar"))
+        session.request(action, reverse(action))
+
+    def _report(self, samples, statuses, outcomes, elapsed):
+        actions = {}
+        for action, latencies in sorted(samples.items()):
+            codes = statuses[action]
+            actions[action] = {
+                "requests": len(latencies),
+                "errors": sum(count for status, count in codes.items() if status == 0 or status >= 400),
+                "statuses": {str(status): count for status, count in sorted(codes.items())},
+                "latency_ms": {
+                    "p50": percentile(latencies, 0.5),
+                    "p95": percentile(latencies, 0.95),
+                    "p99": percentile(latencies, 0.99),
+                },
+            }
+        total = sum(entry["requests"] for entry in actions.values())
+        errors = sum(entry["errors"] for entry in actions.values())
+        attempts = outcomes["booked"] + outcomes["conflict"] + outcomes["book_failed"]
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "rps": total / elapsed if elapsed else None,
+            "error_rate": errors / total if total else 0,
+            "bookings_per_s": outcomes["booked"] / elapsed if elapsed else None,
+            "conflict_rate": outcomes["conflict"] / attempts if attempts else 0,
+            "outcomes": dict(outcomes),
+            "actions": actions,
+        }
+
+    def _double_bookings(self):
+        """
+        Wizyty lekarza naruszające regułę ±30 minut (z uwzględnieniem czasu trwania
+        typów) oraz pacjenci z dwiema wizytami o tej samej porze.
+        """
+        durations = type_durations()
+        doctor, patient = 0, 0
+        day_masks, patient_slots = {}, set()
+        for doctor_id, patient_id, day, t, type_id in (
+            Appointment.objects.exclude(status="canceled")
+            .order_by("doctor_id", "date", "time")
+            .values_list("doctor_id", "patient_id", "date", "time", "type_id")
+            .iterator()
+        ):
+            duration = durations.get(type_id, SLOT_MINUTES)
+            if doctor_id:
+                taken = day_masks.get((doctor_id, day), 0)
+                doctor += bool(taken & collision_mask(t, duration))
+                day_masks[(doctor_id, day)] = taken | occupied_mask(t, duration)
+            patient += (patient_id, day, t) in patient_slots
+            patient_slots.add((patient_id, day, t))
+        return {"doctor": doctor, "patient": patient}
+
+    def _print(self, report):
+        self.stdout.write(f"  {'akcja':20} {'żądania':>8} {'błędy':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for action, entry in report["actions"].items():
+            latency = entry["latency_ms"]
+            self.stdout.write(
+                f"  {action:20} {entry['requests']:8} {entry['errors']:6} "
+                f"{latency['p50']:8.1f} {latency['p95']:8.1f} {latency['p99']:8.1f}"
+            )
+        outcomes = report["outcomes"]
+        self.stdout.write(
+            f"  {report['requests']} żądań w {report['elapsed_s']:.1f} s ({report['rps']:.1f}/s), "
+            f"błędy {report['error_rate']:.1%}; rezerwacje {outcomes.get('booked', 0)} "
+            f"({report['bookings_per_s']:.2f}/s), konflikty {report['conflict_rate']:.1%}, "
+            f"odwołania {outcomes.get('canceled', 0)}, nieudane logowania {outcomes.get('login_failed', 0)}"
+        )
+        self.stdout.write(
+            f"  podwójne rezerwacje: lekarz {report['double_bookings']['doctor']}, "
+            f"pacjent {report['double_bookings']['patient']}"
+        )
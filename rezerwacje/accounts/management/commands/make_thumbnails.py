@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.documents import Image, make_thumbnail, pending_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Tworzy miniatury skanów dołączonych do wniosków o wolne (poza obsługą żądań). "
+        "Bez --loop kończy się po przetworzeniu oczekujących plików. Wymaga Pillow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--loop", action="store_true", help="Działa stale, sprawdzając nowe pliki co --interval sekund.")
+        parser.add_argument("--interval", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        if Image is None:
+            raise CommandError("Miniatury wymagają pakietu Pillow (pip install Pillow).")
+        created = failed = 0
+        try:
+            while True:
+                batch = list(pending_thumbnails()[:options["batch_size"]])
+                for leave in batch:
+                    if make_thumbnail(leave):
+                        created += 1
+                    else:
+                        failed += 1
+                if len(batch) < options["batch_size"]:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Utworzone miniatury: {created}, nieudane: {failed}.")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.availability import as_date
+from accounts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Uzgadnia tabelę statystyk obłożenia z wizytami (naprawia rozbieżności liczników)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from")
+        parser.add_argument("--date-to")
+
+    def handle(self, *args, **options):
+        try:
+            date_from = as_date(options["date_from"]) if options["date_from"] else None
+            date_to = as_date(options["date_to"]) if options["date_to"] else None
+        except ValueError as e:
+            raise CommandError(f"Niepoprawna data: {e}")
+        fixed = reconcile(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"Poprawiono {fixed} kubełków statystyk."))
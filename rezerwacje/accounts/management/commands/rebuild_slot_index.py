@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accounts.availability import rebuild_index
+from accounts.models import Appointment, AppointmentType, DoctorDaySlots
+
+
+class Command(BaseCommand):
+    help = (
+        "Buduje od nowa bitmapy zajętości wszystkich dni lekarzy na podstawie wizyt. "
+        "Usuwa i zapisuje całą tabelę, więc uruchamiać poza godzinami rezerwacji; "
+        "zmiana czasu trwania typu wizyty przelicza sama tylko przyszłe dni."
+    )
+
+    def handle(self, *args, **options):
+        durations = dict(AppointmentType.objects.values_list('id', 'duration_minutes'))
+        rebuild_index(Appointment.objects.all(), DoctorDaySlots, durations)
+        self.stdout.write(self.style.SUCCESS(f"Przebudowano bitmapy dni: {DoctorDaySlots.objects.count()}."))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from accounts.benchmarking import summarize
+from accounts.notifications import deliver_batch, queue_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Wysyła wiadomości z kolejki outbox paczkami przez jedno, ponownie używane "
+        "połączenie SMTP (backend z EMAIL_BACKEND). Bez --loop kończy się po opróżnieniu kolejki."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--loop", action="store_true", help="Działa stale, sprawdzając kolejkę co --interval sekund.")
+        parser.add_argument("--interval", type=float, default=5.0)
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        totals = {"sent": 0, "retried": 0, "failed": 0}
+        latencies = []
+        batches = 0
+        try:
+            while options["max_batches"] is None or batches < options["max_batches"]:
+                try:
+                    connection.open()
+                    sent, retried, failed, batch_latencies = deliver_batch(connection, options["batch_size"])
+                except OSError as e:
+                    # Serwer SMTP niedostępny: zamykamy połączenie i próbujemy przy następnym obiegu.
+                    self.stderr.write(f"Błąd połączenia: {e}")
+                    connection.close()
+                    sent = retried = failed = 0
+                    batch_latencies = []
+                batches += 1
+                totals["sent"] += sent
+                totals["retried"] += retried
+                totals["failed"] += failed
+                latencies += batch_latencies
+                if sent or retried or failed:
+                    self.stdout.write(f"Paczka {batches}: wysłane {sent}, ponowione {retried}, nieudane {failed}")
+                if sent + retried + failed < options["batch_size"]:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        metrics = queue_metrics()
+        self.stdout.write(
+            f"Wysłane: {totals['sent']}, ponowione: {totals['retried']}, nieudane: {totals['failed']}. "
+            f"W kolejce: {metrics['pending']} (gotowe: {metrics['due']}), trwale nieudane: {metrics['failed']}."
+        )
+        if latencies:
+            stats = summarize(latencies)
+            self.stdout.write(
+                f"Opóźnienie od zapisu do wysłania [s]: mediana {stats['median']:.2f}, p95 {stats['p95']:.2f}, max {stats['max']:.2f}"
+            )
+        if metrics["oldest_pending_seconds"] is not None:
+            self.stdout.write(f"Najstarsza oczekująca wiadomość: {metrics['oldest_pending_seconds']:.0f} s")
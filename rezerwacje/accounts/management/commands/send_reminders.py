@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.reminders import REMINDER_WINDOWS, schedule_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        "Planuje przypomnienia o wizytach (24 h i 2 h przed terminem) i dopisuje je "
+        "do kolejki e-mail. Uruchamiana z crona co kilka minut; ponowne uruchomienie "
+        "nie wysyła przypomnień drugi raz. Wiadomości wysyła komenda send_emails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=sorted(REMINDER_WINDOWS), action="append", help="Domyślnie wszystkie rodzaje.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for kind in options["kind"] or REMINDER_WINDOWS:
+            started = time.perf_counter()
+            count = schedule_reminders(kind, batch_size=options["batch_size"])
+            self.stdout.write(f"Przypomnienia {kind}: {count} ({time.perf_counter() - started:.2f} s)")
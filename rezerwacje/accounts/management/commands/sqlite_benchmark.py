@@ -0,0 +1,198 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.availability import SLOT_TIMES
+from accounts.benchmarking import percentile, temporary_database, write_results
+from accounts.database import REPLICA, production_databases
+from accounts.models import Appointment, AppointmentType, Doctor, Patient, User
+from accounts.services import book_appointment
+
+
+class Command(BaseCommand):
+    help = (
+        "Porównuje domyślną konfigurację SQLite z profilem produkcyjnym (WAL, PRAGMA, "
+        "trwałe połączenia, odczyty z połączenia tylko do odczytu) pod mieszanym "
+        "obciążeniem: wątki czytające panele i grafik oraz wątki rezerwujące wizyty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--appointments", type=int, default=5000)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=10.0, help="Czas pomiaru jednego profilu [s].")
+        parser.add_argument("--output", default="sqlite_bench_output.json")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        results = []
+        for profile in ("default", "production"):
+            handle, path = tempfile.mkstemp(suffix=".sqlite3")
+            os.close(handle)
+            try:
+                with temporary_database(path=path):
+                    users = self._generate(options["appointments"], options["seed"])
+                    with self._profile(profile):
+                        stats = self._run(users, options)
+            finally:
+                for suffix in ("", "-wal", "-shm"):
+                    os.path.exists(path + suffix) and os.remove(path + suffix)
+            results.append({"profile": profile, **stats})
+            self.stdout.write(
+                f"  {profile:10} odczyty {stats['reads_per_s']:8.1f}/s (p95 {stats['read_ms']['p95'] or 0:7.2f} ms), "
+                f"zapisy {stats['writes_per_s']:7.1f}/s (p95 {stats['write_ms']['p95'] or 0:7.2f} ms), "
+                f"blokady bazy {stats['locked']}, błędy {stats['errors']}"
+            )
+
+        write_results(
+            options["output"], "sqlite", results,
+            appointments=options["appointments"], readers=options["readers"],
+            writers=options["writers"], duration=options["duration"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Zapisano wyniki do {options['output']}"))
+
+    @contextmanager
+    def _profile(self, profile):
+        saved = dict(connections.settings["default"])
+        if profile == "production":
+            # Ta sama baza testowa, ale z ustawieniami i połączeniem "replica" profilu produkcyjnego.
+            config = production_databases(saved["NAME"])
+            connections.close_all()
+            connections.settings["default"].update(config["default"])
+            connections.settings[REPLICA] = {**saved, **config[REPLICA]}
+            with connections["default"].cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                self.stdout.write(f"  journal_mode: {cursor.fetchone()[0]}")
+        try:
+            yield
+        finally:
+            connections.close_all()
+            connections.settings.pop(REPLICA, None)
+            connections.settings["default"].clear()
+            connections.settings["default"].update(saved)
+
+    def _generate(self, size, seed):
+        doctors = max(5, size // 2000)
+        call_command(
+            "generate_data", appointments=size, doctors=doctors, patients=max(doctors, size // 10),
+            days=max(30, -(-size // (doctors * 6))), leaves=0, seed=seed, stdout=StringIO(),
+        )
+        doctor = Doctor.objects.select_related("user").order_by("id").first()
+        return {
+            "admin": User.objects.create(username="bench_admin", account_type="admin", is_staff=True),
+            "patient": Patient.objects.select_related("user").order_by("id").first().user,
+            "doctor": doctor,
+            "doctors": list(Doctor.objects.all()),
+            "patients": list(Patient.objects.values_list("id", flat=True)),
+            "type": AppointmentType.objects.first(),
+        }
+
+    def _read_urls(self, users):
+        specialization = {"specialization": users["doctor"].specjalizacja_id}
+        return [
+            (users["patient"], reverse("patient_dashboard"), {}),
+            (users["doctor"].user, reverse("doctor_dashboard"), {}),
+            (users["admin"], reverse("admin_appointments"), {}),
+            (users["admin"], reverse("doctor_calendar"), specialization),
+        ]
+
+    def _run(self, users, options):
+        urls = self._read_urls(users)
+        counter = Counter()
+        read_ms, write_ms = [], []
+        lock = threading.Lock()
+        window = {}
+        # Pomiar zaczyna się, gdy wszystkie wątki są gotowe (po zalogowaniu klientów).
+        barrier = threading.Barrier(
+            options["readers"] + options["writers"],
+            action=lambda: window.setdefault("deadline", time.perf_counter() + options["duration"]),
+        )
+
+        def reader(index):
+            clients = []
+            for user, url, params in urls:
+                client = Client()
+                client.force_login(user)
+                clients.append((client, url, params))
+            local, latencies = Counter(), []
+            barrier.wait()
+            try:
+                while time.perf_counter() < window["deadline"]:
+                    client, url, params = clients[len(latencies) % len(clients)]
+                    started = time.perf_counter()
+                    try:
+                        status = client.get(url, params).status_code
+                    except OperationalError:
+                        local["locked"] += 1
+                        continue
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    local["errors"] += status >= 400
+            finally:
+                connections.close_all()
+                with lock:
+                    counter.update(local)
+                    read_ms.extend(latencies)
+
+        def writer(index):
+            rng = random.Random(options["seed"] + index)
+            first_day = timezone.localdate() + timezone.timedelta(days=1)
+            local, latencies = Counter(), []
+            barrier.wait()
+            try:
+                while time.perf_counter() < window["deadline"]:
+                    doctor = rng.choice(users["doctors"])
+                    appointment = Appointment(
+                        patient_id=rng.choice(users["patients"]), doctor=doctor,
+                        specialization_id=doctor.specjalizacja_id, type=users["type"],
+                        date=first_day + timezone.timedelta(days=rng.randrange(60)),
+                        time=rng.choice(SLOT_TIMES),
+                    )
+                    started = time.perf_counter()
+                    try:
+                        book_appointment(appointment)
+                        local["booked"] += 1
+                    except ValidationError:
+                        local["conflict"] += 1
+                    except OperationalError:
+                        local["locked"] += 1
+                        continue
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+                with lock:
+                    counter.update(local)
+                    write_ms.extend(latencies)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options["readers"])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options["writers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        duration = options["duration"]
+        return {
+            "reads": len(read_ms),
+            "writes": len(write_ms),
+            "reads_per_s": len(read_ms) / duration,
+            "writes_per_s": len(write_ms) / duration,
+            "booked": counter["booked"],
+            "conflict": counter["conflict"],
+            "locked": counter["locked"],
+            "errors": counter["errors"],
+            "read_ms": {"p50": percentile(read_ms, 0.5), "p95": percentile(read_ms, 0.95)},
+            "write_ms": {"p50": percentile(write_ms, 0.5), "p95": percentile(write_ms, 0.95)},
+        }
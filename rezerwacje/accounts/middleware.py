@@ -0,0 +1,62 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import RequestProfile, check_budget, current_profile, flush_profiles, store_profile
+
+
+class QueryProfilerMiddleware:
+    """
+    Zbiera dla każdego widoku liczbę zapytań, czas SQL, powtórzone zapytania,
+    czas renderowania i rozmiar odpowiedzi. Włączane ustawieniem QUERY_PROFILING
+    (domyślnie wyłączone, także przy DEBUG).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        profile = RequestProfile()
+        return profile, current_profile.set(profile), time.perf_counter()
+
+    def _finish(self, request, response, profile, started):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        view_name = match.view_name or match.route
+        size = int(response.get('Content-Length') or 0) if response.streaming else len(response.content)
+        # Budżety dotyczą odczytów; zapis (np. rezerwacja) ma prawo wykonać więcej zapytań.
+        over_budget = request.method in ('GET', 'HEAD') and check_budget(view_name, profile)
+        return view_name, profile, time.perf_counter() - started, size, over_budget
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        measurement = self._finish(request, response, profile, started)
+        if measurement and store_profile(*measurement):
+            flush_profiles()
+        return response
+
+    async def __acall__(self, request):
+        profile, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        measurement = self._finish(request, response, profile, started)
+        if measurement and store_profile(*measurement):
+            await sync_to_async(flush_profiles)()
+        return response
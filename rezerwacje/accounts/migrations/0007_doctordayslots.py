@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Siatka z chwili tej migracji: sloty co 30 minut od 8:00 do 20:00, wizyta zajmuje jeden slot.
+SLOT_MINUTES = 30
+FIRST_SLOT = 8 * 60
+SLOT_COUNT = 25
+
+
+def occupied_mask(t):
+    """Slot wizyty o godzinie ``t``; wizyta spoza siatki zajmuje każdy slot, z którym się pokrywa."""
+    offset = t.hour * 60 + t.minute + t.second / 60 - FIRST_SLOT
+    mask = 0
+    for i in range(SLOT_COUNT):
+        if offset - SLOT_MINUTES < i * SLOT_MINUTES < offset + SLOT_MINUTES:
+            mask |= 1 << i
+    return mask
+
+
+def build_slot_index(apps, schema_editor):
+    Appointment = apps.get_model('accounts', 'Appointment')
+    DoctorDaySlots = apps.get_model('accounts', 'DoctorDaySlots')
+    masks = {}
+    rows = Appointment.objects.exclude(doctor=None).exclude(status='canceled').values_list('doctor_id', 'date', 'time')
+    for doctor_id, day, t in rows.iterator():
+        masks[(doctor_id, day)] = masks.get((doctor_id, day), 0) | occupied_mask(t)
+    DoctorDaySlots.objects.bulk_create(
+        [DoctorDaySlots(doctor_id=doctor_id, date=day, taken=mask) for (doctor_id, day), mask in masks.items() if mask],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_leaverequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDaySlots',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Dzień')),
+                ('taken', models.BigIntegerField(default=0, verbose_name='Zajęte sloty (bitmapa)')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_slots', to='accounts.doctor', verbose_name='Lekarz')),
+            ],
+            options={
+                'verbose_name': 'Zajętość dnia lekarza',
+                'verbose_name_plural': 'Zajętość dni lekarzy',
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='unique_doctor_day_slots')],
+            },
+        ),
+        migrations.RunPython(build_slot_index, migrations.RunPython.noop),
+    ]
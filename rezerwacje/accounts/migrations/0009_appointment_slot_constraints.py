@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'canceled'), _negated=True), fields=('doctor', 'date', 'time'), name='unique_doctor_slot', violation_error_message='Lekarz ma już wizytę w tym terminie.'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'canceled'), _negated=True), fields=('patient', 'date', 'time'), name='unique_patient_slot', violation_error_message='Pacjent ma już wizytę w tym terminie.'),
+        ),
+    ]
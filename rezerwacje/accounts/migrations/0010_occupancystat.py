@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_occupancy(apps, schema_editor):
+    Appointment = apps.get_model('accounts', 'Appointment')
+    OccupancyStat = apps.get_model('accounts', 'OccupancyStat')
+    fields = ('date', 'doctor_id', 'specialization_id', 'type_id', 'status')
+    OccupancyStat.objects.bulk_create(
+        [
+            OccupancyStat(count=row.pop('count'), **row)
+            for row in Appointment.objects.values(*fields).annotate(count=Count('id')).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_appointment_slot_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Dzień')),
+                ('status', models.CharField(choices=[('scheduled', 'Zaplanowana'), ('canceled', 'Odwołana'), ('completed', 'Zakończona')], max_length=20, verbose_name='Status wizyty')),
+                ('count', models.IntegerField(default=0, verbose_name='Liczba wizyt')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occupancy_stats', to='accounts.doctor', verbose_name='Lekarz')),
+                ('specialization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.specialization', verbose_name='Specjalizacja')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.appointmenttype', verbose_name='Typ wizyty')),
+            ],
+            options={
+                'verbose_name': 'Statystyka obłożenia',
+                'verbose_name_plural': 'Statystyki obłożenia',
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'specialization', 'type', 'status'), name='unique_occupancy_bucket')],
+            },
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_occupancystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254, verbose_name='Odbiorca')),
+                ('subject', models.CharField(max_length=200, verbose_name='Temat')),
+                ('body', models.TextField(verbose_name='Treść')),
+                ('status', models.CharField(choices=[('pending', 'Oczekuje na wysłanie'), ('sent', 'Wysłana'), ('failed', 'Nieudana')], default='pending', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Liczba prób')),
+                ('last_error', models.TextField(blank=True, verbose_name='Ostatni błąd')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Utworzono')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Do wysłania od')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Wysłano')),
+            ],
+            options={
+                'verbose_name': 'Wiadomość do wysłania',
+                'verbose_name_plural': 'Kolejka wiadomości e-mail',
+                'indexes': [models.Index(fields=['status', 'available_at', 'id'], name='outbox_status_available')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('24h', 'Dzień przed wizytą'), ('2h', 'Dwie godziny przed wizytą')], max_length=10, verbose_name='Rodzaj przypomnienia')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Zaplanowano')),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='accounts.appointment', verbose_name='Wizyta')),
+            ],
+            options={
+                'verbose_name': 'Przypomnienie o wizycie',
+                'verbose_name_plural': 'Przypomnienia o wizytach',
+                'constraints': [models.UniqueConstraint(fields=('appointment', 'kind'), name='unique_appointment_reminder')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_appointmentreminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaverequest',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to='leave_thumbnails/', verbose_name='Miniatura załącznika'),
+        ),
+    ]
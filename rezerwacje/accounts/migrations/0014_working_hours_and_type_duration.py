@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:14
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_leaverequest_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmenttype',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Wizyta zajmuje tyle 30-minutowych slotów, ile potrzeba na ten czas.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Czas trwania (min)'),
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Poniedziałek'), (1, 'Wtorek'), (2, 'Środa'), (3, 'Czwartek'), (4, 'Piątek'), (5, 'Sobota'), (6, 'Niedziela')], verbose_name='Dzień tygodnia')),
+                ('start', models.TimeField(verbose_name='Od')),
+                ('end', models.TimeField(verbose_name='Do')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='accounts.doctor', verbose_name='Lekarz')),
+            ],
+            options={
+                'verbose_name': 'Godziny pracy',
+                'verbose_name_plural': 'Godziny pracy',
+                'ordering': ['doctor', 'weekday', 'start'],
+            },
+        ),
+    ]
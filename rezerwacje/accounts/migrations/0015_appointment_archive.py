@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_working_hours_and_type_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Id wizyty')),
+                ('date', models.DateField(verbose_name='Data wizyty')),
+                ('time', models.TimeField(verbose_name='Godzina wizyty')),
+                ('status', models.CharField(choices=[('scheduled', 'Zaplanowana'), ('canceled', 'Odwołana'), ('completed', 'Zakończona')], max_length=20, verbose_name='Status wizyty')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Uwagi do wizyty')),
+                ('created_at', models.DateTimeField(verbose_name='Data utworzenia')),
+                ('updated_at', models.DateTimeField(verbose_name='Data aktualizacji')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data archiwizacji')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_appointments', to='accounts.doctor', verbose_name='Lekarz')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='accounts.patient', verbose_name='Pacjent')),
+                ('specialization', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='accounts.specialization', verbose_name='Specjalizacja')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='accounts.appointmenttype', verbose_name='Typ wizyty')),
+            ],
+            options={
+                'verbose_name': 'Wizyta archiwalna',
+                'verbose_name_plural': 'Wizyty archiwalne',
+                'ordering': ['-date', '-time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedVisitSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prescription', models.TextField(blank=True, null=True, verbose_name='Recepta')),
+                ('recommendations', models.TextField(blank=True, null=True, verbose_name='Zalecenia')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='accounts.archivedappointment')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['patient', 'date', 'time'], name='archived_patient_date_time'),
+        ),
+    ]
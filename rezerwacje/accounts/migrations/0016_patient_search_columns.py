@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:18
+
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+# Kopia accounts.search.fold z chwili tej migracji.
+_FOLD = str.maketrans({"ł": "l", "Ł": "L", "ß": "ss"})
+
+
+def fold(text):
+    text = unicodedata.normalize("NFKD", (text or "").translate(_FOLD))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def fill_search_columns(apps, schema_editor):
+    Patient = apps.get_model('accounts', 'Patient')
+    batch = []
+    for patient in Patient.objects.only('id', 'imie', 'nazwisko').iterator(chunk_size=BATCH_SIZE):
+        imie, nazwisko = fold(patient.imie), fold(patient.nazwisko)
+        patient.search_name = f"{nazwisko} {imie}".strip()
+        patient.search_name_reversed = f"{imie} {nazwisko}".strip()
+        batch.append(patient)
+        if len(batch) == BATCH_SIZE:
+            Patient.objects.bulk_update(batch, ['search_name', 'search_name_reversed'])
+            batch = []
+    Patient.objects.bulk_update(batch, ['search_name', 'search_name_reversed'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_appointment_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=101),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='search_name_reversed',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=101),
+        ),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_user_email_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_from', models.DateField(verbose_name='Od dnia')),
+                ('date_to', models.DateField(verbose_name='Do dnia')),
+                ('auto_book', models.BooleanField(default=False, help_text='Zwolniony termin zostanie od razu zarezerwowany zamiast wysłania propozycji.', verbose_name='Rezerwuj automatycznie')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Priorytet')),
+                ('status', models.CharField(choices=[('waiting', 'Oczekuje'), ('offered', 'Zaproponowano termin'), ('booked', 'Zarezerwowano wizytę'), ('expired', 'Wygasło'), ('canceled', 'Wycofane')], default='waiting', max_length=20, verbose_name='Status')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Zapisano')),
+                ('matched_at', models.DateTimeField(blank=True, null=True, verbose_name='Dopasowano')),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.appointment', verbose_name='Zarezerwowana wizyta')),
+                ('doctor', models.ForeignKey(blank=True, help_text='Puste pole oznacza dowolnego lekarza specjalizacji.', null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.doctor', verbose_name='Lekarz')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='accounts.patient', verbose_name='Pacjent')),
+                ('specialization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.specialization', verbose_name='Specjalizacja')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.appointmenttype', verbose_name='Typ wizyty')),
+            ],
+            options={
+                'verbose_name': 'Wpis na liście oczekujących',
+                'verbose_name_plural': 'Lista oczekujących',
+                'indexes': [models.Index(fields=['specialization', 'status', '-priority', 'created_at', 'id'], name='waitlist_match'), models.Index(fields=['status', 'date_to'], name='waitlist_status_until')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='offered_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Proponowany dzień'),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='offered_doctor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.doctor', verbose_name='Proponowany lekarz'),
+        ),
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='offered_time',
+            field=models.TimeField(blank=True, null=True, verbose_name='Proponowana godzina'),
+        ),
+    ]
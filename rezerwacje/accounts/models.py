@@ -3,7 +3,8 @@ from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta, datetime
-from django.core.validators import FileExtensionValidator
+from django.core.validators import FileExtensionValidator, MinValueValidator
+from .search import search_columns
 
 class User(AbstractUser):
     ACCOUNT_TYPES = [
@@ -13,6 +14,10 @@ class User(AbstractUser):
     ]
     account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPES, default='patient')
 
+    class Meta(AbstractUser.Meta):
+        # Wyszukiwanie po prefiksie adresu w panelu admin.
+        indexes = [models.Index(fields=['email'], name='user_email')]
+
     def __str__(self):
         return f"{self.username} ({self.get_account_type_display()})"
 
@@ -24,10 +29,24 @@ class Patient(models.Model):
     data_urodzenia = models.DateField(blank=True, null=True)
     telefon = models.CharField(max_length=20, blank=True)
     adres = models.TextField(blank=True)
+    # Znormalizowane imię i nazwisko do wyszukiwania po prefiksie (accounts.search).
+    search_name = models.CharField(max_length=101, editable=False, db_index=True, default="")
+    search_name_reversed = models.CharField(max_length=101, editable=False, db_index=True, default="")
 
     def __str__(self):
         return f"{self.imie} {self.nazwisko} (PESEL: {self.pesel})"
 
+    def update_search_fields(self):
+        """Ustawia kolumny wyszukiwania; wywoływane przy zapisie (i przy bulk_create ręcznie)."""
+        self.search_name, self.search_name_reversed = search_columns(self.imie, self.nazwisko)
+
+    def save(self, *args, **kwargs):
+        self.update_search_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"imie", "nazwisko"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "search_name", "search_name_reversed"}
+        super().save(*args, **kwargs)
+
 class Specialization(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
@@ -49,9 +68,48 @@ class Doctor(models.Model):
     def __str__(self):
         return f"Dr {self.imie} {self.nazwisko} - {self.specjalizacja.name}"
 
+class WorkingHours(models.Model):
+    WEEKDAYS = [
+        (0, 'Poniedziałek'),
+        (1, 'Wtorek'),
+        (2, 'Środa'),
+        (3, 'Czwartek'),
+        (4, 'Piątek'),
+        (5, 'Sobota'),
+        (6, 'Niedziela'),
+    ]
+
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='working_hours',
+        verbose_name='Lekarz'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS, verbose_name="Dzień tygodnia")
+    start = models.TimeField(verbose_name="Od")
+    end = models.TimeField(verbose_name="Do")
+
+    class Meta:
+        verbose_name = "Godziny pracy"
+        verbose_name_plural = "Godziny pracy"
+        ordering = ['doctor', 'weekday', 'start']
+
+    def clean(self):
+        if self.start and self.end and self.start >= self.end:
+            raise ValidationError("Godzina zakończenia pracy musi być późniejsza niż godzina rozpoczęcia.")
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.start:%H:%M}-{self.end:%H:%M}"
+
 class AppointmentType(models.Model):
     name=models.CharField(max_length=100, unique=True, verbose_name="Nazwa typu wizyty")
     description = models.TextField(blank=True, null=True, verbose_name="Opis")
+    duration_minutes = models.PositiveSmallIntegerField(
+        default=30,
+        validators=[MinValueValidator(1)],
+        verbose_name="Czas trwania (min)",
+        help_text="Wizyta zajmuje tyle 30-minutowych slotów, ile potrzeba na ten czas.",
+    )
 
     class Meta:
         verbose_name = "Typ wizyty"
@@ -113,21 +171,72 @@ class Appointment(models.Model):
         verbose_name="Wizyta"
         verbose_name_plural="Wizyty"
         ordering = ['date','time']
+        indexes = [
+            models.Index(fields=['date', 'time', 'id'], name='appointment_date_time_id'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status='canceled'),
+                name='unique_doctor_slot',
+                violation_error_message="Lekarz ma już wizytę w tym terminie.",
+            ),
+            models.UniqueConstraint(
+                fields=['patient', 'date', 'time'],
+                condition=~models.Q(status='canceled'),
+                name='unique_patient_slot',
+                violation_error_message="Pacjent ma już wizytę w tym terminie.",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_slot = (
+            instance.__dict__.get('doctor_id'),
+            instance.__dict__.get('date'),
+            instance.__dict__.get('time'),
+            instance.__dict__.get('status'),
+            instance.__dict__.get('type_id'),
+        )
+        instance._loaded_bucket = (
+            instance.__dict__.get('date'),
+            instance.__dict__.get('doctor_id'),
+            instance.__dict__.get('specialization_id'),
+            instance.__dict__.get('type_id'),
+            instance.__dict__.get('status'),
+        )
+        return instance
 
     def clean(self):
-        if self.doctor:
-            start_time=(timezone.datetime.combine(self.date, self.time) - timedelta(minutes=30)).time()
-            end_time = (timezone.datetime.combine(self.date, self.time)+timedelta(minutes=30)).time()
-
-            conflict = Appointment.objects.filter(
-                doctor=self.doctor,
-                date=self.date,
-                time__gte=start_time,
-                time__lte=end_time
-            ).exclude(pk=self.pk)
-
-            if conflict.exists():
+        from .availability import collides, occupied_mask, slot_index
+        from .slot_templates import OUTSIDE_HOURS_MESSAGE, open_slots, type_duration
+
+        if self.doctor and self.date and self.time and self.status != 'canceled':
+            duration = type_duration(self.type_id)
+            if slot_index(self.time) is not None and occupied_mask(self.time, duration) & ~open_slots(self.doctor_id, self.date):
+                raise ValidationError(OUTSIDE_HOURS_MESSAGE.format(doctor=self.doctor))
+            if slot_index(self.time) is None:
+                start_time=(timezone.datetime.combine(self.date, self.time) - timedelta(minutes=30)).time()
+                end_time = (timezone.datetime.combine(self.date, self.time)+timedelta(minutes=30)).time()
+
+                conflict = Appointment.objects.filter(
+                    doctor=self.doctor,
+                    date=self.date,
+                    time__gte=start_time,
+                    time__lte=end_time
+                ).exclude(pk=self.pk).exclude(status='canceled').exists()
+            else:
+                conflict = collides(self.doctor_id, self.date, self.time, exclude=self, duration=duration)
+
+            if conflict:
                 raise ValidationError("Ten lekarz ma już wizytę w tym terminie lub w ciągu 30 minut przed/po.")
+
+        if self.doctor_id and self.date and self.status != 'canceled':
+            from .leaves import ON_LEAVE_MESSAGE, is_on_leave
+
+            if is_on_leave(self.doctor_id, self.date):
+                raise ValidationError(ON_LEAVE_MESSAGE.format(doctor=self.doctor))
     
     def can_modify(self):
         now=timezone.localtime()
@@ -140,6 +249,59 @@ class Appointment(models.Model):
     def __str__(self):
         return f"Wizyta {self.date} {self.time} - {self.patient.imie} {self.patient.nazwisko} u {self.doctor if self.doctor else 'nieprzydzielony.'}"
     
+class DoctorDaySlots(models.Model):
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='day_slots',
+        verbose_name='Lekarz'
+    )
+    date = models.DateField(verbose_name="Dzień")
+    taken = models.BigIntegerField(default=0, verbose_name="Zajęte sloty (bitmapa)")
+
+    class Meta:
+        verbose_name = "Zajętość dnia lekarza"
+        verbose_name_plural = "Zajętość dni lekarzy"
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_doctor_day_slots'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} {self.date}: {self.taken:b}"
+
+class OccupancyStat(models.Model):
+    date = models.DateField(verbose_name="Dzień")
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='occupancy_stats',
+        verbose_name='Lekarz'
+    )
+    specialization = models.ForeignKey(
+        Specialization,
+        on_delete=models.CASCADE,
+        verbose_name="Specjalizacja"
+    )
+    type = models.ForeignKey(
+        AppointmentType,
+        on_delete=models.CASCADE,
+        verbose_name="Typ wizyty"
+    )
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES, verbose_name="Status wizyty")
+    count = models.IntegerField(default=0, verbose_name="Liczba wizyt")
+
+    class Meta:
+        verbose_name = "Statystyka obłożenia"
+        verbose_name_plural = "Statystyki obłożenia"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'doctor', 'specialization', 'type', 'status'], name='unique_occupancy_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.doctor_id} {self.type_id} {self.status}: {self.count}"
+
 class VisitSummary(models.Model):
     appointment=models.OneToOneField(
         'Appointment',
@@ -153,6 +315,57 @@ class VisitSummary(models.Model):
     def __str__(self):
         return f"Podsumowanie wizyty {self.appointment.id} - {self.appointment.patient.imie} {self.appointment.patient.nazwisko}"
     
+class ArchivedAppointment(models.Model):
+    """Zakończona lub odwołana wizyta przeniesiona z tabeli Appointment (zachowuje jej id)."""
+    id = models.BigIntegerField(primary_key=True, verbose_name="Id wizyty")
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="archived_appointments",
+        verbose_name="Pacjent"
+    )
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_appointments",
+        verbose_name="Lekarz"
+    )
+    specialization = models.ForeignKey(Specialization, on_delete=models.PROTECT, verbose_name="Specjalizacja")
+    type = models.ForeignKey(AppointmentType, on_delete=models.PROTECT, verbose_name="Typ wizyty")
+    date = models.DateField(verbose_name="Data wizyty")
+    time = models.TimeField(verbose_name="Godzina wizyty")
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES, verbose_name="Status wizyty")
+    notes = models.TextField(blank=True, null=True, verbose_name="Uwagi do wizyty")
+    created_at = models.DateTimeField(verbose_name="Data utworzenia")
+    updated_at = models.DateTimeField(verbose_name="Data aktualizacji")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Data archiwizacji")
+
+    class Meta:
+        verbose_name = "Wizyta archiwalna"
+        verbose_name_plural = "Wizyty archiwalne"
+        ordering = ['-date', '-time']
+        indexes = [
+            models.Index(fields=['patient', 'date', 'time'], name='archived_patient_date_time'),
+        ]
+
+    def __str__(self):
+        return f"Wizyta archiwalna {self.date} {self.time} ({self.get_status_display()})"
+
+class ArchivedVisitSummary(models.Model):
+    appointment = models.OneToOneField(
+        ArchivedAppointment,
+        on_delete=models.CASCADE,
+        related_name='summary'
+    )
+    prescription = models.TextField(verbose_name="Recepta", blank=True, null=True)
+    recommendations = models.TextField(verbose_name="Zalecenia", blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Podsumowanie wizyty archiwalnej {self.appointment_id}"
+
 class LeaveRequest(models.Model):
     LEAVE_TYPES=[
         ('on_demand', 'Na żądanie'),
@@ -187,6 +400,14 @@ class LeaveRequest(models.Model):
         validators=[FileExtensionValidator(allowed_extensions=['pdf','jpg','jpeg','png'])],
         verbose_name="Załącznik (dla chorobowego)"
     )
+    # NULL: miniatura czeka na komendę make_thumbnails, pusty napis: nie udało się jej utworzyć.
+    thumbnail=models.FileField(
+        upload_to='leave_thumbnails/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Miniatura załącznika"
+    )
 
     status=models.CharField(
         max_length=20,
@@ -202,9 +423,19 @@ class LeaveRequest(models.Model):
         verbose_name="Wniosek o wolne"
         verbose_name_plural="Wnioski o wolne"
         ordering=['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='leaverequest_created_id'),
+        ]
     
     def __str__(self):
         return f"{self.get_leave_type_display()} - {self.doctor.imie} {self.doctor.nazwisko} ({self.get_status_display()})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # FileField zapisuje brak pliku jako pusty napis, czyli znacznik nieudanej próby;
+        # bez miniatury (name is None) wniosek ma zostać w kolejce make_thumbnails jako NULL.
+        if self.thumbnail.name is None:
+            LeaveRequest.objects.filter(pk=self.pk).update(thumbnail=None)
     
     def clean(self):
         """
@@ -222,4 +453,134 @@ class LeaveRequest(models.Model):
         if self.leave_type == 'sick_leave' and not self.document:
             raise ValidationError("Dla chorobowego musisz załączyć plik potwierdzający zwolnienie.")
         if self.start_date > self.end_date:
-            raise ValidationError("Data zakończonego wolnego nie może być wcześniej niż data rozpoczęcia.")
\ No newline at end of file
+            raise ValidationError("Data zakończonego wolnego nie może być wcześniej niż data rozpoczęcia.")
+
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Oczekuje na wysłanie'),
+        ('sent', 'Wysłana'),
+        ('failed', 'Nieudana'),
+    ]
+
+    recipient = models.EmailField(verbose_name="Odbiorca")
+    subject = models.CharField(max_length=200, verbose_name="Temat")
+    body = models.TextField(verbose_name="Treść")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Status")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Liczba prób")
+    last_error = models.TextField(blank=True, verbose_name="Ostatni błąd")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Utworzono")
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Do wysłania od")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Wysłano")
+
+    class Meta:
+        verbose_name = "Wiadomość do wysłania"
+        verbose_name_plural = "Kolejka wiadomości e-mail"
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='outbox_status_available'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.subject} ({self.get_status_display()})"
+
+
+class AppointmentReminder(models.Model):
+    KIND_CHOICES = [
+        ('24h', 'Dzień przed wizytą'),
+        ('2h', 'Dwie godziny przed wizytą'),
+    ]
+
+    appointment = models.ForeignKey(
+        Appointment,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name='Wizyta'
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Rodzaj przypomnienia")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Zaplanowano")
+
+    class Meta:
+        verbose_name = "Przypomnienie o wizycie"
+        verbose_name_plural = "Przypomnienia o wizytach"
+        constraints = [
+            models.UniqueConstraint(fields=['appointment', 'kind'], name='unique_appointment_reminder'),
+        ]
+
+    def __str__(self):
+        return f"{self.appointment_id} ({self.kind})"
+
+
+class WaitlistEntry(models.Model):
+    STATUS_CHOICES = [
+        ('waiting', 'Oczekuje'),
+        ('offered', 'Zaproponowano termin'),
+        ('booked', 'Zarezerwowano wizytę'),
+        ('expired', 'Wygasło'),
+        ('canceled', 'Wycofane'),
+    ]
+
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries',
+        verbose_name='Pacjent'
+    )
+    specialization = models.ForeignKey(Specialization, on_delete=models.CASCADE, verbose_name="Specjalizacja")
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name='Lekarz',
+        help_text="Puste pole oznacza dowolnego lekarza specjalizacji.",
+    )
+    type = models.ForeignKey(AppointmentType, on_delete=models.CASCADE, verbose_name="Typ wizyty")
+    date_from = models.DateField(verbose_name="Od dnia")
+    date_to = models.DateField(verbose_name="Do dnia")
+    auto_book = models.BooleanField(
+        default=False,
+        verbose_name="Rezerwuj automatycznie",
+        help_text="Zwolniony termin zostanie od razu zarezerwowany zamiast wysłania propozycji.",
+    )
+    priority = models.SmallIntegerField(default=0, verbose_name="Priorytet")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting', verbose_name="Status")
+    appointment = models.ForeignKey(
+        Appointment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Zarezerwowana wizyta'
+    )
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Zapisano")
+    matched_at = models.DateTimeField(null=True, blank=True, verbose_name="Dopasowano")
+    # Termin zaproponowany pacjentowi (status 'offered'), do przyjęcia w panelu pacjenta.
+    offered_doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Proponowany lekarz'
+    )
+    offered_date = models.DateField(null=True, blank=True, verbose_name="Proponowany dzień")
+    offered_time = models.TimeField(null=True, blank=True, verbose_name="Proponowana godzina")
+
+    class Meta:
+        verbose_name = "Wpis na liście oczekujących"
+        verbose_name_plural = "Lista oczekujących"
+        indexes = [
+            # Kolejność dopasowania w obrębie specjalizacji: priorytet, potem kolejność zapisu.
+            models.Index(
+                fields=['specialization', 'status', '-priority', 'created_at', 'id'], name='waitlist_match'
+            ),
+            models.Index(fields=['status', 'date_to'], name='waitlist_status_until'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} – {self.specialization} ({self.date_from} – {self.date_to}, {self.get_status_display()})"
+
+    def clean(self):
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValidationError("Data końcowa nie może być wcześniejsza niż początkowa.")
+        if self.doctor_id and self.specialization_id and self.doctor.specjalizacja_id != self.specialization_id:
+            raise ValidationError("Wybrany lekarz nie należy do tej specjalizacji.")
@@ -0,0 +1,185 @@
+"""
+Powiadomienia e-mail przez tabelę outbox. Widoki tylko dopisują wiersz
+w tej samej transakcji co zmiana wizyty lub wniosku; wysyłką zajmuje się
+komenda ``send_emails``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Avg, DurationField, ExpressionWrapper, F, Min
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 60
+BACKOFF_MAX_SECONDS = 60 * 60
+# Na czas wysyłki wiadomość jest "zajęta", żeby drugi proces jej nie pobrał.
+CLAIM_SECONDS = 5 * 60
+
+
+def enqueue_email(recipient, subject, body):
+    if not recipient:
+        return None
+    return OutboxEmail.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def _appointment_line(appointment):
+    return (
+        f"{appointment.date:%d.%m.%Y} godz. {appointment.time:%H:%M}, "
+        f"{appointment.specialization.name}, lekarz {appointment.doctor.imie} {appointment.doctor.nazwisko}"
+    )
+
+
+def notify_appointment_booked(appointment):
+    enqueue_email(
+        appointment.patient.user.email,
+        "Potwierdzenie wizyty",
+        f"Umówiono wizytę: {_appointment_line(appointment)}.",
+    )
+
+
+def notify_appointment_canceled(appointment):
+    enqueue_email(
+        appointment.patient.user.email,
+        "Odwołanie wizyty",
+        f"Wizyta została odwołana: {_appointment_line(appointment)}.",
+    )
+    if appointment.doctor:
+        enqueue_email(
+            appointment.doctor.user.email,
+            "Pacjent odwołał wizytę",
+            f"Pacjent {appointment.patient.imie} {appointment.patient.nazwisko} odwołał wizytę: {_appointment_line(appointment)}.",
+        )
+
+
+def notify_doctor_changed(appointment):
+    enqueue_email(
+        appointment.patient.user.email,
+        "Zmiana lekarza",
+        f"Z powodu nieobecności lekarza Twoja wizyta odbędzie się u innego lekarza: {_appointment_line(appointment)}.",
+    )
+
+
+def notify_leave_decision(leave):
+    enqueue_email(
+        leave.doctor.user.email,
+        f"Wniosek o wolne: {leave.get_status_display()}",
+        f"Twój wniosek ({leave.get_leave_type_display()}, {leave.start_date:%d.%m.%Y} – {leave.end_date:%d.%m.%Y}) "
+        f"ma status: {leave.get_status_display()}.",
+    )
+
+
+def notify_visit_summary(appointment):
+    enqueue_email(
+        appointment.patient.user.email,
+        "Podsumowanie wizyty",
+        f"Lekarz dodał podsumowanie wizyty: {_appointment_line(appointment)}. Szczegóły znajdziesz w panelu pacjenta.",
+    )
+
+
+def notify_waitlist_offer(entry, doctor, day, t, valid_until):
+    enqueue_email(
+        entry.patient.user.email,
+        "Zwolnił się termin wizyty",
+        f"Zwolnił się termin z Twojej listy oczekujących: {day:%d.%m.%Y} godz. {t:%H:%M}, "
+        f"{entry.specialization.name}, lekarz {doctor.imie} {doctor.nazwisko}. "
+        f"Zarezerwuj go w panelu pacjenta do {timezone.localtime(valid_until):%d.%m.%Y %H:%M}; "
+        "potem propozycja wygaśnie.",
+    )
+
+
+def notify_waitlist_booked(appointment):
+    enqueue_email(
+        appointment.patient.user.email,
+        "Wizyta z listy oczekujących",
+        f"Zgodnie z Twoim wpisem na liście oczekujących zarezerwowano wizytę: {_appointment_line(appointment)}.",
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def claim_batch(batch_size, now=None):
+    """
+    Pobiera i rezerwuje paczkę wiadomości gotowych do wysłania. Na SQLite
+    select_for_update nic nie blokuje, więc o rezerwacji rozstrzyga warunkowy
+    UPDATE: wiadomości zajęte w międzyczasie przez inny proces mają już
+    available_at w przyszłości i wypadają z paczki.
+    """
+    now = now or timezone.now()
+    claim_until = now + timedelta(seconds=CLAIM_SECONDS)
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if batch:
+            ids = [m.id for m in batch]
+            claimed = OutboxEmail.objects.filter(id__in=ids, status='pending', available_at__lte=now).update(
+                attempts=F('attempts') + 1,
+                available_at=claim_until,
+            )
+            if claimed < len(batch):
+                mine = set(OutboxEmail.objects.filter(id__in=ids, available_at=claim_until).values_list('id', flat=True))
+                batch = [m for m in batch if m.id in mine]
+    for message in batch:
+        message.attempts += 1
+    return batch
+
+
+def deliver_batch(connection, batch_size=100, now=None):
+    """
+    Wysyła paczkę przez podane (otwarte) połączenie. Nieudane wiadomości wracają
+    do kolejki z wykładniczym odstępem, po MAX_ATTEMPTS próbach są oznaczane jako nieudane.
+    Zwraca (wysłane, ponowione, nieudane, opóźnienia w sekundach).
+    """
+    batch = claim_batch(batch_size, now)
+    sent, retried, failed, latencies = [], [], [], []
+    for message in batch:
+        email = EmailMessage(
+            message.subject, message.body, settings.DEFAULT_FROM_EMAIL, [message.recipient], connection=connection
+        )
+        try:
+            email.send()
+        except Exception as e:
+            # Połączenie mogło zostać zerwane; kolejna wiadomość otworzy je na nowo.
+            connection.close()
+            message.last_error = f"{type(e).__name__}: {e}"
+            if message.attempts >= MAX_ATTEMPTS:
+                message.status = 'failed'
+                failed.append(message)
+            else:
+                message.available_at = timezone.now() + backoff(message.attempts)
+                retried.append(message)
+            continue
+        message.status = 'sent'
+        message.sent_at = timezone.now()
+        message.last_error = ''
+        latencies.append((message.sent_at - message.created_at).total_seconds())
+        sent.append(message)
+
+    OutboxEmail.objects.bulk_update(sent + retried + failed, ['status', 'sent_at', 'available_at', 'last_error'])
+    return len(sent), len(retried), len(failed), latencies
+
+
+def queue_metrics(since=None):
+    """Głębokość kolejki, wiek najstarszej oczekującej wiadomości i średnie opóźnienie wysyłki."""
+    now = timezone.now()
+    since = since or now - timedelta(hours=1)
+    pending = OutboxEmail.objects.filter(status='pending')
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    latency = OutboxEmail.objects.filter(status='sent', sent_at__gte=since).aggregate(
+        avg=Avg(ExpressionWrapper(F('sent_at') - F('created_at'), output_field=DurationField()))
+    )['avg']
+    return {
+        "pending": pending.count(),
+        "due": pending.filter(available_at__lte=now).count(),
+        "failed": OutboxEmail.objects.filter(status='failed').count(),
+        "oldest_pending_seconds": (now - oldest).total_seconds() if oldest else None,
+        "avg_latency_seconds": latency.total_seconds() if latency else None,
+    }
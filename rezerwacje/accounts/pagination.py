@@ -0,0 +1,61 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_SEPARATOR = "|"
+
+
+def encode_cursor(obj, ordering):
+    values = [getattr(obj, field.lstrip("-")) for field in ordering]
+    return CURSOR_SEPARATOR.join(v.isoformat() if hasattr(v, "isoformat") else str(v) for v in values)
+
+
+def decode_cursor(model, ordering, cursor):
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(ordering):
+        raise ValueError("Niepoprawny kursor.")
+    try:
+        return [model._meta.get_field(field.lstrip("-")).to_python(part) for field, part in zip(ordering, parts)]
+    except ValidationError as e:
+        raise ValueError("Niepoprawny kursor.") from e
+
+
+def keyset_filter(ordering, values):
+    """
+    Warunek "po kursorze" dla porządku leksykograficznego, np. dla
+    (date, time, id): date > d OR (date = d AND time > t) OR (... AND id > i).
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{previous.lstrip("-"): value})
+        condition |= step
+    return condition
+
+
+def _page_queryset(queryset, ordering, cursor):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(queryset.model, ordering, cursor)))
+    return queryset
+
+
+def _split_page(items, ordering, limit):
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(items[-1], ordering)
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=50):
+    """Zwraca (elementy, następny kursor albo None) bez OFFSET i bez COUNT(*)."""
+    items = list(_page_queryset(queryset, ordering, cursor)[:limit + 1])
+    return _split_page(items, ordering, limit)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, limit=50):
+    """Wersja keyset_page dla widoków asynchronicznych."""
+    items = [obj async for obj in _page_queryset(queryset, ordering, cursor)[:limit + 1]]
+    return _split_page(items, ordering, limit)
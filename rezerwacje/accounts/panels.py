@@ -0,0 +1,124 @@
+"""
+Cache wyrenderowanych paneli pacjenta, lekarza i administratora.
+Klucz zawiera wersję (patrz caching.bump_version) podbijaną przez sygnały, więc
+niezmieniony panel kosztuje odczyt z cache zamiast zapytań i renderowania.
+Wspólna wersja nazw (lekarzy, pacjentów, specjalizacji, typów wizyt) unieważnia
+wszystkie panele naraz – takie zmiany są rzadkie i dotyczą wielu paneli.
+Panele zależne od czasu (nadchodzące wizyty) wygasają dokładnie w chwili,
+w której zmieniłaby się ich treść.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .caching import bump_version, get_versions
+
+PANEL_KEY = "panel:{}:{}:{}:{}"
+PANEL_MAX_TIMEOUT = 24 * 60 * 60
+# Token CSRF zależy od sesji, więc w cache zostaje znacznik podmieniany przy wysyłce.
+CSRF_PLACEHOLDER = "__panel_csrf_token__"
+MODIFY_WINDOW = timedelta(hours=24)
+LEAVE_REQUESTS_VERSION = "panel:leave_requests"
+PANEL_NAMES_VERSION = "panel:names"
+
+
+def patient_panel_version(patient_id):
+    return f"panel:patient:{patient_id}"
+
+
+def doctor_panel_version(doctor_id):
+    return f"panel:doctor:{doctor_id}"
+
+
+def bump_panels(patient_ids=(), doctor_ids=(), leave_requests=False):
+    names = [patient_panel_version(i) for i in set(patient_ids) if i]
+    names += [doctor_panel_version(i) for i in set(doctor_ids) if i]
+    if leave_requests:
+        names.append(LEAVE_REQUESTS_VERSION)
+    for name in names:
+        bump_version(name)
+
+
+def bump_panel_names():
+    bump_version(PANEL_NAMES_VERSION)
+
+
+def appointment_start(appointment):
+    return timezone.make_aware(
+        datetime.combine(appointment.date, appointment.time), timezone.get_current_timezone()
+    )
+
+
+def upcoming_expiry(appointments, now, modify_window=None):
+    """
+    Chwila, w której lista nadchodzących wizyt przestaje być aktualna: najbliższy
+    początek wizyty (wizyta znika z listy) lub, gdy ``modify_window`` jest podane,
+    moment utraty możliwości odwołania (Appointment.can_modify).
+    """
+    events = []
+    for appointment in appointments:
+        start = appointment_start(appointment)
+        events.append(start)
+        if modify_window is not None:
+            events.append(start - modify_window)
+    return min((event for event in events if event > now), default=None)
+
+
+def _timeout(expires_at, now):
+    if expires_at is None:
+        return PANEL_MAX_TIMEOUT
+    # W dół: wpis wygasa najwyżej sekundę za wcześnie, nigdy za późno.
+    return min(int((expires_at - now).total_seconds()), PANEL_MAX_TIMEOUT)
+
+
+def _keys(panels):
+    versions = get_versions({PANEL_NAMES_VERSION} | {version for version, _ in panels.values()})
+    return {
+        name: PANEL_KEY.format(name, version, versions[version], versions[PANEL_NAMES_VERSION])
+        for name, (version, _) in panels.items()
+    }
+
+
+def _finish(request, html):
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def cached_panels(request, panels):
+    """
+    ``panels``: {nazwa: (nazwa wersji, funkcja budująca)}. Funkcja zwraca
+    (html, chwila wygaśnięcia albo None) i jest wołana tylko przy braku w cache.
+    """
+    keys = _keys(panels)
+    found = cache.get_many(list(keys.values()))
+    result = {}
+    for name, key in keys.items():
+        if key not in found:
+            now = timezone.now()
+            html, expires_at = panels[name][1]()
+            timeout = _timeout(expires_at, now)
+            if timeout > 0:
+                cache.set(key, html, timeout)
+            found[key] = html
+        result[name] = _finish(request, found[key])
+    return result
+
+
+async def acached_panels(request, panels):
+    """Wersja cached_panels dla widoków asynchronicznych (funkcje budujące są korutynami)."""
+    keys = _keys(panels)
+    found = await cache.aget_many(list(keys.values()))
+    missing = [name for name, key in keys.items() if key not in found]
+    if missing:
+        now = timezone.now()
+        # Brakujące panele budowane są współbieżnie.
+        built = await asyncio.gather(*(panels[name][1]() for name in missing))
+        for name, (html, expires_at) in zip(missing, built):
+            timeout = _timeout(expires_at, now)
+            if timeout > 0:
+                await cache.aset(keys[name], html, timeout)
+            found[keys[name]] = html
+    return {name: _finish(request, found[key]) for name, key in keys.items()}
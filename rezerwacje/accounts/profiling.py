@@ -0,0 +1,208 @@
+"""
+Pomiar zapytań SQL i czasu obsługi żądań. Middleware (accounts.middleware)
+zakłada profil żądania w zmiennej kontekstowej; zapytania z każdego połączenia
+i renderowanie szablonów dopisują się do niego także wtedy, gdy widok
+asynchroniczny wykonuje ORM w innym wątku. Pomiary zbierane są w pamięci
+procesu i dopisywane do cache co PROFILE_FLUSH_SECONDS, a nie przy każdym żądaniu.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_KEY = "profile:view:{}"
+PROFILE_VIEWS_KEY = "profile:views"
+PROFILE_SAMPLES = 500
+PROFILE_TOP_DUPLICATES = 10
+PROFILE_TIMEOUT = 7 * 24 * 60 * 60
+PROFILE_FLUSH_SECONDS = 10
+SAMPLE_FIELDS = ('total_ms', 'sql_ms', 'render_ms', 'queries', 'bytes')
+
+current_profile = ContextVar('current_profile', default=None)
+
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+
+# Pomiary czekające na zapis do cache: {widok: [(próbka, przekroczony budżet, powtórzenia)]}.
+_pending = {}
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+        self.fingerprints = Counter()
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        # Listy IN o różnej długości to wciąż to samo zapytanie.
+        self.fingerprints[_IN_LIST.sub("(...)", sql)[:300]] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def record_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        # Szablony renderowane wewnątrz innych (np. przez crispy) liczą się tylko raz.
+        if profile is None or profile.rendering:
+            return super().render(context, request)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.rendering = False
+            profile.render_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Silnik DjangoTemplates mierzący czas renderowania szablonów najwyższego poziomu."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def query_budget(view_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def check_budget(view_name, profile):
+    budget = query_budget(view_name)
+    if budget is None or profile.queries <= budget:
+        return False
+    message = f"Widok {view_name} wykonał {profile.queries} zapytań (budżet {budget})."
+    if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message, extra={"duplicates": profile.duplicates()})
+    return True
+
+
+def store_profile(view_name, profile, total_time, size, over_budget=False):
+    """
+    Zapamiętuje pomiar żądania w pamięci procesu. Zwraca True, gdy minęło
+    PROFILE_FLUSH_SECONDS i czas wywołać flush_profiles().
+    """
+    sample = {
+        "total_ms": total_time * 1000,
+        "sql_ms": profile.sql_time * 1000,
+        "render_ms": profile.render_time * 1000,
+        "queries": profile.queries,
+        "bytes": size,
+    }
+    with _pending_lock:
+        _pending.setdefault(view_name, []).append((sample, over_budget, profile.duplicates()))
+        return time.monotonic() - _flushed_at >= PROFILE_FLUSH_SECONDS
+
+
+def _merge(data, measurements):
+    data = data or {
+        "count": 0,
+        "over_budget": 0,
+        "samples": {field: [] for field in SAMPLE_FIELDS},
+        "duplicates": {},
+    }
+    duplicates = Counter(data["duplicates"])
+    for sample, over_budget, sample_duplicates in measurements:
+        data["count"] += 1
+        data["over_budget"] += over_budget
+        duplicates.update(sample_duplicates)
+    for field in SAMPLE_FIELDS:
+        data["samples"][field] = (data["samples"][field] + [sample[field] for sample, _, _ in measurements])[-PROFILE_SAMPLES:]
+    data["duplicates"] = dict(duplicates.most_common(PROFILE_TOP_DUPLICATES))
+    return data
+
+
+def flush_profiles():
+    """
+    Dopisuje zebrane pomiary do agregatów widoków w cache (ostatnie
+    PROFILE_SAMPLES próbek). Przy współbieżnych zapisach z kilku procesów
+    pojedyncze paczki mogą przepaść – to tylko statystyka.
+    """
+    global _pending, _flushed_at
+    with _pending_lock:
+        pending, _pending = _pending, {}
+        _flushed_at = time.monotonic()
+    if not pending:
+        return
+    keys = {view_name: PROFILE_KEY.format(view_name) for view_name in pending}
+    stored = cache.get_many([*keys.values(), PROFILE_VIEWS_KEY])
+    updates = {
+        keys[view_name]: _merge(stored.get(keys[view_name]), measurements)
+        for view_name, measurements in pending.items()
+    }
+    views = stored.get(PROFILE_VIEWS_KEY) or []
+    if any(view_name not in views for view_name in pending):
+        updates[PROFILE_VIEWS_KEY] = views + [view_name for view_name in pending if view_name not in views]
+    cache.set_many(updates, PROFILE_TIMEOUT)
+
+
+def profile_report():
+    from .benchmarking import percentile
+
+    flush_profiles()
+    report = []
+    for view_name in cache.get(PROFILE_VIEWS_KEY) or []:
+        data = cache.get(PROFILE_KEY.format(view_name))
+        if not data:
+            continue
+        report.append({
+            "view": view_name,
+            "count": data["count"],
+            "query_budget": query_budget(view_name),
+            "over_budget": data["over_budget"],
+            **{
+                field: {
+                    "p50": percentile(values, 0.5),
+                    "p95": percentile(values, 0.95),
+                    "p99": percentile(values, 0.99),
+                }
+                for field, values in data["samples"].items()
+            },
+            "duplicate_queries": data["duplicates"],
+        })
+    return sorted(report, key=lambda row: row["total_ms"]["p95"] or 0, reverse=True)
+
+
+def reset_profiles():
+    with _pending_lock:
+        _pending.clear()
+    views = cache.get(PROFILE_VIEWS_KEY) or []
+    cache.delete_many([PROFILE_KEY.format(view_name) for view_name in views] + [PROFILE_VIEWS_KEY])
@@ -0,0 +1,110 @@
+"""
+Przypomnienia o wizytach. Każdy rodzaj ma swoje okno czasowe; wizyty z okna
+wybierane są zakresem po indeksie (date, time, id), a zapisane przypomnienia
+(unikalne dla pary wizyta–rodzaj) sprawiają, że ponowne uruchomienie nic nie dubluje.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Appointment, AppointmentReminder, OutboxEmail
+from .pagination import keyset_filter
+
+REMINDER_ORDERING = ('time', 'id')
+# Rodzaj: (początek okna, koniec okna) liczone od teraz.
+REMINDER_WINDOWS = {
+    '24h': (timedelta(hours=2), timedelta(hours=24)),
+    '2h': (timedelta(0), timedelta(hours=2)),
+}
+REMINDER_SUBJECTS = {
+    '24h': "Przypomnienie: wizyta jutro",
+    '2h': "Przypomnienie: wizyta za 2 godziny",
+}
+
+
+def day_ranges(start, end):
+    """
+    Dzieli przedział (start, end] na warunki dla kolejnych dni. Każdy z nich to
+    jeden zakres po indeksie (date, time, id), już posortowany po (time, id).
+    """
+    day = start.date()
+    while day <= end.date():
+        condition = Q(date=day)
+        if day == start.date():
+            condition &= Q(time__gt=start.time())
+        if day == end.date():
+            condition &= Q(time__lte=end.time())
+        yield condition
+        day += timedelta(days=1)
+
+
+def due_reminders(kind, now):
+    """Wizyty z okna danego rodzaju bez zapisanego przypomnienia, dzień po dniu."""
+    window_start, window_end = REMINDER_WINDOWS[kind]
+    for condition in day_ranges(now + window_start, now + window_end):
+        yield Appointment.objects.filter(condition, status='scheduled').exclude(reminders__kind=kind)
+
+
+def _reminder_body(row):
+    _, day, time, _, doctor_imie, doctor_nazwisko, specialization = row
+    return (
+        f"Przypominamy o wizycie {day:%d.%m.%Y} godz. {time:%H:%M}, {specialization}, "
+        f"lekarz {doctor_imie or ''} {doctor_nazwisko or ''}."
+    )
+
+
+def _schedule_batch(kind, rows, created_at, batch_size):
+    """
+    Przypomnienia i wiadomości zapisywane są w jednej transakcji. Wiersze
+    zapisane już przez równoległe uruchomienie są pomijane (ignore_conflicts),
+    a wiadomości powstają tylko dla przypomnień wstawionych przez to
+    uruchomienie – rozpoznanych po jego znaczniku created_at – więc żadna nie
+    zostanie zdublowana.
+    """
+    with transaction.atomic():
+        AppointmentReminder.objects.bulk_create(
+            [AppointmentReminder(appointment_id=row[0], kind=kind, created_at=created_at) for row in rows],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        inserted = set(AppointmentReminder.objects.filter(
+            appointment_id__in=[row[0] for row in rows], kind=kind, created_at=created_at
+        ).values_list('appointment_id', flat=True))
+        OutboxEmail.objects.bulk_create(
+            [
+                OutboxEmail(
+                    recipient=row[3], subject=REMINDER_SUBJECTS[kind], body=_reminder_body(row),
+                    created_at=created_at, available_at=created_at,
+                )
+                for row in rows if row[3] and row[0] in inserted
+            ],
+            batch_size=batch_size,
+        )
+    return len(inserted)
+
+
+def schedule_reminders(kind, now=None, batch_size=1000):
+    """
+    Zapisuje przypomnienia danego rodzaju i dopisuje je do kolejki e-mail.
+    Wizyty pobierane są paczkami po kursorze (time, id); zwraca liczbę przypomnień.
+    """
+    now = now or timezone.localtime().replace(tzinfo=None)
+    created_at = timezone.now()
+    total = 0
+    for appointments in due_reminders(kind, now):
+        queryset = appointments.values_list(
+            'id', 'date', 'time', 'patient__user__email',
+            'doctor__imie', 'doctor__nazwisko', 'specialization__name',
+        ).order_by(*REMINDER_ORDERING)
+        cursor = None
+        while True:
+            page = queryset.filter(keyset_filter(REMINDER_ORDERING, cursor)) if cursor else queryset
+            rows = list(page[:batch_size])
+            if rows:
+                total += _schedule_batch(kind, rows, created_at, batch_size)
+            if len(rows) < batch_size:
+                break
+            cursor = (rows[-1][2], rows[-1][0])
+    return total
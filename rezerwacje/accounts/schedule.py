@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from .availability import (
+    ALL_SLOTS, SLOT_COUNT, SLOT_MINUTES, TIME_CHOICES, as_date, build_mask, free_mask,
+)
+from .caching import get_versions
+from .leaves import in_index, leave_indexes
+from .models import Appointment, Doctor
+from .slot_templates import template_slots, type_durations, week_templates
+
+FREE, BOOKED, BLOCKED, LEAVE, CLOSED = "F", "B", "X", "L", "C"
+MAX_CALENDAR_DOCTORS = 50
+
+
+def calendar_range(start, view):
+    start = as_date(start)
+    if view == 'month':
+        first = start.replace(day=1)
+        next_month = (first + timedelta(days=32)).replace(day=1)
+        return first, next_month - timedelta(days=1)
+    monday = start - timedelta(days=start.weekday())
+    return monday, monday + timedelta(days=6)
+
+
+def doctor_version_name(doctor_id):
+    return f"calendar:doctor:{doctor_id}"
+
+
+def calendar_versions(doctor_ids):
+    return get_versions([doctor_version_name(doctor_id) for doctor_id in doctor_ids])
+
+
+def _day_grid(taken, on_leave, open_slots=ALL_SLOTS):
+    if on_leave:
+        return LEAVE * SLOT_COUNT
+    free = free_mask(taken, open_slots=open_slots)
+    return "".join(
+        BOOKED if taken >> i & 1 else FREE if free >> i & 1 else BLOCKED if open_slots >> i & 1 else CLOSED
+        for i in range(SLOT_COUNT)
+    )
+
+
+def doctor_calendar(doctor_ids, date_from, date_to):
+    """
+    Siatka grafiku: dla każdego lekarza i dnia napis o długości liczby slotów
+    (F – wolny, B – zajęty, X – zablokowany regułą ±30 minut, L – urlop,
+    C – poza godzinami pracy). Wizyty z całego zakresu pobierane są jednym
+    zapytaniem, urlopy i godziny pracy z indeksów w cache.
+    """
+    doctors = list(
+        Doctor.objects.filter(id__in=doctor_ids)
+        .order_by('nazwisko', 'imie', 'id')
+        .values('id', 'imie', 'nazwisko')
+    )
+    ids = [doc['id'] for doc in doctors]
+
+    appointments = {}
+    for pk, doctor_id, day, time, status, type_id in Appointment.objects.filter(
+        doctor_id__in=ids, date__range=(date_from, date_to)
+    ).exclude(status='canceled').order_by('date', 'time').values_list('id', 'doctor_id', 'date', 'time', 'status', 'type_id'):
+        appointments.setdefault((doctor_id, day), []).append((pk, time, status, type_id))
+
+    leaves = leave_indexes(ids)
+    templates = week_templates(ids)
+    durations = type_durations()
+
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    result = []
+    for doc in doctors:
+        grid, booked = {}, {}
+        for day in days:
+            rows = appointments.get((doc['id'], day), [])
+            on_leave = in_index(leaves[doc['id']], day)
+            taken = build_mask((t, durations.get(type_id, SLOT_MINUTES)) for _, t, _, type_id in rows)
+            grid[day.isoformat()] = _day_grid(taken, on_leave, template_slots(templates[doc['id']], day))
+            if rows:
+                booked[day.isoformat()] = [[pk, t.strftime("%H:%M"), status] for pk, t, status, _ in rows]
+        result.append({
+            "id": doc['id'],
+            "name": f"{doc['imie']} {doc['nazwisko']}",
+            "grid": grid,
+            "appointments": booked,
+        })
+
+    return {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "slots": [value for value, _ in TIME_CHOICES],
+        "doctors": result,
+    }
@@ -0,0 +1,71 @@
+"""
+Wyszukiwanie pacjentów po prefiksie nazwiska, imienia lub numeru PESEL.
+Imię i nazwisko trzymane są dodatkowo w postaci znormalizowanej (małe litery,
+bez polskich znaków) w dwóch indeksowanych kolumnach, więc prefiks to zakres
+w indeksie, a nie przeszukiwanie całej tabeli.
+"""
+import unicodedata
+
+from django.db.models import Q
+
+PATIENT_SEARCH_LIMIT = 10
+PATIENT_SEARCH_MIN_LENGTH = 2
+# Znaki, których NFKD nie rozkłada na literę i znak diakrytyczny.
+_FOLD = str.maketrans({"ł": "l", "Ł": "L", "ß": "ss"})
+
+
+def fold(text):
+    """Postać do wyszukiwania: bez znaków diakrytycznych, małe litery, pojedyncze spacje."""
+    text = unicodedata.normalize("NFKD", (text or "").translate(_FOLD))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def search_columns(imie, nazwisko):
+    """Wartości kolumn search_name ("nazwisko imię") i search_name_reversed ("imię nazwisko")."""
+    imie, nazwisko = fold(imie), fold(nazwisko)
+    return f"{nazwisko} {imie}".strip(), f"{imie} {nazwisko}".strip()
+
+
+def prefix_range(field, prefix):
+    """Warunek prefiksu jako zakres – korzysta z indeksu B-drzewa niezależnie od LIKE."""
+    return {f"{field}__gte": prefix, f"{field}__lt": prefix + "\uffff"}
+
+
+def patient_filter(query):
+    """Warunek wyszukiwania pacjentów po prefiksie (dla list, np. w panelu admin) albo None."""
+    prefix = fold(query)
+    if not prefix:
+        return None
+    if prefix.isdigit():
+        return Q(**prefix_range("pesel", prefix))
+    return Q(**prefix_range("search_name", prefix)) | Q(**prefix_range("search_name_reversed", prefix))
+
+
+def patient_label(imie, nazwisko, pesel):
+    return f"{imie} {nazwisko} ({pesel})"
+
+
+def search_patients(query, limit=PATIENT_SEARCH_LIMIT):
+    """
+    Do ``limit`` pacjentów pasujących do ``query`` jako lista {"id", "label"}.
+    Każda kolumna przeszukiwana jest osobnym zapytaniem z limitem, czytającym
+    indeks po kolei, więc koszt nie zależy od liczby pacjentów.
+    """
+    from .models import Patient
+
+    prefix = fold(query)
+    if len(prefix) < PATIENT_SEARCH_MIN_LENGTH:
+        return []
+    fields = ("pesel",) if prefix.isdigit() else ("search_name", "search_name_reversed")
+
+    found = {}
+    for field in fields:
+        rows = (
+            Patient.objects.filter(**prefix_range(field, prefix))
+            .order_by(field, "id")
+            .values_list("id", "imie", "nazwisko", "pesel", "search_name")[:limit]
+        )
+        for pk, imie, nazwisko, pesel, search_name in rows:
+            found[pk] = (pesel if prefix.isdigit() else search_name, pk, patient_label(imie, nazwisko, pesel))
+    return [{"id": pk, "label": label} for _, pk, label in sorted(found.values())[:limit]]
@@ -0,0 +1,164 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+DOCTOR_SLOT_TAKEN = "Lekarz {doctor.imie} {doctor.nazwisko} ma już wizytę w tym terminie."
+PATIENT_SLOT_TAKEN = "Pacjent ma już wizytę w tym terminie."
+OWN_SLOT_TAKEN = "Masz już umówioną wizytę w tym terminie."
+
+
+def _violated_constraint(error):
+    message = str(error)
+    if 'unique_patient_slot' in message or 'patient_id' in message:
+        return 'patient'
+    if 'unique_doctor_slot' in message or 'doctor_id' in message:
+        return 'doctor'
+    return None
+
+
+def book_appointment(appointment, patient_message=PATIENT_SLOT_TAKEN):
+    """
+    Zapisuje wizytę bez wcześniejszych zapytań o konflikty: o zajętości terminu
+    rozstrzygają warunkowe ograniczenia unikalności w bazie (wizyty nieodwołane),
+    a o regule ±30 minut – warunkowy zapis bitmapy dnia (claim_slot) w tej samej
+    transakcji, także przy przenoszeniu wizyty. Bitmapa jest wtedy już aktualna,
+    więc sygnał post_save jej nie przelicza. Błędy zamieniane są na dotychczasowe
+    komunikaty walidacji. Poza INSERT-em wizyty i UPDATE-em bitmapy rezerwacja
+    czyta jeszcze czasy trwania typów i urlopy, a sygnały dopisują liczniki
+    obłożenia – to kilka zapytań w jednej transakcji.
+    """
+    from .availability import SLOT_MINUTES, claim_slot, occupied_mask
+    from .leaves import ON_LEAVE_MESSAGE
+    from .models import AppointmentType, LeaveRequest
+
+    adding = appointment._state.adding
+    loaded = getattr(appointment, '_loaded_slot', None)
+    current = (appointment.doctor_id, appointment.date, appointment.time, appointment.status, appointment.type_id)
+    claim = bool(appointment.doctor_id) and appointment.status != 'canceled' and (
+        loaded is None or loaded[3] == 'canceled' or loaded[:3] != current[:3] or loaded[4] != current[4]
+    )
+    # Dotychczasowe sloty wizyty przenoszonej w obrębie dnia zwalniane są w tym samym UPDATE.
+    moved_within_day = claim and loaded and loaded[3] != 'canceled' and loaded[:2] == current[:2]
+    try:
+        with transaction.atomic():
+            if claim:
+                # Czasy trwania typów i urlopy w cache mogą być nieaktualne w innym procesie,
+                # więc rezerwacja czyta je z bazy. Urlop sprawdzany jest osobno, niezależnie
+                # od tego, czy typ wizyty ma jeszcze swój wiersz.
+                if LeaveRequest.objects.filter(
+                    doctor_id=appointment.doctor_id, status='approved',
+                    start_date__lte=appointment.date, end_date__gte=appointment.date,
+                ).exists():
+                    raise ValidationError(ON_LEAVE_MESSAGE.format(doctor=appointment.doctor))
+                durations = dict(AppointmentType.objects.filter(
+                    pk__in={appointment.type_id, loaded[4] if moved_within_day else appointment.type_id}
+                ).values_list('id', 'duration_minutes'))
+                release = occupied_mask(loaded[2], durations.get(loaded[4], SLOT_MINUTES)) if moved_within_day else 0
+                if not claim_slot(
+                    appointment.doctor_id, appointment.date, appointment.time,
+                    durations.get(appointment.type_id, SLOT_MINUTES), release,
+                ):
+                    raise ValidationError(DOCTOR_SLOT_TAKEN.format(doctor=appointment.doctor))
+                appointment._slot_claimed = True
+            appointment.save()
+    except IntegrityError as e:
+        if adding:
+            appointment.pk = None
+        constraint = _violated_constraint(e)
+        if constraint == 'doctor':
+            raise ValidationError(DOCTOR_SLOT_TAKEN.format(doctor=appointment.doctor)) from e
+        if constraint == 'patient':
+            raise ValidationError(patient_message) from e
+        raise
+    finally:
+        # Flagę zużywa sygnał post_save; po nieudanym zapisie nie może zostać na obiekcie.
+        appointment._slot_claimed = False
+    return appointment
+
+
+def reassign_leave_appointments(leave):
+    """
+    Przenosi zaplanowane wizyty z okresu urlopu na wolnych lekarzy tej samej
+    specjalizacji (mechanizm zastępstw). Termin u zastępcy zajmuje warunkowy
+    zapis bitmapy (claim_slot) – select_for_update nic nie blokuje na SQLite,
+    więc to on rozstrzyga wyścig z równoległą rezerwacją; przy kolizji wizyta
+    trafia do kolejnego kandydata. Lekarze zapisywani są jednym bulk_update;
+    zwraca pary (wizyta, poprzedni lekarz) oraz listę wizyt bez zastępcy.
+    """
+    from .availability import SLOT_MINUTES, claim_slot, collision_mask, occupied_mask, refresh_day
+    from .caching import bump_version
+    from .panels import bump_panels
+    from .leaves import in_index, leave_indexes
+    from .models import Appointment, Doctor, DoctorDaySlots
+    from .schedule import doctor_version_name
+    from .slot_templates import template_slots, type_durations, week_templates
+    from .stats import appointment_bucket, record_change
+
+    with transaction.atomic():
+        appointments = list(
+            Appointment.objects.select_for_update().select_related('patient__user', 'specialization')
+            .filter(doctor_id=leave.doctor_id, status='scheduled',
+                    date__range=(leave.start_date, leave.end_date))
+            .order_by('date', 'time', 'id')
+        )
+        if not appointments:
+            return [], []
+
+        candidates = {}
+        for doctor_id, specialization_id in Doctor.objects.filter(
+            specjalizacja_id__in={a.specialization_id for a in appointments}
+        ).exclude(id=leave.doctor_id).order_by('id').values_list('id', 'specjalizacja_id'):
+            candidates.setdefault(specialization_id, []).append(doctor_id)
+        substitute_ids = [doctor_id for ids in candidates.values() for doctor_id in ids]
+
+        masks = {
+            (doctor_id, day): taken
+            for doctor_id, day, taken in DoctorDaySlots.objects.filter(
+                doctor_id__in=substitute_ids, date__range=(leave.start_date, leave.end_date)
+            ).values_list('doctor_id', 'date', 'taken')
+        }
+        leaves = leave_indexes(substitute_ids)
+        templates = week_templates(substitute_ids)
+        durations = type_durations()
+
+        moved, unplaced = [], []
+        for appointment in appointments:
+            duration = durations.get(appointment.type_id, SLOT_MINUTES)
+            needed = occupied_mask(appointment.time, duration)
+            free = [
+                doctor_id for doctor_id in candidates.get(appointment.specialization_id, ())
+                if not in_index(leaves[doctor_id], appointment.date)
+                and not needed & ~template_slots(templates[doctor_id], appointment.date)
+                and not masks.get((doctor_id, appointment.date), 0) & collision_mask(appointment.time, duration)
+            ]
+            # Najmniej obciążony tego dnia lekarz przejmuje wizytę.
+            free.sort(key=lambda doctor_id: bin(masks.get((doctor_id, appointment.date), 0)).count('1'))
+            substitute = next(
+                (doctor_id for doctor_id in free if claim_slot(doctor_id, appointment.date, appointment.time, duration)),
+                None,
+            )
+            if substitute is None:
+                unplaced.append(appointment)
+                continue
+            masks[(substitute, appointment.date)] = masks.get((substitute, appointment.date), 0) | needed
+            moved.append((appointment, appointment.doctor_id))
+            appointment.doctor_id = substitute
+
+        if not moved:
+            return [], unplaced
+        Appointment.objects.bulk_update([a for a, _ in moved], ['doctor'], batch_size=500)
+
+        # bulk_update nie wysyła sygnałów: bitmapę lekarza na urlopie, statystyki i grafiki
+        # odświeżamy ręcznie (sloty zastępców zajął już claim_slot).
+        for day in sorted({a.date for a, _ in moved}):
+            refresh_day(leave.doctor_id, day)
+        for appointment, _ in moved:
+            bucket = appointment_bucket(appointment)
+            record_change(appointment._loaded_bucket, bucket)
+            appointment._loaded_bucket = bucket
+            appointment._loaded_slot = (
+                appointment.doctor_id, appointment.date, appointment.time, appointment.status, appointment.type_id
+            )
+        for doctor_id in {leave.doctor_id} | {a.doctor_id for a, _ in moved}:
+            bump_version(doctor_version_name(doctor_id))
+        bump_panels(patient_ids=[a.patient_id for a, _ in moved], doctor_ids={leave.doctor_id} | {a.doctor_id for a, _ in moved})
+    return moved, unplaced
@@ -0,0 +1,179 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .archive import archiving
+from .availability import mark_taken, refresh_day
+from .caching import bump_version
+from .models import (
+    Appointment, AppointmentType, Doctor, LeaveRequest, Patient, Specialization, VisitSummary,
+    WaitlistEntry, WorkingHours,
+)
+from .leaves import rebuild_leave_index
+from .live import publish_day
+from .panels import bump_panel_names, bump_panels
+from .profiling import install_query_recorder
+from .schedule import doctor_version_name
+from .slot_templates import rebuild_type_durations, rebuild_week_template, type_duration
+from .stats import add_to_bucket, appointment_bucket, record_change
+from .waitlist import slot_freed
+
+
+def _current_slot(appointment):
+    return (appointment.doctor_id, appointment.date, appointment.time, appointment.status, appointment.type_id)
+
+
+def _freed_slot(loaded, current=None):
+    """Termin zwolniony przez odwołanie, przeniesienie albo usunięcie wizyty (lekarz, data, godzina) lub None."""
+    if not loaded or not loaded[0] or loaded[3] == 'canceled':
+        return None
+    if current is None or current[3] == 'canceled' or current[:3] != loaded[:3]:
+        return loaded[:3]
+    return None
+
+
+def _publish_days(*days):
+    """Formularze rezerwacji otwarte na tych dniach dostają nowe wolne godziny po zatwierdzeniu zmiany."""
+    for doctor_id, day in set(days):
+        if doctor_id:
+            transaction.on_commit(lambda doctor_id=doctor_id, day=day: publish_day(doctor_id, day))
+
+
+def _bump_calendars(*doctor_ids):
+    for doctor_id in set(doctor_ids):
+        if doctor_id:
+            bump_version(doctor_version_name(doctor_id))
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_slot', None)
+    current = _current_slot(instance)
+    # book_appointment zajął już sloty warunkowym UPDATE (claim_slot).
+    claimed, instance._slot_claimed = getattr(instance, '_slot_claimed', False), False
+    if loaded is None and instance.doctor_id and instance.status != 'canceled':
+        if not claimed:
+            mark_taken(instance.doctor_id, instance.date, instance.time, type_duration(instance.type_id))
+    elif loaded != current:
+        if not claimed:
+            refresh_day(instance.doctor_id, instance.date)
+        if loaded and loaded[:2] != current[:2]:
+            refresh_day(loaded[0], loaded[1])
+    if loaded != current:
+        _bump_calendars(instance.doctor_id, loaded and loaded[0])
+        _publish_days(current[:2], *([loaded[:2]] if loaded else []))
+    bump_panels(patient_ids=[instance.patient_id], doctor_ids=[instance.doctor_id, loaded and loaded[0]])
+    freed = _freed_slot(loaded, current)
+    if freed:
+        slot_freed(*freed)
+    instance._loaded_slot = current
+
+    bucket = appointment_bucket(instance)
+    record_change(getattr(instance, '_loaded_bucket', None), bucket)
+    instance._loaded_bucket = bucket
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    if archiving():
+        return
+    loaded = getattr(instance, '_loaded_slot', None) or _current_slot(instance)
+    refresh_day(loaded[0], loaded[1])
+    _bump_calendars(loaded[0])
+    _publish_days(loaded[:2])
+    bump_panels(patient_ids=[instance.patient_id], doctor_ids=[loaded[0]])
+    freed = _freed_slot(loaded)
+    if freed:
+        slot_freed(*freed)
+    add_to_bucket(getattr(instance, '_loaded_bucket', None) or appointment_bucket(instance), -1)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+def doctors_changed(sender, **kwargs):
+    bump_version('doctors')
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Specialization)
+@receiver(post_save, sender=AppointmentType)
+def names_changed(sender, raw=False, **kwargs):
+    # Panele w cache pokazują nazwy lekarzy, pacjentów, specjalizacji i typów wizyt.
+    if not raw:
+        bump_panel_names()
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_delete, sender=LeaveRequest)
+def leave_request_changed(sender, instance, **kwargs):
+    rebuild_leave_index(instance.doctor_id)
+    _bump_calendars(instance.doctor_id)
+    bump_panels(doctor_ids=[instance.doctor_id], leave_requests=True)
+
+
+@receiver(post_save, sender=VisitSummary)
+@receiver(post_delete, sender=VisitSummary)
+def visit_summary_changed(sender, instance, **kwargs):
+    if archiving():
+        return
+    # Podsumowanie trafia do listy wizyt zakończonych pacjenta.
+    appointment = Appointment.objects.filter(pk=instance.appointment_id).values('patient_id', 'doctor_id').first()
+    if appointment:
+        bump_panels(patient_ids=[appointment['patient_id']], doctor_ids=[appointment['doctor_id']])
+
+
+@receiver(post_save, sender=WaitlistEntry)
+@receiver(post_delete, sender=WaitlistEntry)
+def waitlist_entry_changed(sender, instance, **kwargs):
+    bump_panels(patient_ids=[instance.patient_id])
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def working_hours_changed(sender, instance, **kwargs):
+    rebuild_week_template(instance.doctor_id)
+    _bump_calendars(instance.doctor_id)
+
+
+@receiver(pre_save, sender=AppointmentType)
+def appointment_type_saving(sender, instance, raw=False, **kwargs):
+    instance._previous_duration = None if raw or instance.pk is None else (
+        AppointmentType.objects.filter(pk=instance.pk).values_list('duration_minutes', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=AppointmentType)
+def appointment_type_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rebuild_type_durations()
+    previous = getattr(instance, '_previous_duration', None)
+    if previous is not None and previous != instance.duration_minutes:
+        # Nowy czas trwania zmienia zajętość przyszłych wizyt tego typu: przeliczamy tylko ich dni.
+        # Pełną przebudowę indeksu (także przeszłych dni) robi komenda rebuild_slot_index.
+        days = set(
+            Appointment.objects.filter(type_id=instance.pk, date__gte=timezone.localdate())
+            .exclude(status='canceled').exclude(doctor=None).values_list('doctor_id', 'date').distinct()
+        )
+        for doctor_id, day in days:
+            refresh_day(doctor_id, day)
+        _bump_calendars(*{doctor_id for doctor_id, _ in days})
+
+
+@receiver(post_delete, sender=AppointmentType)
+def appointment_type_deleted(sender, **kwargs):
+    rebuild_type_durations()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    if getattr(settings, 'QUERY_PROFILING', False):
+        install_query_recorder(connection)
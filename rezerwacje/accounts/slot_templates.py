@@ -0,0 +1,93 @@
+"""
+Godziny pracy lekarzy i czasy trwania typów wizyt skompilowane do masek siatki
+slotów. Tydzień lekarza to tablica siedmiu masek (poniedziałek–niedziela)
+trzymana w cache i przebudowywana sygnałem po zmianie godzin pracy; pusta
+tablica oznacza lekarza bez szablonu, przyjmującego w całej siatce. Sygnał
+odświeża tylko cache własnego procesu, więc wpisy wygasają po
+SCHEDULE_CACHE_TIMEOUT sekundach; rezerwacja czyta czas trwania typu z bazy.
+"""
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .availability import ALL_SLOTS, SLOT_MINUTES, SLOT_TIMES, as_date
+
+WEEK_TEMPLATE_KEY = "week_template:{}"
+TYPE_DURATIONS_KEY = "appointment_type_durations"
+OUTSIDE_HOURS_MESSAGE = "Lekarz {doctor.imie} {doctor.nazwisko} nie przyjmuje w tym terminie."
+
+
+def _timeout():
+    return getattr(settings, 'SCHEDULE_CACHE_TIMEOUT', 60)
+
+
+def hours_mask(start, end):
+    """Sloty, które w całości mieszczą się między ``start`` a ``end``."""
+    low, high = start.hour * 60 + start.minute, end.hour * 60 + end.minute
+    mask = 0
+    for i, t in enumerate(SLOT_TIMES):
+        slot = t.hour * 60 + t.minute
+        if low <= slot and slot + SLOT_MINUTES <= high:
+            mask |= 1 << i
+    return mask
+
+
+def _load(doctor_ids):
+    from .models import WorkingHours
+
+    templates = {doctor_id: array('Q') for doctor_id in doctor_ids}
+    for doctor_id, weekday, start, end in WorkingHours.objects.filter(
+        doctor_id__in=doctor_ids
+    ).values_list('doctor_id', 'weekday', 'start', 'end'):
+        if not templates[doctor_id]:
+            templates[doctor_id] = array('Q', [0] * 7)
+        templates[doctor_id][weekday] |= hours_mask(start, end)
+    return templates
+
+
+def rebuild_week_template(doctor_id):
+    template = _load([doctor_id])[doctor_id]
+    cache.set(WEEK_TEMPLATE_KEY.format(doctor_id), template, _timeout())
+    return template
+
+
+def week_templates(doctor_ids):
+    """Tygodniowe maski godzin pracy wielu lekarzy; brakujące w cache budowane są jednym zapytaniem."""
+    keys = {WEEK_TEMPLATE_KEY.format(doctor_id): doctor_id for doctor_id in doctor_ids}
+    found = cache.get_many(list(keys))
+    templates = {keys[key]: template for key, template in found.items()}
+    missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in templates]
+    if missing:
+        loaded = _load(missing)
+        cache.set_many({WEEK_TEMPLATE_KEY.format(doctor_id): template for doctor_id, template in loaded.items()}, _timeout())
+        templates.update(loaded)
+    return templates
+
+
+def template_slots(template, day):
+    return template[as_date(day).weekday()] if template else ALL_SLOTS
+
+
+def open_slots(doctor_id, day):
+    """Sloty siatki, w których lekarz przyjmuje danego dnia."""
+    return template_slots(week_templates([doctor_id])[doctor_id], day)
+
+
+def rebuild_type_durations():
+    from .models import AppointmentType
+
+    durations = dict(AppointmentType.objects.values_list('id', 'duration_minutes'))
+    cache.set(TYPE_DURATIONS_KEY, durations, _timeout())
+    return durations
+
+
+def type_durations():
+    durations = cache.get(TYPE_DURATIONS_KEY)
+    if durations is None:
+        durations = rebuild_type_durations()
+    return durations
+
+
+def type_duration(type_id):
+    return type_durations().get(type_id, SLOT_MINUTES)
@@ -0,0 +1,117 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Appointment, ArchivedAppointment, OccupancyStat
+
+BUCKET_FIELDS = ('date', 'doctor_id', 'specialization_id', 'type_id', 'status')
+
+
+def appointment_bucket(appointment):
+    return (
+        appointment.date,
+        appointment.doctor_id,
+        appointment.specialization_id,
+        appointment.type_id,
+        appointment.status,
+    )
+
+
+def _bucket_filter(bucket):
+    return dict(zip(BUCKET_FIELDS, bucket))
+
+
+def add_to_bucket(bucket, delta):
+    """Zmienia licznik kubełka (dzień, lekarz, specjalizacja, typ, status) o ``delta``."""
+    if not bucket or None in (bucket[0], bucket[2], bucket[3], bucket[4]):
+        return
+    rows = OccupancyStat.objects.filter(**_bucket_filter(bucket))
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            OccupancyStat.objects.create(count=delta, **_bucket_filter(bucket))
+    except IntegrityError:
+        rows.update(count=F('count') + delta)
+
+
+def record_change(old_bucket, new_bucket):
+    if old_bucket == new_bucket:
+        return
+    add_to_bucket(old_bucket, -1)
+    add_to_bucket(new_bucket, 1)
+
+
+def live_counts(date_from=None, date_to=None):
+    """Liczniki z wizyt bieżących i archiwalnych (archiwizacja nie zmienia statystyk)."""
+    counts = Counter()
+    for model in (Appointment, ArchivedAppointment):
+        appointments = model.objects.all()
+        if date_from:
+            appointments = appointments.filter(date__gte=date_from)
+        if date_to:
+            appointments = appointments.filter(date__lte=date_to)
+        counts.update({
+            tuple(row[field] for field in BUCKET_FIELDS): row['count']
+            for row in appointments.values(*BUCKET_FIELDS).annotate(count=Count('id')).order_by()
+        })
+    return dict(counts)
+
+
+def reconcile(date_from=None, date_to=None):
+    """
+    Porównuje zapisane liczniki z GROUP BY po wizytach i poprawia rozbieżności.
+    Zwraca liczbę poprawionych kubełków.
+    """
+    live = live_counts(date_from, date_to)
+    stored_rows = OccupancyStat.objects.all()
+    if date_from:
+        stored_rows = stored_rows.filter(date__gte=date_from)
+    if date_to:
+        stored_rows = stored_rows.filter(date__lte=date_to)
+
+    fixed = set()
+    with transaction.atomic():
+        stored, stale = {}, []
+        for stat in stored_rows.select_for_update().iterator():
+            bucket = tuple(getattr(stat, field) for field in BUCKET_FIELDS)
+            if bucket in stored or live.get(bucket, 0) != stat.count:
+                # Duplikaty (np. lekarz NULL) i złe liczniki usuwamy i odtwarzamy.
+                stale.append(stat.id)
+                fixed.add(bucket)
+                continue
+            stored[bucket] = stat.count
+        for start in range(0, len(stale), 500):
+            OccupancyStat.objects.filter(id__in=stale[start:start + 500]).delete()
+        missing = [bucket for bucket, count in live.items() if bucket not in stored and count]
+        OccupancyStat.objects.bulk_create(
+            [OccupancyStat(count=live[bucket], **_bucket_filter(bucket)) for bucket in missing],
+            batch_size=1000,
+        )
+        fixed.update(missing)
+    return len(fixed)
+
+
+def occupancy_summary(date_from, date_to):
+    """Dane do wykresów; czyta wyłącznie tabelę statystyk (koszt O(dni × lekarze))."""
+    stats = OccupancyStat.objects.filter(date__range=(date_from, date_to)).order_by()
+
+    def grouped(*fields):
+        result = {}
+        for row in stats.values(*fields, 'status').annotate(total=Sum('count')):
+            key = tuple(row[field] for field in fields)
+            entry = result.setdefault(key, {field: row[field] for field in fields})
+            entry[row['status']] = entry.get(row['status'], 0) + row['total']
+            entry['total'] = entry.get('total', 0) + row['total']
+        return sorted(result.values(), key=lambda entry: tuple(str(entry[field]) for field in fields))
+
+    return {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "statuses": dict(Appointment.STATUS_CHOICES),
+        "by_day": [{**entry, "date": entry["date"].isoformat()} for entry in grouped('date')],
+        "by_doctor": grouped('doctor_id', 'doctor__imie', 'doctor__nazwisko'),
+        "by_specialization": grouped('specialization_id', 'specialization__name'),
+        "by_type": grouped('type_id', 'type__name'),
+    }
@@ -1,3 +1,1125 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import time, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections
+from django.core.management import CommandError, call_command
+from django.test import (
+    AsyncClient, LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image
+
+from .admin import AppointmentAdmin
+from .availability import free_time_choices, occupied_mask, taken_mask
+from .benchmarking import measure
+from .database import REPLICA, ReadReplicaRouter, production_databases, use_replica
+from .documents import THUMBNAIL_SIZE, make_thumbnail, pending_thumbnails
+from .forms import AppointmentPatientForm
+from .leaves import is_on_leave, leave_indexes
+from .management.commands.loadtest import Command as LoadTestCommand
+from .live import day_key, get_broker, publish_day
+from .models import (
+    Appointment, AppointmentReminder, AppointmentType, ArchivedAppointment, ArchivedVisitSummary, Doctor,
+    DoctorDaySlots, LeaveRequest, OccupancyStat, OutboxEmail, Patient, Specialization, User, VisitSummary,
+    WaitlistEntry, WorkingHours,
+)
+from .notifications import claim_batch, deliver_batch, enqueue_email
+from .panels import CSRF_PLACEHOLDER
+from .profiling import install_query_recorder, profile_report, reset_profiles
+from .reminders import _schedule_batch, schedule_reminders
+from .search import fold
+from .services import book_appointment
+from .stats import BUCKET_FIELDS, live_counts, reconcile
+from .waitlist import WAITLIST_OFFER_HOURS, match_freed_slot
+
+
+def create_doctor(username="lekarz", specialization=None, **kwargs):
+    specialization = specialization or Specialization.objects.get_or_create(name="Internista")[0]
+    user = User.objects.create_user(username, f"{username}@example.com", "haslo", account_type='doctor')
+    return Doctor.objects.create(
+        user=user, pesel=kwargs.pop('pesel', str(user.id).zfill(11)), imie="Jan", nazwisko="Kowalski",
+        specjalizacja=specialization, **kwargs,
+    )
+
+
+def create_patient(username="pacjent"):
+    user = User.objects.create_user(username, f"{username}@example.com", "haslo", account_type='patient')
+    return Patient.objects.create(user=user, pesel=str(90000000000 + user.id), imie="Anna", nazwisko="Nowak")
+
+
+def create_admin(username="admin"):
+    return User.objects.create_user(username, f"{username}@example.com", "haslo", account_type='admin')
+
+
+def create_appointment(patient, doctor, day, t, type=None, **kwargs):
+    return Appointment.objects.create(
+        patient=patient, doctor=doctor, specialization=doctor.specjalizacja,
+        type=type or AppointmentType.objects.get_or_create(name="Konsultacja")[0], date=day, time=t, **kwargs,
+    )
+
+
+class LeaveDocumentTests(TestCase):
+    """Wysyłka załączników przez serwer WWW (X-Accel-Redirect / X-Sendfile) i miniatury skanów."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        doctor = create_doctor()
+        today = timezone.localdate()
+        self.leave = LeaveRequest.objects.create(
+            doctor=doctor, leave_type='sick_leave', start_date=today, end_date=today,
+            document=SimpleUploadedFile("zwolnienie łódź?1#.jpg", b"\xff\xd8\xff\xe0 skan"),
+        )
+        self.client.force_login(create_admin())
+
+    def _get(self):
+        return self.client.get(reverse('leave_document', args=[self.leave.id]))
+
+    @override_settings(SENDFILE_BACKEND='xaccel', SENDFILE_URL='/protected-media/')
+    def test_accel_redirect_quotes_non_ascii_name(self):
+        response = self._get()
+        header = response['X-Accel-Redirect']
+        self.assertEqual(header, "/protected-media/" + quote(self.leave.document.name))
+        self.assertTrue(header.isascii())
+        self.assertNotIn("=?utf-8?", response.serialize_headers().decode('ascii'))
+
+    @override_settings(SENDFILE_BACKEND='xsendfile')
+    def test_xsendfile_quotes_path(self):
+        header = self._get()['X-Sendfile']
+        self.assertTrue(header.isascii())
+        self.assertIn("%C5%82%C3%B3d%C5%BA", header)
+        self.assertNotIn(" ", header)
+
+    def test_thumbnail_is_made_from_image_and_served(self):
+        scan = BytesIO()
+        Image.new('RGB', (1200, 1600), 'white').save(scan, 'PNG')
+        leave = LeaveRequest.objects.create(
+            doctor=self.leave.doctor, leave_type='sick_leave', start_date=self.leave.start_date,
+            end_date=self.leave.end_date, document=SimpleUploadedFile("skan.png", scan.getvalue()),
+        )
+        self.assertEqual(list(pending_thumbnails()), [self.leave, leave])
+        self.assertFalse(make_thumbnail(self.leave))
+        self.assertTrue(make_thumbnail(leave))
+        self.assertEqual(list(pending_thumbnails()), [])
+
+        response = self.client.get(reverse('leave_thumbnail', args=[leave.id]))
+        self.assertEqual(response.status_code, 200)
+        with Image.open(BytesIO(b"".join(response.streaming_content))) as thumbnail:
+            self.assertEqual((thumbnail.format, max(thumbnail.size)), ('JPEG', THUMBNAIL_SIZE[1]))
+
+
+class DoctorsEndpointTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.client.force_login(self.doctor.user)
+
+    def test_invalid_specialization_is_rejected_before_cache(self):
+        response = self.client.get(reverse('get_doctors'), {"specialization": "1 OR 1=1"})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("ETag", response)
+
+    def test_equivalent_values_share_key(self):
+        url = reverse('get_doctors')
+        specialization = self.doctor.specjalizacja_id
+        first = self.client.get(url, {"specialization": str(specialization)})
+        second = self.client.get(url, {"specialization": f"0{specialization}"})
+        self.assertEqual(first.json(), [{"id": self.doctor.id, "name": "Jan Kowalski"}])
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(self.client.get(url).json(), [])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patient = create_patient()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        self.day = timezone.localdate() + timedelta(days=4)
+        self.client = AsyncClient()
+
+    async def test_patient_books_through_async_dashboard(self):
+        await self.client.aforce_login(self.patient.user)
+        response = await self.client.post(reverse('patient_dashboard'), {
+            "specialization": self.doctor.specjalizacja_id, "doctor": self.doctor.id, "type": self.type.id,
+            "date": self.day.isoformat(), "time": "10:00",
+        })
+        self.assertRedirects(response, reverse('patient_dashboard'), fetch_redirect_response=False)
+        response = await self.client.get(reverse('patient_dashboard'))
+        self.assertContains(response, "Jan Kowalski")
+        self.assertTrue(await Appointment.objects.filter(patient=self.patient, date=self.day).aexists())
+
+    async def test_doctor_dashboard_lists_own_appointments(self):
+        await sync_to_async(create_appointment)(self.patient, self.doctor, self.day, time(9, 0), self.type)
+        await self.client.aforce_login(self.doctor.user)
+        self.assertContains(await self.client.get(reverse('doctor_dashboard')), "Anna")
+        await self.client.aforce_login(self.patient.user)
+        response = await self.client.get(reverse('doctor_dashboard'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    async def test_lookups_serve_concurrent_requests_and_require_login(self):
+        response = await self.client.get(reverse('admin_appointments'))
+        self.assertEqual(response.status_code, 302)
+        await self.client.aforce_login(self.patient.user)
+        params = {"specialization": self.doctor.specjalizacja_id}
+        responses = await asyncio.gather(
+            self.client.get(reverse('get_doctors'), params),
+            self.client.get(reverse('get_free_slots'), {**params, "date_from": self.day.isoformat(), "limit": 1}),
+        )
+        self.assertEqual(responses[0].json(), [{"id": self.doctor.id, "name": "Jan Kowalski"}])
+        self.assertEqual(responses[1].json()["slots"][0]["date"], self.day.isoformat())
+        self.assertEqual((await self.client.get(reverse('admin_appointments'))).status_code, 302)
+
+
+class WaitlistOfferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.patient = create_patient()
+        self.entry = WaitlistEntry.objects.create(
+            patient=self.patient, specialization=self.doctor.specjalizacja, type=self.type,
+            date_from=self.day, date_to=self.day,
+        )
+
+    def test_offer_is_accepted_from_patient_panel(self):
+        self.assertEqual(match_freed_slot(self.doctor.id, self.day, time(10, 0)), self.entry)
+        self.entry.refresh_from_db()
+        self.assertEqual(
+            (self.entry.status, self.entry.offered_doctor_id, self.entry.offered_date, self.entry.offered_time),
+            ('offered', self.doctor.id, self.day, time(10, 0)),
+        )
+
+        self.client.force_login(self.patient.user)
+        self.assertContains(self.client.get(reverse('patient_dashboard')), reverse('accept_waitlist_offer', args=[self.entry.id]))
+        self.client.post(reverse('accept_waitlist_offer', args=[self.entry.id]))
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, 'booked')
+        self.assertEqual(
+            (self.entry.appointment.patient_id, self.entry.appointment.doctor_id, self.entry.appointment.time),
+            (self.patient.id, self.doctor.id, time(10, 0)),
+        )
+
+    def test_unanswered_offer_returns_to_waiting(self):
+        now = timezone.localtime()
+        match_freed_slot(self.doctor.id, self.day, time(10, 0), now=now)
+        later = now + timedelta(hours=WAITLIST_OFFER_HOURS, minutes=1)
+        # Kolejny zwolniony termin: przeterminowana propozycja wraca do kolejki i dostaje nowy termin.
+        self.assertEqual(match_freed_slot(self.doctor.id, self.day, time(12, 0), now=later), self.entry)
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.offered_time), ('offered', time(12, 0)))
+
+        self.client.force_login(self.patient.user)
+        self.entry.matched_at = now - timedelta(hours=WAITLIST_OFFER_HOURS)
+        self.entry.save()
+        self.client.post(reverse('accept_waitlist_offer', args=[self.entry.id]))
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, 'offered')
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_patient_busy_within_30_minutes_is_skipped(self):
+        Appointment.objects.create(
+            patient=self.patient, doctor=create_doctor("inny"), specialization=self.doctor.specjalizacja,
+            type=self.type, date=self.day, time=time(10, 30),
+        )
+        self.assertIsNone(match_freed_slot(self.doctor.id, self.day, time(10, 0)))
+        self.assertEqual(match_freed_slot(self.doctor.id, self.day, time(11, 30)), self.entry)
+
+
+class ReminderSchedulingTests(TestCase):
+    def setUp(self):
+        doctor = create_doctor()
+        start = timezone.localtime().replace(tzinfo=None, second=0, microsecond=0) + timedelta(hours=5)
+        self.appointments = [
+            Appointment.objects.create(
+                patient=create_patient(f"pacjent{i}"), doctor=doctor, specialization=doctor.specjalizacja,
+                type=AppointmentType.objects.get_or_create(name="Konsultacja")[0],
+                date=(start + timedelta(minutes=30 * i)).date(), time=(start + timedelta(minutes=30 * i)).time(),
+            )
+            for i in range(3)
+        ]
+
+    def test_schedules_each_reminder_once(self):
+        self.assertEqual(schedule_reminders('24h', batch_size=2), 3)
+        self.assertEqual(schedule_reminders('24h'), 0)
+        self.assertEqual(AppointmentReminder.objects.filter(kind='24h').count(), 3)
+        self.assertEqual(OutboxEmail.objects.count(), 3)
+
+    def test_overlapping_run_skips_rows_already_inserted(self):
+        # Druga paczka z tymi samymi wizytami, jak przy dwóch równoległych uruchomieniach.
+        rows = [(a.id, a.date, a.time, a.patient.user.email, "Jan", "Kowalski", "Internista") for a in self.appointments]
+        self.assertEqual(_schedule_batch('24h', rows[:2], timezone.now(), 100), 2)
+        self.assertEqual(_schedule_batch('24h', rows, timezone.now(), 100), 1)
+        self.assertEqual(AppointmentReminder.objects.count(), 3)
+        self.assertEqual(sorted(OutboxEmail.objects.values_list('recipient', flat=True)), sorted(r[3] for r in rows))
+
+
+class SlotStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patient = create_patient()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        self.day = timezone.localdate() + timedelta(days=3)
+
+    def _book(self, t):
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, specialization=self.doctor.specjalizacja,
+            type=self.type, date=self.day, time=t,
+        )
+
+    async def test_stream_pushes_free_times_after_publish_day(self):
+        await self.async_client.aforce_login(self.patient.user)
+        response = await self.async_client.get(
+            reverse('slot_stream'), {"doctor": self.doctor.id, "date": self.day.isoformat(), "type": self.type.id}
+        )
+        events = response.streaming_content
+        try:
+            self.assertTrue((await anext(events)).startswith(b"retry:"))
+            self.assertIn(b'"10:00"', await anext(events))
+
+            # Zapis wizyty aktualizuje bitmapę dnia; publish_day to to, co sygnał wywołuje po commicie.
+            await sync_to_async(self._book)(time(10, 0))
+            await sync_to_async(publish_day)(self.doctor.id, self.day)
+            pushed = await asyncio.wait_for(anext(events), timeout=5)
+        finally:
+            # Po rozłączeniu klienta ASGIHandler anuluje zadanie czekające na kolejne zdarzenie.
+            waiting = asyncio.ensure_future(anext(events))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+        self.assertTrue(pushed.startswith(b"event: slots"))
+        # Reguła ±30 minut blokuje też sąsiednie sloty.
+        for blocked in (b'"09:30"', b'"10:00"', b'"10:30"'):
+            self.assertNotIn(blocked, pushed)
+        self.assertIn(b'"11:00"', pushed)
+        self.assertFalse(get_broker().has_subscribers(day_key(self.doctor.id, self.day)))
+
+
+class OutboxDeliveryTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            enqueue_email(f"pacjent{i}@example.com", "Potwierdzenie wizyty", f"Wizyta {i}")
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_delivers_and_marks_rows_sent(self):
+        sent, retried, failed, latencies = deliver_batch(mail.get_connection(), batch_size=10)
+        self.assertEqual((sent, retried, failed, len(latencies)), (3, 0, 0, 3))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f"pacjent{i}@example.com" for i in range(3)])
+        self.assertEqual(
+            list(OutboxEmail.objects.values_list('status', 'attempts').distinct()), [('sent', 1)]
+        )
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(deliver_batch(mail.get_connection())[:3], (0, 0, 0))
+
+    def test_claimed_messages_are_not_claimed_again(self):
+        first = claim_batch(2)
+        second = claim_batch(10)
+        self.assertEqual(len(first) + len(second), 3)
+        self.assertFalse({m.id for m in first} & {m.id for m in second})
+
+
+class ReadReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        patches = [
+            mock.patch.dict(connections.settings, {REPLICA: connections.settings['default']}),
+            # TestCase trzyma każdy test w transakcji, a w niej router zostaje na głównym połączeniu.
+            mock.patch.object(connections['default'], 'in_atomic_block', False),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _routed(self, method):
+        seen = []
+        view = use_replica(lambda request: seen.append(self.router.db_for_read(Appointment)))
+        view(RequestFactory().generic(method, '/'))
+        return seen[0]
+
+    def test_only_safe_requests_of_marked_views_read_from_replica(self):
+        self.assertIsNone(self.router.db_for_read(Appointment))
+        self.assertEqual(self._routed('GET'), REPLICA)
+        self.assertIsNone(self._routed('POST'))
+        self.assertEqual(self.router.db_for_write(Appointment), 'default')
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'accounts'))
+
+    def test_reads_inside_transaction_stay_on_default(self):
+        connections['default'].in_atomic_block = True
+        self.assertIsNone(self._routed('GET'))
+
+    def test_production_profile_opens_replica_read_only(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory) / "baza.sqlite3"
+        sqlite3.connect(path).close()
+        databases = production_databases(path)
+        self.assertIn("journal_mode=WAL", databases['default']['OPTIONS']['init_command'])
+        self.assertEqual(databases['default']['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        replica = sqlite3.connect(databases[REPLICA]['NAME'], uri=True)
+        self.addCleanup(replica.close)
+        with self.assertRaises(sqlite3.OperationalError):
+            replica.execute("CREATE TABLE t (x)")
+
+
+class LeaveIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.day = timezone.localdate() + timedelta(days=5)
+
+    def _leave(self, start, end, status='approved'):
+        return LeaveRequest.objects.create(
+            doctor=self.doctor, leave_type='on_demand', status=status,
+            start_date=self.day + timedelta(days=start), end_date=self.day + timedelta(days=end),
+        )
+
+    def test_index_merges_adjacent_approved_leaves(self):
+        self._leave(0, 1)
+        self._leave(2, 3)
+        self._leave(6, 6)
+        self._leave(10, 12, status='pending')
+        starts, ends = leave_indexes([self.doctor.id])[self.doctor.id]
+        self.assertEqual(
+            [(start - self.day.toordinal(), end - self.day.toordinal()) for start, end in zip(starts, ends)],
+            [(0, 3), (6, 6)],
+        )
+        self.assertEqual(
+            [is_on_leave(self.doctor.id, self.day + timedelta(days=i)) for i in (-1, 0, 3, 4, 6, 7, 11)],
+            [False, True, True, False, True, False, False],
+        )
+
+    def test_status_changes_refresh_the_index(self):
+        leave = self._leave(0, 0, status='pending')
+        self.assertFalse(is_on_leave(self.doctor.id, self.day))
+        leave.status = 'approved'
+        leave.save()
+        self.assertTrue(is_on_leave(self.doctor.id, self.day))
+        leave.delete()
+        self.assertFalse(is_on_leave(self.doctor.id, self.day))
+
+    def test_booking_form_rejects_leave_day(self):
+        self._leave(0, 0)
+        self.assertEqual(free_time_choices(self.doctor.id, self.day), [])
+        form = AppointmentPatientForm({
+            "specialization": self.doctor.specjalizacja_id, "doctor": self.doctor.id,
+            "type": AppointmentType.objects.create(name="Konsultacja").id,
+            "date": self.day.isoformat(), "time": "10:00",
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn("przebywa w tym dniu na zatwierdzonym urlopie", str(form.errors))
+
+
+class DoctorCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        # Poniedziałek za tydzień: cały tydzień grafiku leży w przyszłości.
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        create_appointment(create_patient(), self.doctor, self.monday, time(10, 0))
+        leave_day = self.monday + timedelta(days=1)
+        LeaveRequest.objects.create(
+            doctor=self.doctor, leave_type='on_demand', start_date=leave_day, end_date=leave_day, status='approved',
+        )
+        self.client.force_login(self.doctor.user)
+
+    def _get(self, **headers):
+        return self.client.get(reverse('doctor_calendar'), {"start": self.monday.isoformat()}, headers=headers)
+
+    def test_grid_marks_booked_blocked_and_leave_slots(self):
+        data = self._get().json()
+        self.assertEqual(data["date_from"], self.monday.isoformat())
+        (doctor,) = data["doctors"]
+        self.assertEqual(doctor["grid"][self.monday.isoformat()], "FFFXBXFFFFFFFFFFFFFFFFFFF")
+        self.assertEqual(doctor["grid"][(self.monday + timedelta(days=1)).isoformat()], "L" * 25)
+        self.assertEqual([row[1:] for row in doctor["appointments"][self.monday.isoformat()]], [["10:00", "scheduled"]])
+
+    def test_unchanged_calendar_answers_not_modified(self):
+        etag = self._get()['ETag']
+        self.assertEqual(self._get(if_none_match=etag).status_code, 304)
+        create_appointment(create_patient("pacjent2"), self.doctor, self.monday, time(14, 0))
+        response = self._get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_patients_have_no_access(self):
+        self.client.force_login(create_patient("pacjent3").user)
+        self.assertEqual(self._get().status_code, 403)
+
+
+class OccupancyStatsTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.appointments = [
+            create_appointment(create_patient(f"pacjent{i}"), self.doctor, self.day, time(9 + i, 0)) for i in range(3)
+        ]
+
+    def _stored(self):
+        return {
+            tuple(getattr(stat, field) for field in BUCKET_FIELDS): stat.count
+            for stat in OccupancyStat.objects.exclude(count=0)
+        }
+
+    def test_counters_follow_saves_and_deletes(self):
+        self.appointments[0].status = 'canceled'
+        self.appointments[0].save()
+        self.appointments[1].delete()
+        self.assertEqual(self._stored(), live_counts())
+        self.assertEqual(live_counts(), {
+            (self.day, self.doctor.id, self.doctor.specjalizacja_id, self.appointments[0].type_id, 'scheduled'): 1,
+            (self.day, self.doctor.id, self.doctor.specjalizacja_id, self.appointments[0].type_id, 'canceled'): 1,
+        })
+
+    def test_reconcile_repairs_counters_changed_behind_signals(self):
+        Appointment.objects.filter(pk=self.appointments[0].pk).update(status='completed')
+        OccupancyStat.objects.create(
+            date=self.day, doctor=None, specialization=self.doctor.specjalizacja,
+            type=self.appointments[0].type, status='scheduled', count=5,
+        )
+        self.assertEqual(reconcile(), 3)
+        self.assertEqual(self._stored(), live_counts())
+        self.assertEqual(reconcile(), 0)
+
+    def test_summary_endpoint_reads_counters(self):
+        self.client.force_login(create_admin())
+        data = self.client.get(reverse('occupancy_stats'), {"date_from": self.day, "date_to": self.day}).json()
+        self.assertEqual(data["by_day"], [{"date": self.day.isoformat(), "scheduled": 3, "total": 3}])
+        self.assertEqual(data["by_doctor"][0]["total"], 3)
+
+
+# Szybki hasher: logowanie wszystkich użytkowników naraz nie zjada całego, krótkiego testu.
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestCommandTests(LiveServerTestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'generate_data', patients=3, doctors=2, specializations=1, appointment_types=1,
+            appointments=20, leaves=0, days=10, prefix='load', seed=1, stdout=StringIO(),
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.output = Path(directory) / "loadtest.json"
+
+    def test_short_run_against_live_server_reports_no_double_bookings(self):
+        call_command(
+            'loadtest', url=self.live_server_url + '/', patients=3, doctors=1, admins=1,
+            duration=2, ramp_up=0, think=0.05, output=str(self.output), stdout=StringIO(),
+        )
+        report = json.loads(self.output.read_text(encoding='utf-8'))
+        results = report["results"]
+        self.assertEqual(results["double_bookings"], {"doctor": 0, "patient": 0})
+        self.assertEqual(results["outcomes"].get("login_failed", 0), 0)
+        self.assertIn("patient_dashboard", results["actions"])
+        self.assertEqual(results["actions"]["patient_dashboard"]["errors"], 0)
+
+    def test_double_booking_check_uses_thirty_minute_rule(self):
+        doctor = Doctor.objects.first()
+        patient = Patient.objects.first()
+        day = timezone.localdate() + timedelta(days=30)
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=doctor, specialization_id=doctor.specjalizacja_id,
+                        type=AppointmentType.objects.first(), date=day, time=t)
+            for t in (time(10, 0), time(10, 30))
+        ])
+        self.assertEqual(LoadTestCommand()._double_bookings(), {"doctor": 1, "patient": 0})
+
+
+class HighVolumeChangelistTests(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor()
+        self.patient = create_patient()
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.client.force_login(User.objects.create_superuser("root", "root@example.com", "haslo", account_type='admin'))
+
+    def _add(self, count, offset=0):
+        for i in range(offset, offset + count):
+            create_appointment(self.patient, self.doctor, self.day + timedelta(days=i), time(10, 0))
+
+    def _changelist(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:accounts_appointment_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self._add(2)
+        _, few = self._changelist()
+        self._add(20, offset=2)
+        _, many = self._changelist()
+        self.assertEqual(len(many), len(few))
+        self.assertFalse([sql for sql in many if "OFFSET" in sql or "DISTINCT" in sql])
+
+    def test_cursor_pages_through_all_rows(self):
+        self._add(5)
+        seen, params = [], {}
+        with mock.patch.object(AppointmentAdmin, 'list_per_page', 2):
+            while True:
+                response, _ = self._changelist(**params)
+                changelist = response.context['cl']
+                seen += [appointment.id for appointment in changelist.result_list]
+                if not changelist.next_cursor:
+                    break
+                params = {"cursor": changelist.next_cursor}
+        self.assertEqual(seen, list(Appointment.objects.order_by('-date', '-time', '-id').values_list('id', flat=True)))
+
+    def test_count_above_threshold_is_estimated(self):
+        self._add(3)
+        with mock.patch.object(AppointmentAdmin, 'count_threshold', 2):
+            changelist = self._changelist()[0].context['cl']
+        self.assertFalse(changelist.result_count_exact)
+        self.assertEqual(changelist.result_count_display, "ponad 2")
+
+
+class PatientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patients = {}
+        for username, imie, nazwisko in [
+            ("p1", "Łukasz", "Żółć"), ("p2", "Anna", "Zolna"), ("p3", "Zofia", "Nowak"),
+        ]:
+            patient = create_patient(username)
+            patient.imie, patient.nazwisko = imie, nazwisko
+            patient.save(update_fields=['imie', 'nazwisko'])
+            cls.patients[username] = patient
+        cls.admin = create_admin()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _ids(self, query):
+        response = self.client.get(reverse('patient_search'), {"q": query})
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_prefix_matches_either_name_order_without_diacritics(self):
+        p1, p2, p3 = (self.patients[name].id for name in ("p1", "p2", "p3"))
+        self.assertEqual(fold("  Łukasz   ŻÓŁĆ "), "lukasz zolc")
+        self.assertEqual(self._ids("zol"), [p1, p2])
+        self.assertEqual(self._ids("Łukasz Ż"), [p1])
+        # Wyniki obu kolumn sortowane są po "nazwisko imię".
+        self.assertEqual(self._ids("zo"), [p3, p1, p2])
+        self.assertEqual(self._ids(self.patients["p3"].pesel), [p3])
+        self.assertEqual(self._ids(self.patients["p3"].pesel[:-1]), [p1, p2, p3])
+        self.assertEqual(self._ids("z"), [])
+
+    def test_only_admin_can_search(self):
+        self.client.force_login(self.patients["p1"].user)
+        self.assertEqual(self.client.get(reverse('patient_search'), {"q": "zol"}).status_code, 302)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patient = create_patient()
+        today = timezone.localdate()
+        old, recent = today - timedelta(days=400), today - timedelta(days=10)
+        self.old_completed = [
+            create_appointment(self.patient, self.doctor, old + timedelta(days=i), time(10, 0), status='completed')
+            for i in range(3)
+        ]
+        VisitSummary.objects.create(appointment=self.old_completed[0], prescription="Lek archiwalny")
+        self.old_canceled = create_appointment(self.patient, self.doctor, old, time(12, 0), status='canceled')
+        self.old_scheduled = create_appointment(self.patient, self.doctor, old, time(14, 0))
+        self.recent = create_appointment(self.patient, self.doctor, recent, time(10, 0), status='completed')
+        VisitSummary.objects.create(appointment=self.recent, prescription="Lek bieżący")
+
+    def _archive(self, **options):
+        call_command('archive_appointments', days=365, batch_size=2, stdout=StringIO(), **options)
+
+    def test_moves_old_finished_visits_in_resumable_batches(self):
+        counts = live_counts()
+        self._archive(max_batches=1)
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+        self._archive()
+        archived = {*self.old_completed, self.old_canceled}
+        self.assertEqual(set(ArchivedAppointment.objects.values_list('id', flat=True)), {a.id for a in archived})
+        self.assertEqual(set(Appointment.objects.values_list('id', flat=True)), {self.old_scheduled.id, self.recent.id})
+        self.assertEqual(ArchivedVisitSummary.objects.get().prescription, "Lek archiwalny")
+        self.assertEqual(live_counts(), counts)
+        self.assertEqual(reconcile(), 0)
+
+    def test_patient_history_merges_hot_and_archived_visits(self):
+        self._archive()
+        self.client.force_login(self.patient.user)
+        panel = str(self.client.get(reverse('patient_dashboard')).context["past_appointments_panel"])
+        self.assertLess(panel.index("Lek bieżący"), panel.index("Lek archiwalny"))
+
+
+class AppointmentExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = create_doctor()
+        patient = create_patient()
+        cls.month = (timezone.localdate().replace(day=1) + timedelta(days=40)).replace(day=1)
+        cls.inside = [
+            create_appointment(patient, doctor, cls.month + timedelta(days=1), time(10, 0)),
+            create_appointment(patient, doctor, cls.month, time(12, 0), notes="Pierwsza; wizyta"),
+        ]
+        create_appointment(patient, doctor, cls.month - timedelta(days=1), time(10, 0))
+        cls.admin = create_admin()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _export(self, **params):
+        return self.client.get(reverse('export_appointments'), {"month": self.month.strftime("%Y-%m"), **params})
+
+    def test_csv_streams_month_in_date_order(self):
+        response = self._export()
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeffID;Data;Godzina'))
+        rows = list(csv.reader(StringIO(content.lstrip('\ufeff')), delimiter=';'))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.inside[1].id, self.inside[0].id])
+        self.assertEqual(rows[1][4:7], ["Anna Nowak", self.inside[1].patient.pesel, "Jan Kowalski"])
+        self.assertEqual(rows[1][-1], "Pierwsza; wizyta")
+
+    def test_xlsx_has_header_and_rows(self):
+        response = self._export(format='xlsx')
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True)["Wizyty"]
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][:3], ("ID", "Data", "Godzina"))
+        self.assertEqual([row[0] for row in rows[1:]], [self.inside[1].id, self.inside[0].id])
+
+    def test_only_admin_can_export_and_bad_month_is_rejected(self):
+        self.assertEqual(self._export(month="2025-13").status_code, 400)
+        self.client.force_login(create_patient("inny").user)
+        self.assertEqual(self._export().status_code, 302)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctors = [create_doctor(), create_doctor("lekarz2")]
+        patients = [create_patient(f"pacjent{i}") for i in range(5)]
+        day = timezone.localdate() + timedelta(days=2)
+        # Wizyty o tej samej dacie i godzinie rozstrzyga dopiero id.
+        for i, (days, t) in enumerate([(1, time(9, 0)), (0, time(10, 0)), (0, time(9, 0)), (1, time(9, 0)), (0, time(10, 0))]):
+            create_appointment(patients[i], doctors[i % 2], day + timedelta(days=days), t)
+        cls.admin = create_admin()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _walk(self, name, **params):
+        ids, cursor = [], None
+        while True:
+            data = self.client.get(reverse(name), {"format": "json", "limit": 2, **params, **({"cursor": cursor} if cursor else {})}).json()
+            ids += [row["id"] for row in data["results"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_date_time_id_order_without_gaps(self):
+        expected = list(Appointment.objects.order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(self._walk('admin_appointments'), expected)
+
+    def test_filters_apply_to_every_page(self):
+        Appointment.objects.filter(pk__in=Appointment.objects.order_by('id').values('id')[:2]).update(status='canceled')
+        expected = list(Appointment.objects.filter(status='scheduled').order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(self._walk('admin_appointments', status='scheduled'), expected)
+
+    def test_leave_requests_page_newest_first(self):
+        doctor = Doctor.objects.first()
+        today = timezone.localdate()
+        leaves = [
+            LeaveRequest.objects.create(doctor=doctor, leave_type='on_demand', start_date=today, end_date=today)
+            for _ in range(3)
+        ]
+        response = self.client.get(reverse('admin_leave_requests'), {"limit": 2})
+        cursor = response.json()["next_cursor"]
+        self.assertIsNotNone(cursor)
+        last = self.client.get(reverse('admin_leave_requests'), {"limit": 2, "cursor": cursor}).json()
+        self.assertIsNone(last["next_cursor"])
+        self.assertIn(f'/leave/{leaves[0].id}/', last["html"])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('admin_appointments'), {"cursor": "wczoraj|10:00"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate_data_builds_consistent_index_and_statistics(self):
+        call_command(
+            'generate_data', patients=30, doctors=3, specializations=2, appointment_types=2,
+            appointments=120, leaves=4, days=20, seed=1, stdout=StringIO(),
+        )
+        self.assertEqual(Patient.objects.count(), 30)
+        self.assertEqual(Appointment.objects.count(), 120)
+        self.assertEqual(LeaveRequest.objects.count(), 4)
+
+        expected = {}
+        for doctor_id, day, t in Appointment.objects.exclude(status='canceled').values_list('doctor_id', 'date', 'time'):
+            expected[(doctor_id, day)] = expected.get((doctor_id, day), 0) | occupied_mask(t, 30)
+        self.assertEqual(dict(((row.doctor_id, row.date), row.taken) for row in DoctorDaySlots.objects.all()), expected)
+        self.assertEqual(reconcile(), 0)
+
+    def test_generate_data_refuses_more_appointments_than_slots(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_data', patients=2, doctors=1, appointments=1000, days=1, stdout=StringIO())
+
+    def test_measure_counts_queries_of_the_slowest_run(self):
+        stats = measure(lambda: list(User.objects.all()), repeat=3)
+        self.assertEqual(stats["queries"], 1)
+        self.assertEqual(set(stats["wall_ms"]), {"min", "median", "p95", "max"})
+
+
+class SlotIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=60)
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.patients = [create_patient("pacjent1"), create_patient("pacjent2")]
+
+    def test_signals_keep_bitmap_in_step_with_appointments(self):
+        first = create_appointment(self.patients[0], self.doctor, self.day, time(10, 0), self.type)
+        second = create_appointment(self.patients[1], self.doctor, self.day, time(12, 0), self.type)
+        self.assertEqual(
+            taken_mask(self.doctor.id, self.day), occupied_mask(time(10, 0), 60) | occupied_mask(time(12, 0), 60),
+        )
+        first.status = 'canceled'
+        first.save()
+        self.assertEqual(taken_mask(self.doctor.id, self.day), occupied_mask(time(12, 0), 60))
+
+        next_day = self.day + timedelta(days=1)
+        second.date = next_day
+        second.save()
+        self.assertEqual(taken_mask(self.doctor.id, self.day), 0)
+        self.assertEqual(taken_mask(self.doctor.id, next_day), occupied_mask(time(12, 0), 60))
+        second.delete()
+        self.assertEqual(taken_mask(self.doctor.id, next_day), 0)
+
+    def test_time_choices_skip_slots_within_thirty_minutes(self):
+        appointment = create_appointment(self.patients[0], self.doctor, self.day, time(10, 0), self.type)
+        times = [t for t, _ in free_time_choices(self.doctor.id, self.day, duration=30)]
+        for t in ("09:30", "10:00", "10:30", "11:00"):
+            self.assertNotIn(t, times)
+        self.assertIn("09:00", times)
+        self.assertIn("11:30", times)
+        own = [t for t, _ in free_time_choices(self.doctor.id, self.day, exclude=appointment, duration=30)]
+        self.assertIn("10:00", own)
+
+
+class BookAppointmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.patients = [create_patient("pacjent1"), create_patient("pacjent2")]
+
+    def _appointment(self, patient, t, **kwargs):
+        kwargs.setdefault('type', self.type)
+        return Appointment(
+            patient=patient, doctor=self.doctor, specialization=self.doctor.specjalizacja,
+            date=self.day, time=t, **kwargs,
+        )
+
+    def test_neighbouring_slot_is_rejected_and_bitmap_claimed(self):
+        book_appointment(self._appointment(self.patients[0], time(10, 0)))
+        self.assertEqual(taken_mask(self.doctor.id, self.day), occupied_mask(time(10, 0), 30))
+        with self.assertRaisesMessage(ValidationError, "ma już wizytę w tym terminie"):
+            book_appointment(self._appointment(self.patients[1], time(10, 30)))
+        book_appointment(self._appointment(self.patients[1], time(11, 0)))
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_move_within_day_releases_previous_slots(self):
+        appointment = book_appointment(self._appointment(self.patients[0], time(10, 0)))
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.time = time(10, 30)
+        book_appointment(appointment)
+        self.assertEqual(taken_mask(self.doctor.id, self.day), occupied_mask(time(10, 30), 30))
+
+    def test_leave_blocks_booking_even_without_type_row(self):
+        LeaveRequest.objects.create(
+            doctor=self.doctor, leave_type='on_demand', start_date=self.day, end_date=self.day, status='approved',
+        )
+        for appointment in (self._appointment(self.patients[0], time(10, 0)),
+                            self._appointment(self.patients[0], time(10, 0), type_id=self.type.id + 1)):
+            with self.assertRaisesMessage(ValidationError, "przebywa w tym dniu na zatwierdzonym urlopie"):
+                book_appointment(appointment)
+        self.assertFalse(Appointment.objects.exists())
+        self.assertEqual(taken_mask(self.doctor.id, self.day), 0)
+
+
+class PanelCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.patient = create_patient()
+        self.appointment = create_appointment(
+            self.patient, self.doctor, timezone.localdate() + timedelta(days=3), time(10, 0),
+        )
+        self.client.force_login(self.patient.user)
+
+    def _panel(self):
+        return str(self.client.get(reverse('patient_dashboard')).context["appointments_panel"])
+
+    def test_panel_is_served_from_cache_until_appointment_changes(self):
+        self.assertIn("Kowalski", self._panel())
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='canceled')
+        self.assertIn("Kowalski", self._panel())
+        self.appointment.status = 'canceled'
+        self.appointment.save()
+        self.assertNotIn("Kowalski", self._panel())
+
+    def test_renames_invalidate_cached_panels(self):
+        self._panel()
+        self.doctor.nazwisko = "Zieliński"
+        self.doctor.save()
+        self.doctor.specjalizacja.name = "Kardiolog"
+        self.doctor.specjalizacja.save()
+        self.appointment.type.name = "Kontrola"
+        self.appointment.type.save()
+        panel = self._panel()
+        for name in ("Zieliński", "Kardiolog", "Kontrola"):
+            self.assertIn(name, panel)
+
+    def test_csrf_token_is_filled_in_per_request(self):
+        panel = self._panel()
+        self.assertNotIn(CSRF_PLACEHOLDER, panel)
+        self.assertIn('name="csrfmiddlewaretoken"', panel)
+
+
+class FreeSlotSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.doctor = create_doctor()
+        self.on_leave = create_doctor("urlop", self.doctor.specjalizacja)
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        create_appointment(create_patient(), self.doctor, self.day, time(8, 0), self.type)
+        LeaveRequest.objects.create(
+            doctor=self.on_leave, leave_type='on_demand', start_date=self.day, end_date=self.day, status='approved',
+        )
+        self.client.force_login(create_patient("szukajacy").user)
+
+    def _search(self, **params):
+        params = {"specialization": self.doctor.specjalizacja_id, "date_from": self.day.isoformat(), **params}
+        return self.client.get(reverse('get_free_slots'), params)
+
+    def test_skips_taken_neighbouring_slots_and_doctors_on_leave(self):
+        data = self._search(type=self.type.id, limit=3, date_to=self.day.isoformat()).json()
+        self.assertEqual(
+            [(slot["doctor_id"], slot["date"], slot["time"]) for slot in data["slots"]],
+            [(self.doctor.id, self.day.isoformat(), t) for t in ("09:00", "09:30", "10:00")],
+        )
+
+    def test_rejects_invalid_parameters(self):
+        self.assertEqual(self._search(specialization="x").status_code, 400)
+        self.assertEqual(self._search(type=self.type.id + 1).status_code, 400)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.patients = [create_patient("pacjent1"), create_patient("pacjent2")]
+
+    def _book(self, patient, t, barrier, results):
+        appointment = Appointment(
+            patient=patient, doctor=self.doctor, specialization=self.doctor.specjalizacja,
+            type=self.type, date=self.day, time=t,
+        )
+        barrier.wait()
+        try:
+            for _ in range(50):
+                try:
+                    book_appointment(appointment)
+                except OperationalError:
+                    # Testowa baza SQLite w pamięci nie czeka na blokadę, tylko od razu zgłasza błąd.
+                    appointment.pk = None
+                    continue
+                results.append(True)
+                return
+        except ValidationError:
+            results.append(False)
+        finally:
+            connection.close()
+
+    def test_adjacent_slots_booked_concurrently_yield_one_appointment(self):
+        barrier, results = threading.Barrier(2), []
+        threads = [
+            threading.Thread(target=self._book, args=(patient, t, barrier, results))
+            for patient, t in zip(self.patients, (time(10, 0), time(10, 30)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False, True])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+@override_settings(QUERY_PROFILING=True, QUERY_BUDGET_ACTION='raise')
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_profiles()
+        install_query_recorder(connection)
+        self.doctor = create_doctor()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=60)
+        self.patient = create_patient()
+
+    async def test_free_slots_fit_budget_with_cold_cache(self):
+        # Klient tworzony po włączeniu ustawienia, żeby middleware pomiaru było aktywne.
+        client = AsyncClient()
+        await client.aforce_login(self.patient.user)
+        params = {"specialization": self.doctor.specjalizacja_id, "type": self.type.id}
+        for _ in range(2):
+            response = await client.get(reverse('get_free_slots'), params)
+            self.assertEqual(response.status_code, 200)
+        report = {row["view"]: row for row in await sync_to_async(profile_report)()}
+        self.assertEqual(report["get_free_slots"]["count"], 2)
+        self.assertEqual(report["get_free_slots"]["over_budget"], 0)
+
+
+class LeaveApprovalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.doctor = create_doctor("urlop")
+        self.substitutes = [create_doctor(f"zastepca{i}", self.doctor.specjalizacja) for i in range(2)]
+        self.patient = create_patient()
+        self.appointment = create_appointment(self.patient, self.doctor, self.day, time(10, 0))
+        self.leave = LeaveRequest.objects.create(
+            doctor=self.doctor, leave_type='on_demand', start_date=self.day, end_date=self.day,
+        )
+
+    def _approve(self):
+        return self.client.post(reverse('approve_leave', args=[self.leave.id]))
+
+    def test_only_admin_can_decide_and_only_by_post(self):
+        self.client.force_login(self.patient.user)
+        for name in ('approve_leave', 'reject_leave'):
+            self.client.get(reverse(name, args=[self.leave.id]))
+            self.client.post(reverse(name, args=[self.leave.id]))
+        self.leave.refresh_from_db()
+        self.appointment.refresh_from_db()
+        self.assertEqual((self.leave.status, self.appointment.doctor_id), ('pending', self.doctor.id))
+
+        self.client.force_login(create_admin())
+        self.assertEqual(self.client.get(reverse('approve_leave', args=[self.leave.id])).status_code, 405)
+        self.assertContains(self.client.get(reverse('admin_dashboard')), reverse('approve_leave', args=[self.leave.id]))
+
+    def test_approval_moves_appointment_and_updates_bitmaps(self):
+        self.client.force_login(create_admin())
+        self._approve()
+        self.leave.refresh_from_db()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.leave.status, 'approved')
+        self.assertIn(self.appointment.doctor_id, [d.id for d in self.substitutes])
+        self.assertEqual(taken_mask(self.doctor.id, self.day), 0)
+        self.assertEqual(taken_mask(self.appointment.doctor_id, self.day), occupied_mask(time(10, 0)))
+        self.assertTrue(OutboxEmail.objects.filter(recipient=self.patient.user.email).exists())
+
+    def test_slot_taken_concurrently_falls_back_to_next_substitute(self):
+        first, second = self.substitutes
+        create_appointment(create_patient("inny"), second, self.day, time(14, 0))
+        load_indexes = leave_indexes
+
+        def booking_in_between(doctor_ids):
+            # Rezerwacja u najmniej obciążonego zastępcy po odczycie bitmap, a przed przeniesieniem.
+            book_appointment(Appointment(
+                patient=create_patient("rownolegly"), doctor=first, specialization=first.specjalizacja,
+                type=self.appointment.type, date=self.day, time=time(10, 30),
+            ))
+            return load_indexes(doctor_ids)
+
+        self.client.force_login(create_admin())
+        with mock.patch('accounts.leaves.leave_indexes', booking_in_between):
+            self._approve()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.doctor_id, second.id)
+        self.assertEqual(Appointment.objects.filter(doctor=first, date=self.day).count(), 1)
+
+
+class WorkingHoursTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.long_type = AppointmentType.objects.create(name="Zabieg", duration_minutes=60)
+        WorkingHours.objects.create(doctor=self.doctor, weekday=0, start=time(9, 0), end=time(12, 0))
+
+    def _times(self, day, duration=30):
+        return [t for t, _ in free_time_choices(self.doctor.id, day, duration=duration)]
+
+    def test_choices_fit_inside_working_hours(self):
+        self.assertEqual(self._times(self.monday), ["09:00", "09:30", "10:00", "10:30", "11:00", "11:30"])
+        self.assertEqual(self._times(self.monday, duration=60)[-1], "11:00")
+        self.assertEqual(self._times(self.monday + timedelta(days=1)), [])
+
+    def test_new_hours_reach_cached_template(self):
+        self._times(self.monday)
+        WorkingHours.objects.create(doctor=self.doctor, weekday=0, start=time(15, 0), end=time(16, 0))
+        self.assertEqual(self._times(self.monday)[-2:], ["15:00", "15:30"])
+
+    def test_appointment_outside_hours_is_rejected(self):
+        appointment = Appointment(
+            patient=create_patient(), doctor=self.doctor, specialization=self.doctor.specjalizacja,
+            type=self.long_type, date=self.monday, time=time(11, 30),
+        )
+        with self.assertRaisesMessage(ValidationError, "nie przyjmuje w tym terminie"):
+            appointment.clean()
+        with self.assertRaises(ValidationError):
+            WorkingHours(doctor=self.doctor, weekday=1, start=time(12, 0), end=time(9, 0)).clean()
+
+
+class AppointmentTypeDurationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = create_doctor()
+        self.type = AppointmentType.objects.create(name="Konsultacja", duration_minutes=30)
+        self.other = AppointmentType.objects.create(name="Kontrola", duration_minutes=30)
+        self.patient = create_patient()
+        self.future = timezone.localdate() + timedelta(days=3)
+        self.past = timezone.localdate() - timedelta(days=3)
+        create_appointment(self.patient, self.doctor, self.future, time(10, 0), type=self.type)
+        create_appointment(self.patient, self.doctor, self.past, time(10, 0), type=self.type)
+        create_appointment(self.patient, self.doctor, self.future + timedelta(days=1), time(10, 0), type=self.other)
+
+    def test_duration_change_refreshes_only_future_days_of_the_type(self):
+        untouched = DoctorDaySlots.objects.get(doctor=self.doctor, date=self.future + timedelta(days=1))
+        self.type.duration_minutes = 60
+        self.type.save()
+        self.assertEqual(taken_mask(self.doctor.id, self.future), occupied_mask(time(10, 0), 60))
+        self.assertEqual(taken_mask(self.doctor.id, self.past), occupied_mask(time(10, 0), 30))
+        # Pozostałe wiersze nie są usuwane i tworzone od nowa.
+        self.assertTrue(DoctorDaySlots.objects.filter(pk=untouched.pk).exists())
+
+    def test_rebuild_command_recomputes_every_day(self):
+        AppointmentType.objects.filter(pk=self.type.pk).update(duration_minutes=60)
+        call_command('rebuild_slot_index', stdout=StringIO())
+        for day in (self.past, self.future):
+            self.assertEqual(taken_mask(self.doctor.id, day), occupied_mask(time(10, 0), 60))
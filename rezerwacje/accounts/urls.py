@@ -2,7 +2,9 @@ from django.urls import path
 from .views import (
     UserLoginView, UserLogoutView,
     UserRegisterView, DoctorRegisterView,
-    dashboard, approve_leave, reject_leave, patient_dashboard, doctor_dashboard, admin_dashboard, get_doctors, cancel_appointment, add_visit_summary, admin_delete_appointment, admin_edit_appointment
+    dashboard, approve_leave, reject_leave, patient_dashboard, doctor_dashboard, admin_dashboard, get_doctors, get_free_slots, cancel_appointment, add_visit_summary, admin_delete_appointment, admin_edit_appointment,
+    admin_appointments, admin_leave_requests, export_appointments, occupancy_stats, profiling_report, calendar_view,
+    leave_document, leave_thumbnail, patient_search, join_waitlist, leave_waitlist, accept_waitlist_offer, slot_stream,
 )
 
 urlpatterns = [
@@ -15,13 +17,27 @@ urlpatterns = [
     path("dashboard/patient/", patient_dashboard, name="patient_dashboard"),
     path("dashboard/doctor/", doctor_dashboard, name="doctor_dashboard"),
     path("dashboard/admin/", admin_dashboard, name="admin_dashboard"),
+    path("dashboard/admin/appointments/", admin_appointments, name="admin_appointments"),
+    path("dashboard/admin/leave_requests/", admin_leave_requests, name="admin_leave_requests"),
+    path("dashboard/admin/export/", export_appointments, name="export_appointments"),
+    path("dashboard/admin/stats/", occupancy_stats, name="occupancy_stats"),
+    path("dashboard/admin/profiling/", profiling_report, name="profiling_report"),
 
     path("get_doctors/", get_doctors, name="get_doctors"),
+    path("get_free_slots/", get_free_slots, name="get_free_slots"),
+    path("patients/search/", patient_search, name="patient_search"),
+    path("slots/stream/", slot_stream, name="slot_stream"),
+    path("calendar/", calendar_view, name="doctor_calendar"),
     path('appointment/<int:appointment_id>/cancel/', cancel_appointment, name='cancel_appointment'),
+    path("waitlist/join/", join_waitlist, name="join_waitlist"),
+    path("waitlist/<int:entry_id>/leave/", leave_waitlist, name="leave_waitlist"),
+    path("waitlist/<int:entry_id>/accept/", accept_waitlist_offer, name="accept_waitlist_offer"),
     path('appointment/<int:appointment_id>/summary/', add_visit_summary, name='add_visit_summary'),
     path('appointments/<int:appointment_id>/edit/', admin_edit_appointment, name='admin_edit_appointment'),
     path('appointments/<int:appointment_id>/delete/', admin_delete_appointment, name='admin_delete_appointment'),
     path("leave/<int:leave_id>/approve/", approve_leave, name="approve_leave"),
     path("leave/<int:leave_id>/reject/", reject_leave, name="reject_leave"),
+    path("leave/<int:leave_id>/document/", leave_document, name="leave_document"),
+    path("leave/<int:leave_id>/thumbnail/", leave_thumbnail, name="leave_thumbnail"),
 ]
 
@@ -2,14 +2,51 @@ from django.contrib.auth.views import LoginView, LogoutView
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .forms import PatientRegisterForm, LeaveRequestForm, DoctorRegisterForm, AppointmentAdminForm, AppointmentPatientForm, VisitSummaryForm
+from .forms import PatientRegisterForm, LeaveRequestForm, DoctorRegisterForm, AppointmentAdminForm, AppointmentPatientForm, VisitSummaryForm, WaitlistForm
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Doctor, Appointment, LeaveRequest
-from django.http import JsonResponse
+from .models import Doctor, Appointment, AppointmentType, ArchivedAppointment, LeaveRequest, Patient, Specialization, WaitlistEntry
+from .archive import patient_history
+from .pagination import akeyset_page, keyset_page
+from .services import OWN_SLOT_TAKEN, book_appointment, reassign_leave_appointments
+from .caching import get_version, version_datetime
+from .stats import occupancy_summary
+from .profiling import profile_report, reset_profiles
+from .documents import can_view_document, serve_file
+from .database import use_replica
+from .panels import (
+    CSRF_PLACEHOLDER, LEAVE_REQUESTS_VERSION, MODIFY_WINDOW, acached_panels, cached_panels,
+    doctor_panel_version, patient_panel_version, upcoming_expiry,
+)
+from django.conf import settings
+from .notifications import (
+    notify_appointment_booked, notify_appointment_canceled, notify_doctor_changed,
+    notify_leave_decision, notify_visit_summary,
+)
+from .schedule import MAX_CALENDAR_DOCTORS, calendar_range, calendar_versions, doctor_calendar, doctor_version_name
+import hashlib
+import asyncio
+from asgiref.sync import sync_to_async
+from .exports import csv_chunks, export_queryset, export_rows, month_range, write_xlsx
+import tempfile
+from django.core.cache import cache
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.core.exceptions import ValidationError
+from .availability import SLOT_MINUTES, as_date, next_free_slots
+from .slot_templates import type_durations
+from .search import search_patients
+from .waitlist import accept_offer, offer_deadline
+from .live import KEEPALIVE_SECONDS, RETRY_MS, STREAM_SECONDS, day_key, free_times, get_broker, own_mask, sse
+from .availability import taken_mask
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db.models import Q
+from django.db import transaction
+from django.contrib import messages
 
 class UserLoginView(LoginView):
     template_name="accounts/login.html"
@@ -38,76 +75,154 @@ def dashboard(request):
     else:
         return redirect('login')
         
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+def _book_for_patient(data, patient):
+    """Formularz czyta bazę już w __init__ (wolne godziny), więc cała rezerwacja idzie w jednym wątku."""
+    form = AppointmentPatientForm(data)
+    if form.is_valid():
+        appointment = form.save(commit=False)
+        appointment.patient = patient
+        try:
+            with transaction.atomic():
+                book_appointment(appointment, patient_message=OWN_SLOT_TAKEN)
+                notify_appointment_booked(appointment)
+            return form, True
+        except ValidationError as e:
+            form.add_error(None, e)
+    return form, False
+
+async def _patient_appointments_panel(patient, now):
+    appointments = await _alist(Appointment.objects.filter(
+        patient=patient,
+        status='scheduled'
+    ).filter(
+        (Q(date=now.date(), time__gte=now.time()) |
+         Q(date__gt=now.date()))
+    ).select_related('doctor', 'specialization','type').order_by('date','time'))
+    html = render_to_string("dashboards/partials/patient_appointments.html", {"appointments": appointments, "csrf_token": CSRF_PLACEHOLDER})
+    # Lista zmienia się, gdy wizyta się zaczyna albo traci możliwość odwołania (24 h przed).
+    return html, upcoming_expiry(appointments, now, MODIFY_WINDOW)
+
+async def _patient_past_appointments_panel(patient):
+    # Historia czyta wizyty bieżące i archiwalne (zob. accounts.archive).
+    hot, archived = await asyncio.gather(*(
+        _alist(model.objects.filter(
+            patient=patient,
+            status='completed',
+            summary__isnull=False
+        ).select_related('doctor','specialization','type','summary').order_by('-date','-time'))
+        for model in (Appointment, ArchivedAppointment)
+    ))
+    return render_to_string("dashboards/partials/patient_past_appointments.html", {"past_appointments": patient_history(hot, archived)}), None
+
+async def _patient_waitlist_panel(patient, now):
+    entries = await _alist(WaitlistEntry.objects.filter(
+        patient=patient,
+        status__in=['waiting', 'offered'],
+        date_to__gte=now.date(),
+    ).select_related('doctor', 'specialization', 'type', 'offered_doctor').order_by('date_from', 'id'))
+    for entry in entries:
+        entry.offer_until = offer_deadline(entry) if entry.status == 'offered' else None
+    html = render_to_string("dashboards/partials/patient_waitlist.html", {"entries": entries, "csrf_token": CSRF_PLACEHOLDER})
+    # Wpis znika z listy o północy po ostatnim dniu okna, a propozycja – gdy wygaśnie.
+    ends = [
+        timezone.make_aware(datetime.combine(entry.date_to + timedelta(days=1), datetime.min.time()))
+        for entry in entries
+    ] + [entry.offer_until for entry in entries if entry.offer_until]
+    return html, min(ends) if ends else None
+
+@use_replica
 @login_required
-def patient_dashboard(request):
+async def patient_dashboard(request):
+    user = await request.auser()
+    patient = await Patient.objects.select_related('user').aget(user=user)
     now=timezone.localtime()
-    today=now.date()
-    current_time=now.time()
     if request.method == "POST":
-         form = AppointmentPatientForm(request.POST)
-         if form.is_valid():
-             appointment = form.save(commit=False)
-             appointment.patient = request.user.patient_profile
-             appointment.save()
+         form, booked = await sync_to_async(_book_for_patient)(request.POST, patient)
+         if booked:
              return redirect('patient_dashboard')
     else:
         form = AppointmentPatientForm()
 
-    upcoming_appointments = Appointment.objects.filter(
-        patient=request.user.patient_profile,
+    version = patient_panel_version(patient.id)
+    panels = await acached_panels(request, {
+        "appointments_panel": (version, lambda: _patient_appointments_panel(patient, now)),
+        "past_appointments_panel": (version, lambda: _patient_past_appointments_panel(patient)),
+        "waitlist_panel": (version, lambda: _patient_waitlist_panel(patient, now)),
+    })
+    # Formularze z listami wyboru (specjalizacje, typy) czytają bazę przy renderowaniu.
+    return await sync_to_async(render)(request, "dashboards/patient.html", {
+        "user": user, "form": form, "waitlist_form": WaitlistForm(), **panels,
+    })
+
+async def _doctor_appointments_panel(doctor, now):
+    appointments = await _alist(Appointment.objects.filter(
+        doctor=doctor,
         status='scheduled'
     ).filter(
-        (Q(date=today, time__gte=current_time) |
-         Q(date__gt=today))
-    ).select_related('doctor', 'specialization','type').order_by('date','time')
+        (Q(date=now.date(), time__gte=now.time()) |
+         Q(date__gt=now.date()))
+    ).select_related('patient','specialization','type').order_by('date','time'))
+    html = render_to_string("dashboards/partials/doctor_appointments.html", {"appointments": appointments})
+    return html, upcoming_expiry(appointments, now)
 
-    past_appointments=Appointment.objects.filter(
-        patient=request.user.patient_profile,
-        status='completed',
-        summary__isnull=False
-    ).select_related('doctor','specialization','type','summary').order_by('-date','-time')
-
-    return render(request, "dashboards/patient.html",{"form":form, "appointments":upcoming_appointments,"past_appointments":past_appointments})
+async def _doctor_leave_requests_panel(doctor):
+    leave_requests = await _alist(LeaveRequest.objects.filter(doctor=doctor).order_by('-created_at'))
+    return render_to_string("dashboards/partials/doctor_leave_requests.html", {"leave_requests": leave_requests}), None
 
+@use_replica
 @login_required
-def doctor_dashboard(request):
-    if request.user.account_type != 'doctor':
+async def doctor_dashboard(request):
+    user = await request.auser()
+    if user.account_type != 'doctor':
         return redirect('dashboard')
     now=timezone.localtime()
-    today=now.date()
-    current_time=now.time()
-    doctor=request.user.doctor_profile
-    doctor_appointments = Appointment.objects.filter(
-        doctor=request.user.doctor_profile,
-        status='scheduled'
-    ).filter(
-        (Q(date=today, time__gte=current_time) |
-         Q(date__gt=today))
-    ).select_related('patient','specialization','type').order_by('date','time')
+    doctor = await Doctor.objects.aget(user=user)
 
     if request.method == "POST" and "leave_type" in request.POST:
         leave_form = LeaveRequestForm(request.POST, request.FILES)
-        if leave_form.is_valid():
+        if await sync_to_async(leave_form.is_valid)():
             leave_request = leave_form.save(commit=False)
             leave_request.doctor = doctor
-            leave_request.save()
+            await leave_request.asave()
             return redirect('doctor_dashboard')
     else:
         leave_form = LeaveRequestForm()
 
-    leave_requests=LeaveRequest.objects.filter(doctor=doctor).order_by('-created_at')
-
+    version = doctor_panel_version(doctor.id)
+    panels = await acached_panels(request, {
+        "appointments_panel": (version, lambda: _doctor_appointments_panel(doctor, now)),
+        "leave_requests_panel": (version, lambda: _doctor_leave_requests_panel(doctor)),
+    })
 
     return render(request, "dashboards/doctor.html",
                   {
+        "user":user,
         "leave_form":leave_form,
-        "leave_requests":leave_requests,
-        "appointments":doctor_appointments,
+        **panels,
                   })
 
     
     
 
+ADMIN_PAGE_SIZE = 50
+ADMIN_PAGE_MAX_SIZE = 200
+APPOINTMENTS_ORDERING = ('date', 'time', 'id')
+LEAVE_REQUESTS_ORDERING = ('-created_at', '-id')
+
+def _admin_leave_requests_panel():
+    leave_requests, leave_requests_cursor = keyset_page(
+        LeaveRequest.objects.select_related('doctor'), LEAVE_REQUESTS_ORDERING, limit=ADMIN_PAGE_SIZE
+    )
+    return render_to_string("dashboards/partials/admin_leave_requests.html", {
+        "leave_requests": leave_requests,
+        "leave_requests_cursor": leave_requests_cursor,
+        "csrf_token": CSRF_PLACEHOLDER,
+    }), None
+
+@use_replica
 @login_required
 def admin_dashboard(request):
     selected_type = request.POST.get("account_type") if request.method == "POST" else None
@@ -125,14 +240,13 @@ def admin_dashboard(request):
     appointment_form = AppointmentAdminForm(request.POST or None)
     if request.method == "POST" and "create_appointment" in request.POST:
         if appointment_form.is_valid():
-            appointment_form.save()
-            return redirect("admin_dashboard")
+            try:
+                book_appointment(appointment_form.save(commit=False))
+                return redirect("admin_dashboard")
+            except ValidationError as e:
+                appointment_form.add_error(None, e)
 
-    all_appointments = Appointment.objects.select_related(
-        'patient', 'doctor', 'specialization', 'type'
-    ).order_by('date', 'time')
-
-    leave_requests = LeaveRequest.objects.select_related('doctor').order_by('-created_at')
+    panels = cached_panels(request, {"leave_requests_panel": (LEAVE_REQUESTS_VERSION, _admin_leave_requests_panel)})
 
     if not form and selected_type is None:
         form = PatientRegisterForm()
@@ -141,39 +255,418 @@ def admin_dashboard(request):
         "form": form,
         "selected_type": selected_type or "",
         "appointment_form": appointment_form,
-        "all_appointments": all_appointments,
-        "leave_requests": leave_requests,
+        **panels,
+        "status_choices": Appointment.STATUS_CHOICES,
+        "specializations": Specialization.objects.order_by('name'),
     })
 
+def is_admin(user):
+    return user.is_authenticated and user.account_type == 'admin'
+
+def _page_size(request):
+    try:
+        return max(1, min(int(request.GET.get('limit') or ADMIN_PAGE_SIZE), ADMIN_PAGE_MAX_SIZE))
+    except ValueError:
+        return ADMIN_PAGE_SIZE
+
+@use_replica
+@login_required
+@user_passes_test(is_admin)
+async def admin_appointments(request):
+    appointments = Appointment.objects.select_related('patient', 'doctor', 'specialization', 'type')
+    try:
+        if request.GET.get('status'):
+            appointments = appointments.filter(status=request.GET['status'])
+        if request.GET.get('doctor'):
+            appointments = appointments.filter(doctor_id=int(request.GET['doctor']))
+        if request.GET.get('specialization'):
+            appointments = appointments.filter(specialization_id=int(request.GET['specialization']))
+        if request.GET.get('date_from'):
+            appointments = appointments.filter(date__gte=as_date(request.GET['date_from']))
+        if request.GET.get('date_to'):
+            appointments = appointments.filter(date__lte=as_date(request.GET['date_to']))
+        page, next_cursor = await akeyset_page(
+            appointments, APPOINTMENTS_ORDERING, request.GET.get('cursor'), limit=_page_size(request)
+        )
+    except ValueError:
+        return JsonResponse({"error":"Niepoprawne parametry filtrowania."}, status=400)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            "results": [
+                {
+                    "id": a.id,
+                    "patient": f"{a.patient.imie} {a.patient.nazwisko}",
+                    "doctor": f"{a.doctor.imie} {a.doctor.nazwisko}" if a.doctor else None,
+                    "specialization": a.specialization.name,
+                    "type": a.type.name,
+                    "date": a.date.isoformat(),
+                    "time": a.time.strftime("%H:%M"),
+                    "status": a.status,
+                }
+                for a in page
+            ],
+            "next_cursor": next_cursor,
+        })
+    html = render_to_string("dashboards/partials/appointment_rows.html", {"appointments": page}, request=request)
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+@use_replica
+@login_required
+@user_passes_test(is_admin)
+async def admin_leave_requests(request):
+    try:
+        page, next_cursor = await akeyset_page(
+            LeaveRequest.objects.select_related('doctor'),
+            LEAVE_REQUESTS_ORDERING,
+            request.GET.get('cursor'),
+            limit=_page_size(request),
+        )
+    except ValueError:
+        return JsonResponse({"error":"Niepoprawny kursor."}, status=400)
+    html = render_to_string("dashboards/partials/leave_request_rows.html", {"leave_requests": page}, request=request)
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
+async def _calendar_params(request, user):
+    try:
+        date_from, date_to = calendar_range(request.GET.get('start') or timezone.localdate(), request.GET.get('view', 'week'))
+        if user.account_type == 'doctor':
+            doctor_ids = [await Doctor.objects.filter(user=user).values_list('id', flat=True).aget()]
+        elif request.GET.get('doctors'):
+            doctor_ids = sorted({int(x) for x in request.GET['doctors'].split(',') if x})
+        else:
+            specialization = request.GET.get('specialization')
+            doctor_ids = [doc["id"] for doc in await _doctors_data(int(specialization) if specialization else None)]
+    except ValueError:
+        return None
+    return (doctor_ids[:MAX_CALENDAR_DOCTORS], date_from, date_to)
+
+def _calendar_etag(request):
+    params = request._calendar_params
+    if params is None:
+        return None
+    doctor_ids, date_from, date_to = params
+    versions = calendar_versions(doctor_ids)
+    state = ",".join(f"{doctor_id}:{versions[doctor_version_name(doctor_id)]}" for doctor_id in doctor_ids)
+    return "calendar-" + hashlib.sha1(f"{state}|{date_from}|{date_to}".encode()).hexdigest()
+
+def _calendar_last_modified(request):
+    params = request._calendar_params
+    if not params or not params[0]:
+        return None
+    return version_datetime(max(calendar_versions(params[0]).values()))
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_calendar_etag, last_modified_func=_calendar_last_modified)
+async def _calendar_response(request):
+    if request._calendar_params is None:
+        return JsonResponse({"error":"Niepoprawne parametry grafiku."}, status=400)
+    return JsonResponse(await sync_to_async(doctor_calendar)(*request._calendar_params))
+
+@use_replica
+@login_required
+async def calendar_view(request):
+    user = await request.auser()
+    if user.account_type not in ('admin', 'doctor'):
+        return JsonResponse({"error":"Brak dostępu do grafiku."}, status=403)
+    # ETag i Last-Modified liczone są synchronicznie, więc parametry (z zapytaniami) ustalamy wcześniej.
+    request._calendar_params = await _calendar_params(request, user)
+    return await _calendar_response(request)
+
+STATS_MAX_DAYS = 366
+
+@use_replica
+@login_required
+@user_passes_test(is_admin)
+async def occupancy_stats(request):
+    today = timezone.localdate()
+    try:
+        date_from = as_date(request.GET.get('date_from') or today - timedelta(days=30))
+        date_to = as_date(request.GET.get('date_to') or today + timedelta(days=30))
+    except ValueError:
+        return JsonResponse({"error":"Niepoprawny zakres dat."}, status=400)
+    date_to = min(date_to, date_from + timedelta(days=STATS_MAX_DAYS))
+    return JsonResponse(await sync_to_async(occupancy_summary)(date_from, date_to))
+
+@login_required
+@user_passes_test(is_admin)
+def profiling_report(request):
+    if request.method == "POST":
+        reset_profiles()
+        return JsonResponse({"views": []})
+    return JsonResponse({"enabled": settings.QUERY_PROFILING, "views": profile_report()})
+
+@login_required
+@user_passes_test(is_admin)
+def export_appointments(request):
+    try:
+        if request.GET.get('date_from') or request.GET.get('date_to'):
+            date_from = as_date(request.GET.get('date_from') or request.GET.get('date_to'))
+            date_to = as_date(request.GET.get('date_to') or request.GET.get('date_from'))
+        else:
+            date_from, date_to = month_range(request.GET.get('month') or timezone.localdate().strftime("%Y-%m"))
+        doctor_id = int(request.GET['doctor']) if request.GET.get('doctor') else None
+        specialization_id = int(request.GET['specialization']) if request.GET.get('specialization') else None
+    except ValueError:
+        return JsonResponse({"error":"Niepoprawne parametry eksportu."}, status=400)
+
+    rows = export_rows(export_queryset(date_from, date_to, doctor_id, specialization_id))
+    filename = f"wizyty_{date_from}_{date_to}"
+
+    if request.GET.get('format') == 'xlsx':
+        output = tempfile.TemporaryFile()
+        try:
+            write_xlsx(rows, output)
+        except RuntimeError as e:
+            output.close()
+            return JsonResponse({"error":str(e)}, status=501)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"{filename}.xlsx",
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    response = StreamingHttpResponse(csv_chunks(rows), content_type="text/csv; charset=utf-8")
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
 
 @login_required
+@user_passes_test(is_admin)
+@require_POST
 def approve_leave(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id)
-    leave.status = "approved"
-    leave.save()
+    with transaction.atomic():
+        leave.status = "approved"
+        leave.save()
+        moved, unplaced = reassign_leave_appointments(leave)
+        notify_leave_decision(leave)
+        for appointment, _ in moved:
+            notify_doctor_changed(appointment)
+
+    if moved:
+        messages.success(request, f"Przeniesiono wizyty na lekarzy zastępujących: {len(moved)}.")
+    if unplaced:
+        messages.warning(
+            request,
+            "Nie znaleziono zastępstwa dla wizyt: " + ", ".join(
+                f"{a.date} {a.time:%H:%M} ({a.patient.imie} {a.patient.nazwisko})" for a in unplaced
+            ),
+        )
     return redirect("admin_dashboard")
 
 @login_required
+@user_passes_test(is_admin)
+@require_POST
 def reject_leave(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id)
-    leave.status="rejected"
-    leave.save()
+    with transaction.atomic():
+        leave.status="rejected"
+        leave.save()
+        notify_leave_decision(leave)
     return redirect("admin_dashboard")
 
+def _leave_file(request, leave_id, field_name):
+    leave = get_object_or_404(LeaveRequest.objects.select_related('doctor'), id=leave_id)
+    if not can_view_document(request.user, leave):
+        return HttpResponseForbidden("Brak dostępu do załącznika.")
+    field = getattr(leave, field_name)
+    if not field:
+        raise Http404("Wniosek nie ma załącznika.")
+    return serve_file(request, field)
+
+@login_required
+def leave_document(request, leave_id):
+    return _leave_file(request, leave_id, 'document')
+
+@login_required
+def leave_thumbnail(request, leave_id):
+    return _leave_file(request, leave_id, 'thumbnail')
+
+DOCTORS_CACHE_TIMEOUT = 24 * 60 * 60
+
+def _doctors_key(request):
+    """'all', numer specjalizacji albo None bez parametru; ValueError dla niepoprawnej wartości."""
+    if request.GET.get('all'):
+        return 'all'
+    specialization = request.GET.get('specialization')
+    return int(specialization) if specialization else None
+
+def _doctors_etag(request):
+    try:
+        key = _doctors_key(request)
+    except ValueError:
+        return None
+    return f"doctors-{get_version('doctors')}-{key}"
+
+def _doctors_last_modified(request):
+    return version_datetime(get_version('doctors'))
+
+async def _doctors_payload(key):
+    doctors = Doctor.objects.order_by('nazwisko', 'imie', 'id')
+    if key == 'all':
+        data = {}
+        async for doc in doctors.values('id', 'imie', 'nazwisko', 'specjalizacja_id'):
+            data.setdefault(str(doc['specjalizacja_id']), []).append({"id":doc['id'], "name":f"{doc['imie']} {doc['nazwisko']}"})
+        return data
+    doctors = doctors.filter(specjalizacja_id=key)
+    return [{"id":doc['id'], "name":f"{doc['imie']} {doc['nazwisko']}"} async for doc in doctors.values('id', 'imie', 'nazwisko')]
+
+async def _doctors_data(key):
+    if key is None:
+        return []
+    cache_key = f"doctors:{get_version('doctors')}:{key}"
+    data = await cache.aget(cache_key)
+    if data is None:
+        data = await _doctors_payload(key)
+        await cache.aset(cache_key, data, DOCTORS_CACHE_TIMEOUT)
+    return data
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_doctors_etag, last_modified_func=_doctors_last_modified)
+async def get_doctors(request):
+    try:
+        key = _doctors_key(request)
+    except ValueError:
+        return JsonResponse({"error":"Niepoprawna specjalizacja."}, status=400)
+    return JsonResponse(await _doctors_data(key), safe=False)
+
+FREE_SLOTS_MAX_DAYS = 62
+FREE_SLOTS_MAX_LIMIT = 50
+
 @login_required
-def get_doctors(request):
-    specialization_id = request.GET.get('specialization')
-    doctors=Doctor.objects.filter(specjalizacja_id=specialization_id)
-    data=[{"id":doc.id, "name":f"{doc.imie} {doc.nazwisko}"} for doc in doctors]
-    return JsonResponse(data, safe=False)
+async def get_free_slots(request):
+    now = timezone.localtime()
+    try:
+        specialization_id = int(request.GET.get('specialization'))
+        date_from = max(as_date(request.GET.get('date_from') or now.date()), now.date())
+        date_to = as_date(request.GET.get('date_to') or date_from + timedelta(days=14))
+        limit = min(int(request.GET.get('limit') or 10), FREE_SLOTS_MAX_LIMIT)
+    except (TypeError, ValueError):
+        return JsonResponse({"error":"Niepoprawne parametry wyszukiwania."}, status=400)
+
+    date_to = min(date_to, date_from + timedelta(days=FREE_SLOTS_MAX_DAYS))
+    type_id = request.GET.get('type')
+    durations = await sync_to_async(type_durations)()
+    try:
+        duration = durations[int(type_id)] if type_id else SLOT_MINUTES
+    except (KeyError, ValueError):
+        return JsonResponse({"error":"Nie znaleziono typu wizyty."}, status=400)
+
+    slots = await sync_to_async(next_free_slots)(
+        specialization_id, date_from, date_to, limit=limit, now=now, duration=duration
+    )
+    return JsonResponse({"specialization": specialization_id, "type": type_id or None, "slots": slots})
+
+async def _slot_events(doctor_id, day, duration, own):
+    broker, key = get_broker(), day_key(doctor_id, day)
+    subscription = broker.subscribe(key)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_SECONDS
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        # Stan początkowy czytany już po zapisaniu się do brokera, więc żadna zmiana nie umknie.
+        taken = await sync_to_async(taken_mask)(doctor_id, day)
+        sent = await sync_to_async(free_times)(doctor_id, day, taken, duration, own)
+        yield sse("slots", {"free": sent})
+        while (remaining := deadline - loop.time()) > 0:
+            message = await subscription.next(min(KEEPALIVE_SECONDS, remaining))
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            free = await sync_to_async(free_times)(doctor_id, day, message["taken"], duration, own)
+            if free != sent:
+                yield sse("slots", {"free": free})
+                sent = free
+    finally:
+        broker.unsubscribe(key, subscription)
+
+@login_required
+async def slot_stream(request):
+    """
+    Strumień server-sent events z wolnymi godzinami lekarza w danym dniu dla
+    wybranego typu wizyty; nowa lista przychodzi po każdej zmianie grafiku dnia.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Pod WSGI strumień zająłby wątek serwera na cały czas trwania; 204 wyłącza ponowne łączenie.
+        return HttpResponse(status=204)
+    try:
+        doctor_id = int(request.GET.get('doctor'))
+        day = as_date(request.GET.get('date'))
+        type_id = int(request.GET.get('type') or 0)
+        exclude = int(request.GET.get('exclude') or 0)
+    except (TypeError, ValueError):
+        return JsonResponse({"error":"Niepoprawne parametry."}, status=400)
+
+    duration = (await sync_to_async(type_durations)()).get(type_id, SLOT_MINUTES)
+    appointment = None
+    if exclude and is_admin(await request.auser()):
+        appointment = await Appointment.objects.filter(pk=exclude).afirst()
+    own = await sync_to_async(own_mask)(appointment, doctor_id, day)
+    return StreamingHttpResponse(
+        _slot_events(doctor_id, day, duration, own),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@use_replica
+@login_required
+@user_passes_test(is_admin)
+async def patient_search(request):
+    results = await sync_to_async(search_patients)(request.GET.get('q', ''))
+    return JsonResponse({"results": results})
 
 @login_required
 def cancel_appointment(request, appointment_id):
     appointment = Appointment.objects.get(id=appointment_id, patient=request.user.patient_profile)
     if not appointment.can_modify():
         return JsonResponse({"error":"Nie możesz odwołać wizyty później niż 24 godziny przed jej terminem"}, status=400)
-    appointment.status="canceled"
-    appointment.save()
+    with transaction.atomic():
+        appointment.status="canceled"
+        appointment.save()
+        notify_appointment_canceled(appointment)
+    return redirect("patient_dashboard")
+
+@login_required
+def join_waitlist(request):
+    if request.method != "POST":
+        return redirect("patient_dashboard")
+    form = WaitlistForm(request.POST, patient=request.user.patient_profile)
+    if form.is_valid():
+        entry = form.save(commit=False)
+        entry.patient = request.user.patient_profile
+        entry.save()
+        messages.success(request, "Zapisano na listę oczekujących. Powiadomimy Cię, gdy zwolni się pasujący termin.")
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+    return redirect("patient_dashboard")
+
+@login_required
+def leave_waitlist(request, entry_id):
+    entry = get_object_or_404(WaitlistEntry, id=entry_id, patient=request.user.patient_profile)
+    if request.method == "POST" and entry.status in ('waiting', 'offered'):
+        entry.status = 'canceled'
+        entry.save(update_fields=['status'])
+    return redirect("patient_dashboard")
+
+@login_required
+def accept_waitlist_offer(request, entry_id):
+    entry = get_object_or_404(
+        WaitlistEntry.objects.select_related('patient', 'specialization', 'offered_doctor'),
+        id=entry_id, patient=request.user.patient_profile,
+    )
+    if request.method == "POST":
+        try:
+            accept_offer(entry)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            messages.success(request, "Zarezerwowano wizytę z listy oczekujących.")
     return redirect("patient_dashboard")
 
 @login_required
@@ -182,12 +675,14 @@ def add_visit_summary(request, appointment_id):
     if request.method=="POST":
         form=VisitSummaryForm(request.POST)
         if form.is_valid():
-            summary = form.save(commit=False)
-            summary.appointment = appointment
-            summary.save()
-            
-            appointment.status='completed'
-            appointment.save()
+            with transaction.atomic():
+                summary = form.save(commit=False)
+                summary.appointment = appointment
+                summary.save()
+
+                appointment.status='completed'
+                appointment.save()
+                notify_visit_summary(appointment)
             return redirect('doctor_dashboard')
     else:
         form=VisitSummaryForm()
@@ -203,8 +698,11 @@ def admin_edit_appointment(request, appointment_id):
     if request.method == "POST":
         form=AppointmentAdminForm(request.POST, instance=appointment)
         if form.is_valid():
-            form.save()
-            return redirect("admin_dashboard")
+            try:
+                book_appointment(form.save(commit=False))
+                return redirect("admin_dashboard")
+            except ValidationError as e:
+                form.add_error(None, e)
     else:
         form=AppointmentAdminForm(instance=appointment)
     return render(request, "dashboards/appointment_edit.html", {
@@ -0,0 +1,209 @@
+"""
+Lista oczekujących. Gdy wizyta zostaje odwołana, usunięta albo przeniesiona,
+zwolniony termin (po zatwierdzeniu transakcji) trafia do pierwszego pasującego
+pacjenta z listy: według priorytetu, a potem kolejności zapisu. Pacjent dostaje
+propozycję e-mailem albo – jeśli o to prosił – od razu zarezerwowaną wizytę.
+Propozycję przyjmuje w panelu pacjenta w ciągu WAITLIST_OFFER_HOURS godzin;
+potem wpis wraca do oczekujących (przy najbliższym dopasowaniu albo dobowym
+expire_waitlist). Warunki (specjalizacja, lekarz, okno dat, czas trwania typu
+wizyty, brak innej wizyty pacjenta w ciągu 30 minut) sprawdza jedno zapytanie czytające indeks
+waitlist_match po kolei, więc koszt nie rośnie z długością listy.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .availability import SLOT_MINUTES, free_mask, slot_index, taken_mask
+from .leaves import is_on_leave
+from .panels import bump_panels
+from .models import Appointment, Doctor, WaitlistEntry
+from .notifications import notify_waitlist_booked, notify_waitlist_offer
+from .services import OWN_SLOT_TAKEN, book_appointment
+from .slot_templates import open_slots, type_durations
+
+WAITLIST_CANDIDATES = 10
+WAITLIST_MAX_ENTRIES = 5
+WAITLIST_MAX_DAYS = 60
+WAITLIST_OFFER_HOURS = 12
+OFFER_EXPIRED = "Propozycja terminu wygasła."
+OFFER_SLOT_TAKEN = "Ten termin został już zajęty. Pozostajesz na liście oczekujących."
+
+
+def offer_deadline(entry):
+    return entry.matched_at + timedelta(hours=WAITLIST_OFFER_HOURS)
+
+
+def release_offers(now=None):
+    """Wpisy z nieprzyjętą w terminie (albo już nieaktualną) propozycją wracają do oczekujących."""
+    now = now or timezone.localtime()
+    stale = WaitlistEntry.objects.filter(status='offered').filter(
+        Q(matched_at__lte=now - timedelta(hours=WAITLIST_OFFER_HOURS)) | Q(offered_date__lt=now.date())
+    )
+    patient_ids = list(stale.values_list('patient_id', flat=True))
+    if not patient_ids:
+        return 0
+    released = stale.update(
+        status='waiting', matched_at=None, offered_doctor=None, offered_date=None, offered_time=None
+    )
+    bump_panels(patient_ids=patient_ids)
+    return released
+
+
+def expire_entries(today=None):
+    """Zwalnia przeterminowane propozycje i zamyka wpisy, których okno dat już minęło."""
+    today = today or timezone.localdate()
+    release_offers()
+    return WaitlistEntry.objects.filter(status='waiting', date_to__lt=today).update(status='expired')
+
+
+def _near(day, t):
+    """Przedział ±30 minut wokół ``t`` (reguła jak przy sprawdzaniu kolizji wizyt), przycięty do dnia."""
+    start = datetime.combine(day, t)
+    return (
+        max(start - timedelta(minutes=30), datetime.combine(day, time.min)).time(),
+        min(start + timedelta(minutes=30), datetime.combine(day, time.max)).time(),
+    )
+
+
+def patient_busy(patient_id, day, t):
+    """Nieodwołane wizyty pacjenta w ciągu 30 minut od ``t``."""
+    return Appointment.objects.filter(
+        patient_id=patient_id, date=day, time__range=_near(day, t)
+    ).exclude(status='canceled')
+
+
+def candidates(doctor, day, t, type_ids):
+    """Oczekujący, którym pasuje termin ``day`` ``t`` u lekarza ``doctor``, w kolejności dopasowania."""
+    busy = patient_busy(OuterRef('patient_id'), day, t)
+    return (
+        WaitlistEntry.objects.filter(
+            specialization_id=doctor.specjalizacja_id,
+            status='waiting',
+            date_from__lte=day,
+            date_to__gte=day,
+            type_id__in=type_ids,
+        )
+        .filter(Q(doctor__isnull=True) | Q(doctor_id=doctor.id))
+        .exclude(Exists(busy))
+        .order_by('-priority', 'created_at', 'id')
+    )
+
+
+def _fitting_types(doctor_id, day, t):
+    """Typy wizyt, które zmieszczą się od godziny ``t`` w wolnych slotach lekarza."""
+    index = slot_index(t)
+    if index is None:
+        return []
+    taken, hours = taken_mask(doctor_id, day), open_slots(doctor_id, day)
+    return [
+        type_id for type_id, duration in type_durations().items()
+        if free_mask(taken, duration or SLOT_MINUTES, hours) >> index & 1
+    ]
+
+
+def _book(entry, doctor, day, t, now):
+    appointment = Appointment(
+        patient=entry.patient, doctor=doctor, specialization=entry.specialization,
+        type_id=entry.type_id, date=day, time=t,
+    )
+    with transaction.atomic():
+        if not WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').update(
+            status='booked', matched_at=now
+        ):
+            return None
+        book_appointment(appointment, patient_message=OWN_SLOT_TAKEN)
+        WaitlistEntry.objects.filter(pk=entry.pk).update(appointment=appointment)
+        notify_waitlist_booked(appointment)
+    return appointment
+
+
+def _offer(entry, doctor, day, t, now):
+    with transaction.atomic():
+        if not WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').update(
+            status='offered', matched_at=now, offered_doctor=doctor, offered_date=day, offered_time=t
+        ):
+            return False
+        entry.matched_at = now
+        notify_waitlist_offer(entry, doctor, day, t, offer_deadline(entry))
+    bump_panels(patient_ids=[entry.patient_id])
+    return True
+
+
+def accept_offer(entry, now=None):
+    """
+    Rezerwuje pacjentowi zaproponowany termin. Gdy propozycja wygasła, pacjent
+    ma już wizytę o tej porze albo termin zajęto w międzyczasie, zgłasza
+    ValidationError; zajęty termin przywraca wpis do oczekujących.
+    """
+    now = now or timezone.localtime()
+    if (
+        entry.status != 'offered' or offer_deadline(entry) <= now or entry.offered_doctor_id is None
+        or timezone.make_aware(datetime.combine(entry.offered_date, entry.offered_time)) <= now
+    ):
+        raise ValidationError(OFFER_EXPIRED)
+    appointment = Appointment(
+        patient=entry.patient, doctor=entry.offered_doctor, specialization=entry.specialization,
+        type_id=entry.type_id, date=entry.offered_date, time=entry.offered_time,
+    )
+    with transaction.atomic():
+        if not WaitlistEntry.objects.filter(pk=entry.pk, status='offered', matched_at=entry.matched_at).update(
+            status='booked', matched_at=now
+        ):
+            raise ValidationError(OFFER_EXPIRED)
+        if patient_busy(entry.patient_id, appointment.date, appointment.time).exists():
+            raise ValidationError(OWN_SLOT_TAKEN)
+        try:
+            book_appointment(appointment, patient_message=OWN_SLOT_TAKEN)
+        except ValidationError as e:
+            if e.messages == [OWN_SLOT_TAKEN]:
+                raise
+            # Termin zajęty albo lekarz na urlopie: propozycja przepada, wpis czeka na kolejny termin.
+            WaitlistEntry.objects.filter(pk=entry.pk).update(
+                status='waiting', matched_at=None, offered_doctor=None, offered_date=None, offered_time=None
+            )
+            slot_taken = e
+        else:
+            WaitlistEntry.objects.filter(pk=entry.pk).update(appointment=appointment)
+            slot_taken = None
+    bump_panels(patient_ids=[entry.patient_id])
+    if slot_taken:
+        raise ValidationError(OFFER_SLOT_TAKEN) from slot_taken
+    return appointment
+
+
+def match_freed_slot(doctor_id, day, t, now=None):
+    """
+    Przydziela zwolniony termin pierwszemu pasującemu oczekującemu. Zwraca
+    dopasowany wpis (z ``appointment`` przy automatycznej rezerwacji) albo None.
+    """
+    now = now or timezone.localtime()
+    release_offers(now)
+    if not doctor_id or timezone.make_aware(datetime.combine(day, t)) <= now:
+        return None
+    doctor = Doctor.objects.filter(pk=doctor_id).select_related('specjalizacja').first()
+    if doctor is None or is_on_leave(doctor_id, day):
+        return None
+    type_ids = _fitting_types(doctor_id, day, t)
+    if not type_ids:
+        return None
+
+    for entry in candidates(doctor, day, t, type_ids).select_related('patient__user', 'specialization')[:WAITLIST_CANDIDATES]:
+        if entry.auto_book:
+            try:
+                entry.appointment = _book(entry, doctor, day, t, now)
+            except ValidationError:
+                # Termin zajął ktoś inny w międzyczasie albo pacjent ma już wizytę o tej porze.
+                continue
+            if entry.appointment:
+                return entry
+        elif _offer(entry, doctor, day, t, now):
+            return entry
+    return None
+
+
+def slot_freed(doctor_id, day, t):
+    """Wywoływane z sygnałów: dopasowanie po zatwierdzeniu transakcji zwalniającej termin."""
+    transaction.on_commit(lambda: match_freed_slot(doctor_id, day, t))
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +59,9 @@ ROOT_URLCONF = 'rezerwacje.urls'
 
 TEMPLATES = [
     {
+        # Przy QUERY_PROFILING zamieniany na wersję mierzącą czas renderowania.
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,6 +87,15 @@ DATABASES = {
     }
 }
 
+# Profil produkcyjny (REZERWACJE_SQLITE_PRODUCTION=1): WAL, dostrojone PRAGMA,
+# transakcje IMMEDIATE, trwałe połączenia i połączenie "replica" tylko do odczytu
+# dla widoków paneli i grafiku (accounts.database). Porównanie: komenda sqlite_benchmark.
+if os.environ.get('REZERWACJE_SQLITE_PRODUCTION', '0') == '1':
+    from accounts.database import production_databases
+    DATABASES = production_databases(os.environ.get('REZERWACJE_SQLITE_PATH', BASE_DIR / 'db.sqlite3'))
+
+DATABASE_ROUTERS = ['accounts.database.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,4 +159,67 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Pliki z MEDIA_ROOT nie są publiczne: załączniki wydaje widok leave_document po
+# sprawdzeniu uprawnień. SENDFILE_BACKEND = 'xsendfile' (Apache mod_xsendfile)
+# albo 'xaccel' (nginx, location internal pod SENDFILE_URL wskazująca na MEDIA_ROOT)
+# przekazuje wysyłkę serwerowi WWW; pusty – plik wysyła Django.
+SENDFILE_BACKEND = os.environ.get('REZERWACJE_SENDFILE_BACKEND', '')
+SENDFILE_URL = os.environ.get('REZERWACJE_SENDFILE_URL', '/protected-media/')
+
+# Przesyłane pliki zapisywane są na dysk kawałkami zamiast trzymania ich w pamięci.
+# Katalog tymczasowy na tym samym systemie plików co MEDIA_ROOT pozwala przenieść
+# plik bez kopiowania.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+FILE_UPLOAD_TEMP_DIR = os.environ.get('REZERWACJE_UPLOAD_TEMP_DIR') or None
+FILE_UPLOAD_PERMISSIONS = 0o640
+
+# Cache: wersje danych i odpowiedzi get_doctors. Przy kilku procesach serwera
+# trzeba wskazać współdzielony backend (np. Redis lub Memcached), inaczej
+# unieważnianie po zmianie lekarzy zadziała tylko w jednym procesie.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('REZERWACJE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('REZERWACJE_CACHE_LOCATION', 'rezerwacje'),
+    }
+}
+
+# Indeksy grafiku w cache (urlopy lekarzy, godziny pracy, czasy trwania typów
+# wizyt) odświeża sygnał, ale tylko w cache procesu, który zapisał zmianę. Przy
+# lokalnym cache każdego procesu wpis wygasa po SCHEDULE_CACHE_TIMEOUT sekundach
+# i jest wczytywany z bazy; rezerwacja i tak sprawdza urlop i czas trwania wizyty
+# w bazie (services.book_appointment).
+SCHEDULE_CACHE_TIMEOUT = int(os.environ.get('REZERWACJE_SCHEDULE_CACHE_TIMEOUT', 60))
+
+# Broker zmian grafiku dla formularzy rezerwacji na żywo (accounts.live, widok
+# slot_stream, działa pod ASGI). LocalBroker rozsyła zmiany tylko w obrębie
+# procesu; przy kilku procesach serwera wskaż broker współdzielony.
+LIVE_SLOTS_BROKER = os.environ.get('REZERWACJE_LIVE_SLOTS_BROKER', 'accounts.live.LocalBroker')
+
+# E-mail: widoki zapisują wiadomości do tabeli outbox, wysyła je komenda send_emails.
+# Domyślnie wiadomości trafiają na konsolę; w produkcji ustaw backend SMTP i EMAIL_HOST.
+EMAIL_BACKEND = os.environ.get('REZERWACJE_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('REZERWACJE_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('REZERWACJE_EMAIL_PORT', 25))
+DEFAULT_FROM_EMAIL = os.environ.get('REZERWACJE_EMAIL_FROM', 'rezerwacje@localhost')
+
+# Pomiar zapytań i czasu odpowiedzi widoków (raport: /accounts/dashboard/admin/profiling/).
+# QUERY_BUDGETS ogranicza liczbę zapytań widoku; przekroczenie jest logowane,
+# a przy QUERY_BUDGET_ACTION = 'raise' kończy się wyjątkiem (przydatne w testach).
+# Pomiar włącza się jawnie, niezależnie od DEBUG. Budżety liczone są dla zimnego
+# cache: indeksy urlopów, godzin pracy i czasów trwania typów wygasają co
+# SCHEDULE_CACHE_TIMEOUT, a każdy z nich to wtedy jedno dodatkowe zapytanie.
+QUERY_PROFILING = os.environ.get('REZERWACJE_QUERY_PROFILING', '0') == '1'
+if QUERY_PROFILING:
+    TEMPLATES[0]['BACKEND'] = 'accounts.profiling.TimedDjangoTemplates'
+QUERY_BUDGET_ACTION = os.environ.get('REZERWACJE_QUERY_BUDGET_ACTION', 'log')
+QUERY_BUDGETS = {
+    'get_doctors': 3,
+    'get_free_slots': 7,
+    'patient_search': 4,
+    'admin_appointments': 4,
+    'admin_leave_requests': 4,
+    'patient_dashboard': 11,
+    'doctor_dashboard': 6,
+}
@@ -17,8 +17,6 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.http import HttpResponse
-from django.conf import settings
-from django.conf.urls.static import static
 
 def home(request):
     return HttpResponse("Witaj w systemie rezerwacji!")
@@ -27,6 +25,4 @@ urlpatterns = [
     path("", home, name="home"),
     path('admin/', admin.site.urls),
     path("accounts/", include("accounts.urls")),
-]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
\ No newline at end of file
@@ -0,0 +1,38 @@
+// Lista godzin w formularzach rezerwacji aktualizowana na żywo (server-sent events):
+// po wyborze lekarza i daty serwer przysyła wolne godziny przy każdej zmianie grafiku tego dnia.
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('select[data-live-slots]').forEach(timeField => {
+        const form = timeField.form;
+        const field = name => form.querySelector(`[name="${name}"]`);
+        let source = null;
+        let key = null;
+
+        function render(free) {
+            const selected = timeField.value;
+            timeField.innerHTML = '';
+            if (selected && !free.includes(selected)) {
+                timeField.add(new Option(`${selected} – termin zajęty, wybierz inną godzinę`, '', true, true));
+            }
+            free.forEach(time => timeField.add(new Option(time, time, false, time === selected)));
+        }
+
+        function connect() {
+            const params = new URLSearchParams({
+                doctor: field('doctor').value,
+                date: field('date').value,
+                type: field('type').value,
+            });
+            if (timeField.dataset.exclude) params.set('exclude', timeField.dataset.exclude);
+            if (params.toString() === key) return;
+            key = params.toString();
+            if (source) source.close();
+            source = null;
+            if (!params.get('doctor') || !params.get('date')) return;
+            source = new EventSource(`${timeField.dataset.liveSlots}?${params}`);
+            source.addEventListener('slots', event => render(JSON.parse(event.data).free));
+        }
+
+        ['doctor', 'date', 'type'].forEach(name => field(name).addEventListener('change', connect));
+        connect();
+    });
+});
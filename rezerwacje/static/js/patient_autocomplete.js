@@ -0,0 +1,41 @@
+// Podpowiedzi pacjentów dla PatientAutocompleteWidget: lista pobierana z serwera
+// w miarę pisania, do formularza trafia tylko id wybranego pacjenta.
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.patient-autocomplete').forEach(input => {
+        const target = document.getElementById(input.dataset.target);
+        const options = document.getElementById(input.getAttribute('list'));
+        const minLength = Number(input.dataset.minLength);
+        let timer = null;
+        let controller = null;
+
+        function select() {
+            const option = [...options.options].find(option => option.value === input.value);
+            target.value = option ? option.dataset.id : '';
+            return option;
+        }
+
+        function search() {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            fetch(`${input.dataset.url}?${new URLSearchParams({q: input.value})}`, {signal: controller.signal})
+                .then(response => response.json())
+                .then(data => {
+                    options.innerHTML = '';
+                    data.results.forEach(patient => {
+                        const option = document.createElement('option');
+                        option.value = patient.label;
+                        option.dataset.id = patient.id;
+                        options.appendChild(option);
+                    });
+                    select();
+                })
+                .catch(() => {});
+        }
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            if (select() || input.value.trim().length < minLength) return;
+            timer = setTimeout(search, 200);
+        });
+    });
+});